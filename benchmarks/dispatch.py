@@ -0,0 +1,91 @@
+# dispatch.py - packet dispatch benchmark for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+"""Benchmark the InSim receive path on a synthetic packet stream.
+
+The stream is a mix of MCI, NLP, keep alive and message packets, fed through
+the TCP read handler of a connection that is never opened. Each case binds
+a different set of callbacks and reports the packets handled per second,
+the best of several runs.
+
+Usage: python benchmarks/dispatch.py [packets]
+
+"""
+
+import os
+import sys
+import struct
+from timeit import default_timer as clock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+core = sys.modules['pyinsim.core']
+
+
+PACKETS = 100000
+READ_SIZE = 2048
+REPEAT = 5
+
+
+def _mci(cars):
+    data = struct.pack('4B', 4 + 28 * cars, pyinsim.ISP_MCI, 0, cars)
+    for plid in xrange(1, cars + 1):
+        data += struct.pack('2H4B3i3Hh', 10, 2, plid, plid, 0, 0, 1000 * plid, 2000, 0, 50, 0, 0, 0)
+    return data
+
+
+def _nlp(cars):
+    data = struct.pack('4B', 4 + 6 * cars, pyinsim.ISP_NLP, 0, cars)
+    for plid in xrange(1, cars + 1):
+        data += struct.pack('2H2B', 10, 2, plid, plid)
+    return data + '\x00' * (-len(data) % 4)
+
+
+def _stream(count):
+    mix = [_mci(8), _nlp(8), _mci(8), pyinsim.IS_TINY(SubT=pyinsim.TINY_NONE).pack(),
+           _mci(8), '\x10\x0b\x00\x00\x01\x00\x00\x00hello\x00\x00\x00', _mci(8), _nlp(8)]
+    packets = (mix * (count // len(mix) + 1))[:count]
+    data = ''.join(packets)
+    return [data[i:i + READ_SIZE] for i in xrange(0, len(data), READ_SIZE)]
+
+
+def _run(name, reads, count, setup):
+    conn = core._InSim('benchmark')
+    conn._tcp.send = lambda data: None
+    setup(conn)
+    best = None
+    for i in xrange(REPEAT):
+        start = clock()
+        for read in reads:
+            conn._tcp._recv_buff += read
+            conn._handle_tcp_read()
+        elapsed = clock() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    conn.close()
+    print '%-24s %10.0f packets/s' % (name, count / best)
+
+
+def _nothing(conn, *args):
+    pass
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else PACKETS
+    reads = _stream(count)
+    _run('nothing bound', reads, count, lambda c: None)
+    _run('one type bound', reads, count, lambda c: c.bind(pyinsim.ISP_MSO, _nothing))
+    _run('mci bound', reads, count, lambda c: c.bind(pyinsim.ISP_MCI, _nothing))
+    _run('mci bound, pooled', reads, count, lambda c: c.bind(pyinsim.ISP_MCI, _nothing) or c.pool(pyinsim.ISP_MCI))
+    _run('all bound', reads, count, lambda c: c.bind(pyinsim.EVT_ALL, _nothing))
+    _run('raw bound', reads, count, lambda c: c.bind(pyinsim.EVT_RAW, _nothing))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# rules.py - OutGauge rule benchmark for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+"""Benchmark testing fifty alert rules against OutGauge packets.
+
+The callbacks case binds a callback for each rule that tests the packet and
+keeps its own last result, as the examples do. The rules case tests the
+same rules with a compiled Rules object. Both report the packets tested per
+second, the best of several runs.
+
+Usage: python benchmarks/rules.py [packets]
+
+"""
+
+import os
+import sys
+from timeit import default_timer as clock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+from pyinsim import rules
+
+
+PACKETS = 100000
+REPEAT = 5
+RULES = 50
+
+
+def _packets():
+    packets = []
+    for i in xrange(100):
+        packet = pyinsim.OutGaugePack()
+        packet.RPM = 1000.0 + i * 70.0
+        packet.Fuel = 1.0 - i / 100.0
+        packet.ShowLights = pyinsim.DL_SHIFT if i > 90 else 0
+        packets.append(packet)
+    return packets
+
+
+def _callbacks(count):
+    callbacks = []
+    for i in xrange(count):
+        def callback(conn, packet, state=[False], threshold=1000.0 + i * 100.0):
+            active = packet.RPM > threshold
+            if active != state[0]:
+                state[0] = active
+        callbacks.append(callback)
+    return callbacks
+
+
+def _run(name, packets, count, test):
+    best = None
+    for i in xrange(REPEAT):
+        start = clock()
+        for i in xrange(count // len(packets)):
+            for packet in packets:
+                test(None, packet)
+        elapsed = clock() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print '%-24s %10.0f packets/s' % (name, count / best)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else PACKETS
+    packets = _packets()
+    callbacks = _callbacks(RULES)
+    _run('callbacks', packets, count, lambda conn, packet: [c(conn, packet) for c in callbacks])
+    compiled = rules.Rules()
+    for i in xrange(RULES):
+        compiled.above('RPM', 1000.0 + i * 100.0, lambda conn, packet, active: None)
+    _run('rules', packets, count, compiled.evaluate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# serialize.py - packet serialization benchmark for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+"""Benchmark converting packets to dicts, tuples, JSON and bytes.
+
+Each case serializes a decoded MCI packet with eight cars, the packet sent
+most often, and reports the packets serialized per second, the best of
+several runs. The vars case is what the examples do today, with vars also
+used to convert the CompCar sub-packets for JSON.
+
+Usage: python benchmarks/serialize.py [packets]
+
+"""
+
+import os
+import sys
+import json
+import marshal
+from timeit import default_timer as clock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+from pyinsim import codec
+
+from dispatch import _mci
+
+
+PACKETS = 100000
+REPEAT = 5
+
+
+def _run(name, packet, count, serialize):
+    best = None
+    for i in xrange(REPEAT):
+        start = clock()
+        for i in xrange(count):
+            serialize(packet)
+        elapsed = clock() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print '%-24s %10.0f packets/s' % (name, count / best)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else PACKETS
+    packet = pyinsim.IS_MCI().unpack(_mci(8))
+    _run('vars', packet, count, vars)
+    _run('to_dict', packet, count, lambda p: p.to_dict())
+    _run('to_tuple', packet, count, lambda p: p.to_tuple())
+    _run('vars + json', packet, count, lambda p: json.dumps(vars(p), default=vars))
+    _run('to_dict + json', packet, count, codec.to_json)
+    _run('to_tuple + json', packet, count, lambda p: json.dumps(p.to_tuple()))
+    _run('to_tuple + marshal', packet, count, lambda p: marshal.dumps(p.to_tuple()))
+    _run('encode', packet, count, codec.encode)
+    _run('decode', codec.encode(packet), count, codec.decode)
+
+
+if __name__ == '__main__':
+    main()
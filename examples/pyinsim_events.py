@@ -14,7 +14,7 @@ def error(insim):
     traceback.print_exc()
 
 def all(insim, packet):
-    print vars(packet)
+    print packet.to_dict()
 
 insim = pyinsim.insim('127.0.0.1', 29999, Admin='')
 
@@ -11,8 +11,10 @@ __version__ = '2.1.0'
 from core import *
 from insim import *
 from func import *
+from metrics import *
 
 __all__ = []
 __all__.extend([c for c in dir(__import__('pyinsim.core'))])
 __all__.extend([i for i in dir(__import__('pyinsim.insim'))])
 __all__.extend([f for f in dir(__import__('pyinsim.func'))])
+__all__.extend([m for m in dir(__import__('pyinsim.metrics'))])
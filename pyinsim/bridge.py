@@ -0,0 +1,300 @@
+# bridge.py - WebSocket race state bridge module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import socket
+import asyncore
+import struct
+import base64
+import hashlib
+
+# Libraries
+import insim as insim_
+import core
+import codec
+
+__all__ = [
+    'Bridge',
+ ]
+
+
+# Constants.
+_INTERVAL = 0.1
+_BUFFER_SIZE = 4096
+_MAX_REQUEST_SIZE = 4096
+_MAX_MESSAGE_SIZE = 65536
+_MAX_BACKLOG = 1048576
+_REQUEST_END = '\r\n\r\n'
+_WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_OP_TEXT = 0x1
+_OP_CLOSE = 0x8
+_OP_PING = 0x9
+_OP_PONG = 0xa
+_SHORT = struct.Struct('!H')
+_LONG = struct.Struct('!Q')
+
+# The CompCar fields that are not part of the car state.
+_SKIP_FIELDS = ('PLID', 'Sp3')
+
+
+def _frame(payload, opcode=_OP_TEXT):
+    size = len(payload)
+    if size < 126:
+        header = chr(0x80 | opcode) + chr(size)
+    elif size < 65536:
+        header = chr(0x80 | opcode) + chr(126) + _SHORT.pack(size)
+    else:
+        header = chr(0x80 | opcode) + chr(127) + _LONG.pack(size)
+    return header + payload
+
+
+def _unmask(mask, payload):
+    mask = [ord(c) for c in mask]
+    return ''.join([chr(ord(c) ^ mask[i & 3]) for i, c in enumerate(payload)])
+
+
+class Bridge(object):
+    """Class to stream the race state of an InSim connection to browsers.
+
+    The car positions and player details are kept once in the cars dict,
+    keyed by PLID. Each tick the fields that have changed are sent to all of
+    the WebSocket clients as one JSON message, which is encoded and framed
+    once for every client. New clients are sent the whole state first, and a
+    plain HTTP request is answered with the whole state. The connection must
+    request IS_MCI or IS_NLP packets with the ISF_MCI or ISF_NLP flag.
+
+    Messages are {"type": "state", "cars": {PLID: {...}}} for the whole state
+    and {"type": "delta", "cars": {PLID: {...}}, "removed": [PLID]} for the
+    changes, where removed is only present if cars have left.
+
+    """
+    def __init__(self, insim, host='127.0.0.1', port=8080, interval=_INTERVAL):
+        """Create a new Bridge object.
+
+        Args:
+            insim - The InSim connection to take the race state from.
+            host - The local address to listen on.
+            port - The port to listen on.
+            interval - The number of seconds between deltas.
+
+        """
+        self.insim = insim
+        self.cars = {}
+        self.clients = []
+        self._delta = {}
+        self._removed = set()
+        self._state = None
+        self._bindings = ((insim_.ISP_MCI, self._mci),
+                          (insim_.ISP_NLP, self._nlp),
+                          (insim_.ISP_NPL, self._npl),
+                          (insim_.ISP_PLL, self._pll),
+                          (insim_.ISP_TOC, self._toc),
+                          (insim_.ISP_TINY, self._tiny),
+                          (core.EVT_INIT, self._init))
+        [insim.bind(evt, callback) for evt, callback in self._bindings]
+        if insim.connected:
+            self._init(insim)
+        self._server = _BridgeServer(self, host, port)
+        self._timer = core.call_every(interval, self.flush)
+
+    def close(self):
+        """Stop the bridge and close the client connections."""
+        [self.insim.unbind(evt, callback) for evt, callback in self._bindings]
+        self._timer.cancel()
+        self._server.close()
+        [c.close() for c in list(self.clients)]
+
+    def flush(self):
+        """Send the changes since the last flush to the clients now."""
+        if not self._delta and not self._removed:
+            return
+        message = {'type': 'delta', 'cars': self._delta}
+        if self._removed:
+            message['removed'] = sorted(self._removed)
+        frame = _frame(codec._dumps(message))
+        self._delta = {}
+        self._removed = set()
+        self._state = None
+        [c.push(frame) for c in self.clients]
+
+    def state(self):
+        """Get the whole race state as JSON."""
+        if self._state is None:
+            self._state = codec._dumps({'type': 'state', 'cars': self.cars})
+        return self._state
+
+    def _update(self, plid, values):
+        car = self.cars.get(plid)
+        if car is None:
+            car = self.cars[plid] = {}
+            self._removed.discard(plid)
+        delta = None
+        for key, value in values.iteritems():
+            if key not in car or car[key] != value:
+                car[key] = value
+                if delta is None:
+                    delta = self._delta.setdefault(plid, {})
+                delta[key] = value
+
+    def _remove(self, plid):
+        if self.cars.pop(plid, None) is not None:
+            self._delta.pop(plid, None)
+            self._removed.add(plid)
+
+    def _init(self, insim):
+        insim.send(insim_.ISP_TINY, ReqI=1, SubT=insim_.TINY_NPL)
+
+    def _mci(self, insim, mci):
+        for car in mci.Info:
+            values = car.to_dict()
+            for key in _SKIP_FIELDS:
+                del values[key]
+            self._update(car.PLID, values)
+
+    def _nlp(self, insim, nlp):
+        for node in nlp.Info:
+            self._update(node.PLID, {'Node': node.Node, 'Lap': node.Lap, 'Position': node.Position})
+
+    def _npl(self, insim, npl):
+        self._update(npl.PLID, {'UCID': npl.UCID, 'PType': npl.PType, 'PName': npl.PName,
+                                'Plate': npl.Plate, 'CName': npl.CName})
+
+    def _pll(self, insim, pll):
+        self._remove(pll.PLID)
+
+    def _toc(self, insim, toc):
+        if toc.PLID in self.cars:
+            self._update(toc.PLID, {'UCID': toc.NewUCID})
+
+    def _tiny(self, insim, tiny):
+        if tiny.SubT == insim_.TINY_CLR:
+            [self._remove(plid) for plid in self.cars.keys()]
+
+
+class _BridgeServer(asyncore.dispatcher):
+    """Class to accept bridge client connections."""
+    _internal = True
+    def __init__(self, bridge, host, port):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(128)
+        self._bridge = bridge
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            _BridgeClient(self._bridge, pair[0])
+
+
+class _BridgeClient(asyncore.dispatcher_with_send):
+    """Class to send the race state to an HTTP or WebSocket client."""
+    _internal = True
+    def __init__(self, bridge, sock):
+        asyncore.dispatcher_with_send.__init__(self, sock)
+        self._bridge = bridge
+        self._recv_buff = ''
+        self._websocket = False
+        self._closing = False
+        self._stale = False
+
+    def push(self, frame):
+        # A client that has fallen too far behind skips deltas until it has
+        # caught up, then it is sent the whole state again.
+        if self._stale or len(self.out_buffer) > _MAX_BACKLOG:
+            self._stale = True
+        else:
+            self.send(frame)
+
+    def handle_read(self):
+        data = self.recv(_BUFFER_SIZE)
+        if not data or self._closing:
+            return
+        self._recv_buff += data
+        if self._websocket:
+            self._handle_frames()
+        elif _REQUEST_END in self._recv_buff:
+            self._handle_request()
+        elif len(self._recv_buff) >= _MAX_REQUEST_SIZE:
+            self._close_when_sent('HTTP/1.1 431 Request Header Fields Too Large\r\nConnection: close\r\n\r\n')
+
+    def _handle_request(self):
+        head = self._recv_buff.split(_REQUEST_END, 1)[0].split('\r\n')
+        self._recv_buff = ''
+        headers = {}
+        for line in head[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get('sec-websocket-key')
+        if headers.get('upgrade', '').lower() == 'websocket' and key:
+            accept = base64.b64encode(hashlib.sha1(key + _WEBSOCKET_GUID).digest())
+            self.send('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: %s\r\n\r\n' % accept)
+            self.send(_frame(self._bridge.state()))
+            self._websocket = True
+            self._bridge.clients.append(self)
+        else:
+            body = self._bridge.state()
+            self._close_when_sent('HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(body), body))
+
+    def _handle_frames(self):
+        buff = self._recv_buff
+        while len(buff) >= 2:
+            opcode = ord(buff[0]) & 0x0f
+            size = ord(buff[1]) & 0x7f
+            index = 2
+            if size == 126:
+                if len(buff) < 4:
+                    break
+                size = _SHORT.unpack_from(buff, 2)[0]
+                index = 4
+            elif size == 127:
+                if len(buff) < 10:
+                    break
+                size = _LONG.unpack_from(buff, 2)[0]
+                index = 10
+            if size > _MAX_MESSAGE_SIZE:
+                self.close()
+                return
+            # Messages from clients are always masked.
+            end = index + 4 + size
+            if len(buff) < end:
+                break
+            payload = _unmask(buff[index:index + 4], buff[index + 4:end]) if opcode >= _OP_CLOSE else ''
+            buff = buff[end:]
+            if opcode == _OP_CLOSE:
+                self._close_when_sent(_frame(payload[:2], _OP_CLOSE))
+                return
+            if opcode == _OP_PING:
+                self.send(_frame(payload, _OP_PONG))
+        self._recv_buff = buff
+
+    def _close_when_sent(self, data):
+        self._closing = True
+        if self in self._bridge.clients:
+            self._bridge.clients.remove(self)
+        self.send(data)
+        if not self.out_buffer:
+            self.close()
+
+    def handle_write(self):
+        asyncore.dispatcher_with_send.handle_write(self)
+        if not self.out_buffer:
+            if self._closing:
+                self.close()
+            elif self._stale:
+                self._stale = False
+                self.send(_frame(self._bridge.state()))
+
+    def handle_close(self):
+        self.close()
+
+    def close(self):
+        if self in self._bridge.clients:
+            self._bridge.clients.remove(self)
+        asyncore.dispatcher_with_send.close(self)
@@ -0,0 +1,197 @@
+# buttons.py - button manager module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import struct
+
+# Libraries
+import insim as insim_
+
+__all__ = [
+    'ButtonManager',
+ ]
+
+
+# Constants.
+_BTN_HEADER = struct.Struct('12B')
+_BFN = struct.Struct('8B')
+_ALL_UCIDS = 255
+_MAX_TEXT = 240
+
+
+def _pad(text):
+    return text + '\x00' * (-len(text) % 4)
+
+
+class ButtonManager(object):
+    """Class to manage the buttons shown on each connection, only the buttons
+    that have changed are sent and all updates are sent in one write.
+
+    """
+    def __init__(self, insim, text_only=True):
+        """Create a new ButtonManager object.
+
+        Args:
+            insim - The InSim connection to send the buttons through.
+            text_only - Set false to always send the full button, otherwise
+                        buttons whose layout has not changed are sent with a
+                        zero position, which LFS treats as a text update.
+
+        """
+        self.insim = insim
+        self.text_only = text_only
+        self._shown = {}
+        self._pending = {}
+        self._cleared = set()
+        insim.bind(insim_.ISP_BFN, self._button_function)
+        insim.bind(insim_.ISP_CNL, self._connection_leave)
+
+    def button(self, UCID, ClickID, Text='', L=0, T=0, W=0, H=0, BStyle=0, Inst=0, TypeIn=0, ReqI=1):
+        """Set a button, it is sent on the next flush if it has changed.
+
+        Args:
+            UCID    : connection to display the button (0 = local / 255 = all)
+            ClickID : button ID (0 to 239)
+            Text    : 0 to 240 characters of text, longer text is cut short
+            L       : left: 0 - 200
+            T       : top: 0 - 200
+            W       : width: 0 - 200
+            H       : height: 0 - 200
+            BStyle  : button style flags from ``ISB_*``
+            Inst    : some extra flags from ``INST_*``
+            TypeIn  : max chars to type in
+            ReqI    : non-zero (returned in ``IS_BTC`` and ``IS_BTT`` packets)
+
+        """
+        key = (UCID, ClickID)
+        state = ((ReqI, Inst, BStyle, TypeIn, L, T, W, H), Text[:_MAX_TEXT])
+        if self._shown.get(key) == state:
+            self._pending.pop(key, None)
+        else:
+            self._pending[key] = state
+
+    def text(self, UCID, ClickID, Text):
+        """Change the text of a button that has already been set.
+
+        Args:
+            UCID    : connection the button is displayed on
+            ClickID : button ID (0 to 239)
+            Text    : 0 to 240 characters of text
+
+        """
+        key = (UCID, ClickID)
+        state = self._pending.get(key, self._shown.get(key))
+        if state is None:
+            raise KeyError('no button %d for connection %d' % (ClickID, UCID))
+        layout = state[0]
+        self.button(UCID, ClickID, Text, layout[4], layout[5], layout[6], layout[7], layout[2], layout[1], layout[3], layout[0])
+
+    def delete(self, UCID, ClickID):
+        """Delete a button on the next flush.
+
+        Args:
+            UCID    : connection the button is displayed on
+            ClickID : button ID (0 to 239)
+
+        """
+        key = (UCID, ClickID)
+        if key in self._shown:
+            self._pending[key] = None
+        else:
+            self._pending.pop(key, None)
+
+    def clear(self, UCID=_ALL_UCIDS):
+        """Clear all of the buttons on a connection on the next flush.
+
+        Args:
+            UCID : connection to clear (255 = all)
+
+        """
+        for key in self._pending.keys() + self._shown.keys():
+            if UCID == _ALL_UCIDS or key[0] == UCID:
+                self._pending.pop(key, None)
+                self._shown.pop(key, None)
+        self._cleared.add(UCID)
+
+    def shown(self, UCID):
+        """Get the click IDs of the buttons currently displayed on a connection."""
+        return sorted([key[1] for key in self._shown if key[0] == UCID])
+
+    def flush(self):
+        """Send all of the pending changes to InSim in a single write.
+
+        Returns:
+            The number of bytes sent.
+
+        """
+        parts = []
+        if _ALL_UCIDS in self._cleared:
+            parts.append(_BFN.pack(8, insim_.ISP_BFN, 0, insim_.BFN_CLEAR, _ALL_UCIDS, 0, 0, 0))
+        else:
+            for ucid in sorted(self._cleared):
+                parts.append(_BFN.pack(8, insim_.ISP_BFN, 0, insim_.BFN_CLEAR, ucid, 0, 0, 0))
+        self._cleared.clear()
+
+        deleted = {}
+        for key in sorted(self._pending):
+            state = self._pending[key]
+            if state is None:
+                deleted.setdefault(key[0], []).append(key[1])
+                self._shown.pop(key, None)
+            else:
+                parts.append(self._pack(key, state))
+                self._shown[key] = state
+        self._pending.clear()
+
+        for ucid, ids in sorted(deleted.items()):
+            parts.extend(self._pack_delete(ucid, ids))
+
+        data = ''.join(parts)
+        if data:
+            self.insim.sendraw(data)
+        return len(data)
+
+    def _pack(self, key, state):
+        layout, text = state
+        old = self._shown.get(key)
+        text = _pad(text)
+        if self.text_only and old is not None and old[0] == layout:
+            return _BTN_HEADER.pack(12 + len(text), insim_.ISP_BTN, layout[0], key[0], key[1], layout[1], layout[2], layout[3], 0, 0, 0, 0) + text
+        return _BTN_HEADER.pack(12 + len(text), insim_.ISP_BTN, layout[0], key[0], key[1], *layout[1:]) + text
+
+    def _pack_delete(self, ucid, ids):
+        # Send one BFN for each run of consecutive click IDs.
+        parts = []
+        first = last = ids[0]
+        for id_ in ids[1:] + [None]:
+            if id_ is not None and id_ == last + 1:
+                last = id_
+                continue
+            parts.append(_BFN.pack(8, insim_.ISP_BFN, 0, insim_.BFN_DEL_BTN, ucid, first, last, 0))
+            first = last = id_
+        return parts
+
+    def _forget(self, ucid):
+        # Pending deletes are dropped too, the buttons have already gone.
+        for key in self._shown.keys():
+            if key[0] == ucid:
+                del self._shown[key]
+        for key, state in self._pending.items():
+            if key[0] == ucid and state is None:
+                del self._pending[key]
+
+    def _button_function(self, insim, bfn):
+        # The user cleared the buttons, so they all need to be sent again.
+        if bfn.SubT == insim_.BFN_USER_CLEAR:
+            self._forget(bfn.UCID)
+
+    def _connection_leave(self, insim, cnl):
+        self._forget(cnl.UCID)
+        for key in self._pending.keys():
+            if key[0] == cnl.UCID:
+                del self._pending[key]
@@ -0,0 +1,113 @@
+# codec.py - packet serialization module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import struct
+import json
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'decode',
+    'decode_all',
+    'encode',
+    'to_json',
+ ]
+
+
+# Constants.
+_FRAME = struct.Struct('!HH')
+_FRAME_SIZE = _FRAME.size
+_TYPES = {
+    insim_.OutSimPack: core.EVT_OUTSIM,
+    insim_.OutGaugePack: core.EVT_OUTGAUGE,
+}
+_CLASSES = dict(core._PACKET_MAP)
+_CLASSES.update([(ptype, cls) for cls, ptype in _TYPES.iteritems()])
+_JSON = json.JSONEncoder(separators=(',', ':'))
+_JSON_LATIN1 = json.JSONEncoder(separators=(',', ':'), encoding='latin-1')
+
+
+def encode(packet):
+    """Encode a packet as bytes. The packet is packed as LFS sends it and
+    prefixed with its type and length, so OutSim and OutGauge packets can be
+    decoded too and encoded packets can be joined and split with decode_all().
+
+    Args:
+        packet - The packet to encode.
+
+    Returns:
+        The packet type and length followed by the packed packet.
+
+    """
+    data = packet.pack()
+    return _FRAME.pack(_TYPES.get(packet.__class__) or packet.Type, len(data)) + data
+
+
+def decode(data, index=0):
+    """Decode a packet encoded with encode().
+
+    Args:
+        data - The encoded data.
+        index - The offset of the packet in the data.
+
+    Returns:
+        The packet object.
+
+    """
+    ptype, size = _FRAME.unpack_from(data, index)
+    cls = _CLASSES.get(ptype)
+    if cls is None:
+        raise core.InSimError('cannot decode unknown packet type %d' % ptype)
+    index += _FRAME_SIZE
+    return cls().unpack(data[index:index + size])
+
+
+def decode_all(data):
+    """Decode all of the packets in a string of encoded packets.
+
+    Args:
+        data - The concatenated encoded packets.
+
+    Returns:
+        A list of the packet objects.
+
+    """
+    packets = []
+    index = 0
+    while index < len(data):
+        packets.append(decode(data, index))
+        index += _FRAME_SIZE + _FRAME.unpack_from(data, index)[1]
+    return packets
+
+
+def to_json(packet):
+    """Convert a packet to JSON, sub-packets become nested objects.
+
+    Strings that are not UTF-8 are decoded as latin-1 so that any byte value
+    is kept, use the strmanip module first to convert LFS encoded text to
+    unicode.
+
+    Args:
+        packet - The packet to convert.
+
+    Returns:
+        The JSON text.
+
+    """
+    return _dumps(packet.to_dict())
+
+
+def _dumps(obj):
+    try:
+        return _JSON.encode(obj)
+    except UnicodeDecodeError:
+        # The pure Python encoder is used for other encodings, so only use it when needed.
+        return _JSON_LATIN1.encode(obj)
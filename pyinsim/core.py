@@ -11,7 +11,14 @@ import socket
 import asyncore
 import traceback
 import threading
+import thread
 import time
+import errno
+import struct
+import collections
+import heapq
+import random
+from timeit import default_timer as _clock
 
 # Libraries
 import insim as insim_
@@ -20,21 +27,33 @@ __all__ = [
     'EVT_ALL',
     'EVT_CLOSE',
     'EVT_ERROR',
+    'EVT_GAP',
+    'EVT_HOSTS',
     'EVT_INIT',
     'EVT_OUTGAUGE',
     'EVT_OUTSIM',
+    'EVT_RAW',
+    'EVT_STREAM',
     'EVT_TIMEOUT',
     'INSIM_VERSION',
     'InSimError',
+    'PRIORITY_ADMIN',
+    'PRIORITY_CHAT',
+    'PRIORITY_KEEPALIVE',
+    'PRIORITY_UI',
     'PYINSIM_VERSION',
+    'call_every',
+    'call_later',
     'closeall',
     'insim',
     'isrunning',
     'outgauge',
     'outsim',
     'packet',
+    'profile',
     'relay',
     'run',
+    'template',
     'time',
     'version',
  ]
@@ -45,9 +64,17 @@ PYINSIM_VERSION = '2.1.0'
 INSIM_VERSION = 6
 _TCP_BUFFER_SIZE = 2048
 _UDP_BUFFER_SIZE = 512
-_TIMEOUT = 0.05
 _OUTGAUGE_SIZE = (92, 96)
 _OUTSIM_SIZE = (64, 68)
+_PING_REQI = 255
+_PROFILE_THRESHOLD = 0.01
+_PROFILE_MAX_SLOW = 100
+_RECONNECT_DELAY = 1.0
+_RECONNECT_MAX_DELAY = 60.0
+_RECONNECT_FACTOR = 2.0
+_RECONNECT_JITTER = 0.25
+_RESYNC_REQI = 254
+_RESYNC_SUBTS = (insim_.TINY_NCN, insim_.TINY_NPL, insim_.TINY_RES)
 _PACKET_MAP = {
     insim_.ISP_ISI: insim_.IS_ISI,
     insim_.ISP_VER: insim_.IS_VER,
@@ -130,6 +157,36 @@ EVT_ALL = 259
 EVT_OUTGAUGE = 260
 EVT_OUTSIM = 261
 EVT_TIMEOUT = 262
+EVT_HOSTS = 263
+EVT_RAW = 264
+EVT_GAP = 265
+EVT_STREAM = 266
+
+
+# Send priority constants, lower values are sent first.
+PRIORITY_KEEPALIVE = 0
+PRIORITY_ADMIN = 1
+PRIORITY_CHAT = 2
+PRIORITY_UI = 3
+_PRIORITIES = {
+    insim_.ISP_MTC: PRIORITY_CHAT,
+    insim_.ISP_MSX: PRIORITY_CHAT,
+    insim_.ISP_MSL: PRIORITY_CHAT,
+    insim_.ISP_BTN: PRIORITY_UI,
+    insim_.ISP_BFN: PRIORITY_UI,
+}
+_SEND_RATE = 20.0
+_SEND_BURST = 40
+
+
+# Packet types that can be conflated, with the size of each car record and 
+# the offset of the PLID in it.
+_CONFLATE_RECORDS = {
+    insim_.ISP_MCI: (28, 4),
+    insim_.ISP_NLP: (6, 4),
+}
+_CONFLATE_READ_SIZE = 65536
+_CONFLATE_MAX_DATAGRAMS = 256
 
 
 class InSimError(Exception):
@@ -137,9 +194,390 @@ class InSimError(Exception):
     pass
 
 
+# Variable length packets with trailing text, the text field name, the size of
+# the header, whether the text must have a trailing zero and its most characters.
+_TEXT_FIELDS = {
+    insim_.IS_MTC: ('Msg', 8, True, 127),
+    insim_.IS_BTN: ('Text', 12, False, 240),
+}
+_FIELD_CACHE = {}
+
+
+def _fields(cls):
+    # Get the offset and struct of each field that can be patched, worked out
+    # from the packet layout table. Lists, sub-packets and the fields after a
+    # variable length field cannot be patched.
+    fields = _FIELD_CACHE.get(cls)
+    if fields is not None:
+        return fields
+    layouts = dict([(c.__name__, layout) for c, layout in insim_._LAYOUTS])
+    fields = _FIELD_CACHE[cls] = {}
+    formats = []
+    
+    def add_fields(layout, patchable):
+        for field in layout.split():
+            name, _, spec = field.partition(':')
+            spec = spec or 'B'
+            if spec == 'text' or spec[-1] == '?' or '*' in spec:
+                return
+            if spec in layouts:
+                add_fields(layouts[spec], False)
+                continue
+            fmt = spec.rstrip('!')
+            formats.append(fmt)
+            value = fmt.rstrip('x')
+            if patchable and (value[-1] == 's' or len(value) == 1):
+                offset = struct.calcsize(''.join(formats)) - struct.calcsize(fmt)
+                fields[name] = (offset, struct.Struct(value))
+                
+    add_fields(layouts[cls.__name__], True)
+    return fields
+    
+    
+def _locate(cls, name):
+    field = _fields(cls).get(name)
+    if field is None:
+        raise InSimError('%s field %s cannot be patched' % (cls.__name__, name))
+    return field
+    
+    
+class _Template(object):
+    """Class to hold a pre-packed packet."""
+    def __init__(self, cls, kwargs):
+        """Create a new _Template object."""
+        self._cls = cls
+        self._text = _TEXT_FIELDS.get(cls)
+        if self._text:
+            self._default_text = kwargs.get(self._text[0], '')
+            self._data = cls(**kwargs).pack()[:self._text[1]]
+        else:
+            self._data = cls(**kwargs).pack()
+        self._buff = bytearray(self._data)
+        self._fields = {}
+        
+    def pack(self, **fields):
+        """Get the packet data with some of the fields changed.
+        
+        Args:
+            fields - The fields to change, other fields keep the template value.
+            
+        Returns:
+            The packed data.
+        
+        """
+        buff = self._buff
+        buff[:] = self._data
+        text = None
+        for name, value in fields.iteritems():
+            if self._text and name == self._text[0]:
+                text = value
+                continue
+            field = self._fields.get(name)
+            if field is None:
+                field = self._fields[name] = _locate(self._cls, name)
+            field[1].pack_into(buff, field[0], value)
+        if self._text:
+            if text is None:
+                text = self._default_text
+            text = text[:self._text[3]]
+            if self._text[2]:
+                text += '\x00' * (4 - len(text) % 4)
+            else:
+                text += '\x00' * (-len(text) % 4)
+            buff[0] = len(buff) + len(text)
+            return str(buff) + text
+        return str(buff)
+        
+        
+class _Scheduler(object):
+    """Class to pace outgoing packets with a token bucket and priority queues."""
+    def __init__(self, rate, burst, priorities):
+        """Create a new _Scheduler object."""
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.priorities = priorities
+        self.coalesced = 0
+        self._tokens = self.burst
+        self._updated = _clock()
+        self._queues = [collections.deque() for i in xrange(PRIORITY_UI + 1)]
+        self._buttons = {}
+        self._timer = None
+        self._count = 0
+        
+    def __len__(self):
+        return self._count
+        
+    def submit(self, data):
+        """Queue packet data, data may contain several packets."""
+        if len(data) == ord(data[0]):
+            self._queue(data)
+        else:
+            index = 0
+            while index < len(data):
+                size = ord(data[index])
+                self._queue(data[index:index + size])
+                index += size
+                
+    def _queue(self, data):
+        ptype = ord(data[1])
+        if ptype == insim_.ISP_TINY and ord(data[3]) == insim_.TINY_NONE:
+            priority = PRIORITY_KEEPALIVE
+        elif ptype == insim_.ISP_MST and data[4] != '/':
+            priority = PRIORITY_CHAT
+        else:
+            priority = self.priorities.get(ptype, PRIORITY_ADMIN)
+            
+        # A newer button replaces the queued one, but keeps its place.
+        if ptype == insim_.ISP_BTN:
+            key = (data[3], data[4])
+            entry = self._buttons.get(key)
+            if entry is not None:
+                entry[0] = data
+                self.coalesced += 1
+                return
+            entry = self._buttons[key] = [data, key]
+        else:
+            if ptype == insim_.ISP_BFN:
+                self._cancel_buttons(data)
+            entry = [data, None]
+        self._queues[priority].append(entry)
+        self._count += 1
+        
+    def _cancel_buttons(self, data):
+        # Drop the queued buttons a delete or clear would remove, so they are
+        # not sent after it.
+        subt, ucid, first, last = [ord(c) for c in data[3:7]]
+        if subt == insim_.BFN_DEL_BTN:
+            ids = xrange(first, max(first, last) + 1)
+        elif subt == insim_.BFN_CLEAR:
+            ids = None
+        else:
+            return
+        for key, entry in self._buttons.items():
+            if (ucid == 255 or ord(key[0]) == ucid) and (ids is None or ord(key[1]) in ids):
+                entry[0] = None
+                del self._buttons[key]
+                self.coalesced += 1
+                self._count -= 1
+        
+    def release(self):
+        """Get the queued data that can be sent now."""
+        now = _clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        released = []
+        for priority, queue in enumerate(self._queues):
+            while queue:
+                if queue[0][0] is None:
+                    queue.popleft()
+                    continue
+                if priority != PRIORITY_KEEPALIVE:
+                    if self._tokens < 1.0:
+                        return ''.join(released)
+                    self._tokens -= 1.0
+                data, key = queue.popleft()
+                if key is not None:
+                    del self._buttons[key]
+                self._count -= 1
+                released.append(data)
+        return ''.join(released)
+        
+        
+class _Backoff(object):
+    """Class to calculate the delay before each reconnect attempt."""
+    def __init__(self, delay, max_delay, factor, jitter, resync):
+        """Create a new _Backoff object."""
+        self.delay = delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.resync = resync
+        self.attempts = 0
+
+    def reset(self):
+        """Start again from the initial delay."""
+        self.attempts = 0
+
+    def next(self):
+        """Get the delay before the next attempt, with some random jitter so
+        many clients do not all reconnect at once."""
+        delay = min(self.max_delay, self.delay * self.factor ** self.attempts)
+        self.attempts += 1
+        return delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+
+def _callback_name(callback):
+    im_class = getattr(callback, 'im_class', None)
+    if im_class is not None:
+        return '%s.%s.%s' % (callback.__module__, im_class.__name__, callback.__name__)
+    return '%s.%s' % (getattr(callback, '__module__', None), getattr(callback, '__name__', repr(callback)))
+
+
+def _callback_location(callback):
+    # The file and line the callback is defined on, for callable objects the
+    # line of their __call__ method.
+    func = getattr(callback, 'im_func', callback)
+    code = getattr(func, 'func_code', None)
+    if code is None:
+        call = getattr(callback, '__call__', None)
+        code = getattr(getattr(call, 'im_func', None), 'func_code', None)
+    if code is None:
+        return None
+    return '%s:%d' % (code.co_filename, code.co_firstlineno)
+
+
+class _Profiler(object):
+    """Class to record the time spent in each event callback."""
+    def __init__(self, threshold, max_slow, hook):
+        """Create a new _Profiler object."""
+        self.threshold = threshold
+        self.hook = hook
+        self._calls = {}
+        self._slow = collections.deque(maxlen=max_slow)
+        
+    def reset(self):
+        """Clear all of the recorded calls."""
+        self._calls.clear()
+        self._slow.clear()
+        
+    def stats(self):
+        """Get the call count, cumulative and max time for each callback.
+        
+        Returns:
+            A dict of stats keyed by callback name.
+        
+        """
+        stats = {}
+        for callback, (calls, total, max_) in self._calls.iteritems():
+            name = _callback_name(callback)
+            if name in stats:
+                calls += stats[name]['calls']
+                total += stats[name]['total']
+                max_ = max(max_, stats[name]['max'])
+            stats[name] = {'calls': calls, 'total': total, 'max': max_}
+        return stats
+        
+    def slow_calls(self):
+        """Get the calls that took longer than the threshold, oldest first. 
+        Each is a dict with the callback name, the file and line it is defined 
+        on (location), the stack it was called from and the elapsed time."""
+        return list(self._slow)
+        
+    def invoke(self, conn, evt, callbacks, args):
+        for c in callbacks:
+            start = _clock()
+            try:
+                c(conn, *args)
+            finally:
+                elapsed = _clock() - start
+                record = self._calls.get(c)
+                if record is None:
+                    self._calls[c] = [1, elapsed, elapsed]
+                else:
+                    record[0] += 1
+                    record[1] += elapsed
+                    if elapsed > record[2]:
+                        record[2] = elapsed
+                if elapsed >= self.threshold:
+                    self._slow_call(conn, evt, c, elapsed)
+                    
+    def _slow_call(self, conn, evt, callback, elapsed):
+        slow = {
+            'time': time.time(),
+            'connection': conn.name,
+            'event': evt,
+            'callback': _callback_name(callback),
+            'location': _callback_location(callback),
+            'stack': traceback.extract_stack()[:-2],
+            'elapsed': elapsed,
+        }
+        self._slow.append(slow)
+        if self.hook:
+            self.hook(slow)
+            
+_profiler = None
+
+
+class _Stats(object):
+    """Class to hold the performance counters for a connection."""
+    def __init__(self):
+        """Create a new _Stats object."""
+        self.reset()
+        
+    def reset(self):
+        """Reset all counters to zero."""
+        self.started = time.time()
+        self.packets_in = {}
+        self.bytes_in = {}
+        self.packets_out = {}
+        self.bytes_out = {}
+        self.decode_time = {}
+        self.handler_time = {}
+        self.callback_time = {}
+        self.malformed = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.conflated = {}
+        self.rtt = None
+        self._ping_sent = 0.0
+        
+    def received(self, ptype, size):
+        self.packets_in[ptype] = self.packets_in.get(ptype, 0) + 1
+        self.bytes_in[ptype] = self.bytes_in.get(ptype, 0) + size
+        
+    def sent(self, data):
+        # Data may hold several packets, so walk the size bytes.
+        index, length = 0, len(data)
+        while index + 1 < length:
+            size = ord(data[index])
+            if not size:
+                break
+            ptype = ord(data[index + 1])
+            self.packets_out[ptype] = self.packets_out.get(ptype, 0) + 1
+            self.bytes_out[ptype] = self.bytes_out.get(ptype, 0) + size
+            index += size
+            
+    def decoded(self, ptype, elapsed):
+        self.decode_time[ptype] = self.decode_time.get(ptype, 0.0) + elapsed
+        
+    def handled(self, ptype, elapsed):
+        self.handler_time[ptype] = self.handler_time.get(ptype, 0.0) + elapsed
+        
+    def call(self, conn, callbacks, args):
+        # Call each callback, adding its time to the total for its name, so
+        # the stats do not keep unbound callbacks alive.
+        callback_time = self.callback_time
+        last = _clock()
+        for c in callbacks:
+            c(conn, *args)
+            now = _clock()
+            name = _callback_name(c)
+            callback_time[name] = callback_time.get(name, 0.0) + now - last
+            last = now
+        return last
+        
+    def snapshot(self):
+        """Return a copy of the counters as a dict."""
+        return {
+            'uptime': time.time() - self.started,
+            'packets_in': dict(self.packets_in),
+            'bytes_in': dict(self.bytes_in),
+            'packets_out': dict(self.packets_out),
+            'bytes_out': dict(self.bytes_out),
+            'decode_time': dict(self.decode_time),
+            'handler_time': dict(self.handler_time),
+            'callback_time': dict(self.callback_time),
+            'malformed': self.malformed,
+            'dropped': self.dropped,
+            'reconnects': self.reconnects,
+            'conflated': dict(self.conflated),
+            'rtt': self.rtt,
+        }
+
+
 def insim(host='127.0.0.1', port=29999, ReqI=0, UDPPort=0, Flags=0, 
           Prefix='\x00', Interval=0, Admin='', IName='pyinsim', 
-          name='localhost'):
+          name='localhost', reconnect=False):
     """Initialize a new InSim connection.
     
     Args:
@@ -153,6 +591,7 @@ def insim(host='127.0.0.1', port=29999, ReqI=0, UDPPort=0, Flags=0,
         Admin - LFS game admin password.
         IName - Short name for your program.
         name - An optional name for the connection.        
+        reconnect - Set true to reconnect automatically if the connection is lost.
     
     Returns:
         An initialized InSim object.
@@ -168,11 +607,13 @@ def insim(host='127.0.0.1', port=29999, ReqI=0, UDPPort=0, Flags=0,
                Interval=Interval, 
                Admin=Admin, 
                IName=IName)
+    if reconnect:
+        insim.reconnect()
     return insim
 
     
 def relay(host='isrelay.lfs.net', port=47474, ReqI=0, HName='', Admin='', 
-          Spec='', name='localhost'):
+          Spec='', name='localhost', reconnect=False):
     """Initialize a new InSim relay connection.
     
     Args:
@@ -183,6 +624,7 @@ def relay(host='isrelay.lfs.net', port=47474, ReqI=0, HName='', Admin='',
         Admin - The host admin password.
         Spec - The host spectator password.
         name - An optional name for the relay connection.
+        reconnect - Set true to reconnect automatically if the connection is lost.
     
     Returns:
         An initialized relay host.
@@ -192,6 +634,8 @@ def relay(host='isrelay.lfs.net', port=47474, ReqI=0, HName='', Admin='',
     relay._connect(host, port)
     if HName:
         relay.send(insim_.IRP_SEL, ReqI=ReqI, HName=HName, Admin=Admin, Spec=Spec)
+    if reconnect:
+        relay.reconnect()
     return relay
     
 
@@ -253,6 +697,42 @@ def packet(type_, **kwargs):
         return cls(**kwargs)
     return None
     
+    
+def template(type_, **kwargs):
+    """Create a packet template, which packs the packet once so it can be 
+    sent many times with only a few fields changed.
+    
+    Args:
+        type - The type of packet to create.
+        kwargs - Arguments to initialize the packet with.
+        
+    Returns:
+        The template object, call pack() on it to get the packet data.
+    
+    """
+    return _Template(_PACKET_MAP[type_], kwargs)
+    
+
+def profile(enabled=True, threshold=_PROFILE_THRESHOLD, max_slow=_PROFILE_MAX_SLOW, hook=None):
+    """Turn handler profiling on or off, this can be called at any time.
+    
+    Args:
+        enabled - Set false to stop profiling.
+        threshold - Calls taking longer than this many seconds are recorded as slow.
+        max_slow - The number of slow calls to remember.
+        hook - An optional function to call with each slow call record.
+        
+    Returns:
+        The profiler, or None if profiling was turned off.
+    
+    """
+    global _profiler
+    if enabled:
+        _profiler = _Profiler(threshold, max_slow, hook)
+    else:
+        _profiler = None
+    return _profiler
+    
 
 def version(ver_str, or_better=True):
     """Determine if the correct version of pyinsim is installed.
@@ -278,19 +758,207 @@ def run(background=False):
     
     """
     if background:
-        threading.Thread(target=asyncore.loop, args=[_TIMEOUT]).start()
+        threading.Thread(target=_loop).start()
     else:
-        asyncore.loop(timeout=_TIMEOUT)
-
+        _loop()
+        
+        
+def _loop():
+    global _loop_ident, _waker
+    _waker = _Waker()
+    _loop_ident = thread.get_ident()
+    try:
+        # Sleep until the next timer is due, or forever if there are none.
+        while isrunning():
+            asyncore.poll(_next_timeout())
+            _run_timers()
+    finally:
+        # Run what was submitted before the loop stopped, anything later is
+        # run by the thread that submits it.
+        with _submit_lock:
+            _loop_ident = None
+            _waker.close()
+            _waker = None
+            _run_submitted()
+        
+        
+def call_later(delay, callback, *args):
+    """Call a function once after a delay, from the pyinsim loop.
+    
+    Args:
+        delay - The number of seconds to wait.
+        callback - The function to call.
+        args - The arguments to call the function with.
+        
+    Returns:
+        The timer, call cancel() on it to stop it.
+    
+    """
+    return _Timer(delay, 0.0, callback, args)._start()
+    
+    
+def call_every(interval, callback, *args):
+    """Call a function repeatedly from the pyinsim loop. The calls are kept 
+    to a fixed schedule, so they do not drift, and calls missed while the loop 
+    was busy are skipped.
+    
+    Args:
+        interval - The number of seconds between calls.
+        callback - The function to call.
+        args - The arguments to call the function with.
+        
+    Returns:
+        The timer, call cancel() on it to stop it.
+    
+    """
+    if interval <= 0:
+        raise InSimError('timer interval must be greater than zero')
+    return _Timer(interval, interval, callback, args)._start()
+        
 
 def isrunning():
     """Determin if pyinsim is running."""
-    return bool(asyncore.socket_map)
+    for dispatcher in asyncore.socket_map.values():
+        if not getattr(dispatcher, '_internal', False):
+            return True
+    return False
 
 
 def closeall():
     """Close all open connections."""
-    asyncore.close_all(ignore_all=True)
+    if _offloop():
+        _submit(closeall)
+    else:
+        asyncore.close_all(ignore_all=True)
+
+
+# Work submitted from other threads while the loop is running.
+_loop_ident = None
+_waker = None
+_submitted = collections.deque()
+_submit_lock = threading.Lock()
+
+
+def _offloop():
+    return _loop_ident is not None and thread.get_ident() != _loop_ident
+    
+    
+def _submit(func, *args):
+    with _submit_lock:
+        if _loop_ident is not None:
+            _submitted.append((func, args))
+            _waker.wake()
+            return
+    func(*args)
+        
+        
+def _run_submitted():
+    while _submitted:
+        func, args = _submitted.popleft()
+        func(*args)
+        
+        
+# Timers, kept in a heap ordered by when they are due.
+_timers = []
+_timer_count = 0
+
+
+class _Timer(object):
+    """Class to hold a timer."""
+    def __init__(self, delay, interval, callback, args):
+        """Create a new _Timer object."""
+        self.when = _clock() + delay
+        self.interval = interval
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        
+    def _start(self):
+        global _timer_count
+        if _offloop():
+            _submit(self._start)
+        else:
+            _timer_count += 1
+            heapq.heappush(_timers, (self.when, _timer_count, self))
+        return self
+        
+    def cancel(self):
+        """Stop the timer."""
+        self.cancelled = True
+        
+        
+def _next_timeout():
+    while _timers and _timers[0][2].cancelled:
+        heapq.heappop(_timers)
+    if _timers:
+        return max(0.0, _timers[0][0] - _clock())
+    return None
+    
+
+def _run_timers():
+    global _timer_count
+    now = _clock()
+    while _timers and _timers[0][0] <= now:
+        timer = heapq.heappop(_timers)[2]
+        if timer.cancelled:
+            continue
+        try:
+            timer.callback(*timer.args)
+        except Exception:
+            traceback.print_exc()
+        if timer.interval and not timer.cancelled:
+            # Stay on the original schedule, skipping any missed calls.
+            timer.when += timer.interval
+            if timer.when <= now:
+                timer.when += ((now - timer.when) // timer.interval + 1) * timer.interval
+            _timer_count += 1
+            heapq.heappush(_timers, (timer.when, _timer_count, timer))
+            
+            
+def _reset_loop_state():
+    # Forget the sockets, timers and submitted work of the loop, for a child 
+    # process that inherited them from its parent but does not run its loop.
+    global _loop_ident, _waker, _submit_lock, _timer_count
+    asyncore.close_all()
+    _loop_ident = None
+    _waker = None
+    _submitted.clear()
+    _submit_lock = threading.Lock()
+    del _timers[:]
+    _timer_count = 0
+
+
+class _Waker(asyncore.dispatcher):
+    """Class to wake the loop from another thread, using a UDP socket 
+    connected to itself. Internal sockets do not keep the loop running."""
+    _internal = True
+    def __init__(self):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.bind(('127.0.0.1', 0))
+        self.socket.connect(self.socket.getsockname())
+        self.connected = True
+        
+    def wake(self):
+        try:
+            self.socket.send('\x00')
+        except socket.error:
+            pass # Buffer full, so a wake up is already waiting.
+            
+    def writable(self):
+        return False
+        
+    def handle_read(self):
+        try:
+            while self.socket.recv(_UDP_BUFFER_SIZE):
+                pass
+        except socket.error, err:
+            if err.args[0] not in (errno.EWOULDBLOCK, errno.EAGAIN):
+                raise
+        _run_submitted()
+            
+    def handle_error(self):
+        traceback.print_exc()
 
 
 class _TcpSocket(asyncore.dispatcher):
@@ -306,6 +974,10 @@ class _TcpSocket(asyncore.dispatcher):
         return len(self._recv_buff)
         
     def handle_connect(self):
+        # A refused connect can show up as readable before the error is seen.
+        err = self.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            raise socket.error(err, errno.errorcode.get(err, 'connect failed'))
         self._dispatch_to._handle_connect()
     
     def handle_close(self):
@@ -315,7 +987,12 @@ class _TcpSocket(asyncore.dispatcher):
         self._send_buff += data
         
     def writable(self):
-        return bool(self._send_buff)
+        # Poll for writable while connecting, so the connect is seen at once.
+        if self._send_buff or self.connecting:
+            return True
+        if self._dispatch_to._scheduler:
+            return self._dispatch_to._release()
+        return False
     
     def handle_write(self):
         sent = asyncore.dispatcher.send(self, self._send_buff)
@@ -325,21 +1002,46 @@ class _TcpSocket(asyncore.dispatcher):
         data = self.recv(_TCP_BUFFER_SIZE)
         if data:
             self._recv_buff += data
+            if self._dispatch_to._conflate:
+                self._read_pending(len(data))
             self._dispatch_to._handle_tcp_read()
             
+    def _read_pending(self, size):
+        # Read everything waiting in the socket, so it can be conflated.
+        received = size
+        try:
+            while size == _TCP_BUFFER_SIZE and received < _CONFLATE_READ_SIZE:
+                data = self.socket.recv(_TCP_BUFFER_SIZE)
+                size = len(data)
+                received += size
+                self._recv_buff += data
+        except socket.error, err:
+            if err.args[0] not in (errno.EWOULDBLOCK, errno.EAGAIN):
+                raise
+            
     def handle_error(self):
         self._dispatch_to._handle_error()
         
     def get_packets(self):
-        while self._recv_buff and len(self._recv_buff) >= ord(self._recv_buff[0]):
-            size = ord(self._recv_buff[0])   
-            
-            # Check size is multiple of four.
-            if size % 4 > 0:
-                raise InSimError('TCP packet size not a multiple of four')
+        # Yield views of each complete packet, the buffer is only trimmed 
+        # once all of them have been handled.
+        buff = self._recv_buff
+        view = memoryview(buff)
+        index, length = 0, len(buff)
+        try:
+            while index < length:
+                size = ord(buff[index])
+                
+                # Check size is multiple of four.
+                if size % 4 > 0 or not size:
+                    raise InSimError('TCP packet size not a multiple of four')
+                if index + size > length:
+                    break
                     
-            yield self._recv_buff[:size]
-            self._recv_buff = self._recv_buff[size:]
+                yield view[index:index + size]
+                index += size
+        finally:
+            self._recv_buff = buff[index:]
         
 
 class _UdpSocket(asyncore.dispatcher):
@@ -350,31 +1052,66 @@ class _UdpSocket(asyncore.dispatcher):
         self._dispatch_to = dispatch_to
         self._recv_buff = ''        
         self._timeout = timeout
+        self._timer = None
         self.connected = False
         
     def writable(self):
         return False
         
     def readable(self):
-        if self.connected:
-            if self._timeout and time.time() > self._next_packet:
-                self._dispatch_to._handle_timeout()
-                return False
-        else:
-            self._next_packet = time.time() + self._timeout
+        # Start the timeout when the loop first polls the socket.
+        if not self.connected:
             self.connected = True
+            if self._timeout:
+                self._next_packet = time.time() + self._timeout
+                self._timer = call_later(self._timeout, self._check_timeout)
         return True
         
+    def _check_timeout(self):
+        remaining = self._next_packet - time.time()
+        if remaining > 0:
+            self._timer = call_later(remaining, self._check_timeout)
+        else:
+            self._timer = None
+            self._dispatch_to._handle_timeout()
+            
+    def close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        asyncore.dispatcher.close(self)
+        
     def handle_read(self):
         self._recv_buff = self.recv(_UDP_BUFFER_SIZE)
         if self._recv_buff:
-            # Check received packet is multiple of four.
+            # Drop packets that are not a multiple of four.
             if len(self._recv_buff) % 4 > 0:
-                raise InSimError('UDP packet not a multiple of four')
+                self._dispatch_to._stats.malformed += 1
+                return
             
-            self._dispatch_to._handle_udp_read()
+            if self._dispatch_to._conflate:
+                for data in _conflate(self._dispatch_to, self._read_pending(), True):
+                    self._recv_buff = data
+                    self._dispatch_to._handle_udp_read()
+            else:
+                self._dispatch_to._handle_udp_read()
             if self._timeout:
                 self._next_packet = time.time() + self._timeout
+                
+    def _read_pending(self):
+        # Read the datagrams waiting in the socket, so they can be conflated.
+        datagrams = [self._recv_buff]
+        try:
+            while len(datagrams) < _CONFLATE_MAX_DATAGRAMS:
+                data = self.socket.recv(_UDP_BUFFER_SIZE)
+                if len(data) % 4 > 0:
+                    self._dispatch_to._stats.malformed += 1
+                elif data:
+                    datagrams.append(data)
+        except socket.error, err:
+            if err.args[0] not in (errno.EWOULDBLOCK, errno.EAGAIN):
+                raise
+        return datagrams
             
     def handle_error(self):
         self._dispatch_to._handle_error()
@@ -389,11 +1126,70 @@ class _UdpSocket(asyncore.dispatcher):
         return self._recv_buff     
         
         
+def _conflation_key(data, udp):
+    # Get the type of a packet and the cars or OutGauge/OutSim IDs it holds.
+    size = len(data)
+    if udp and size in _OUTSIM_SIZE:
+        return EVT_OUTSIM, (data[64:size],)
+    if udp and size in _OUTGAUGE_SIZE:
+        return EVT_OUTGAUGE, (data[92:size],)
+    ptype = ord(data[1])
+    record = _CONFLATE_RECORDS.get(ptype)
+    if record is None:
+        return ptype, None
+    end = min(size, 4 + ord(data[3]) * record[0])
+    return ptype, [data[i] for i in xrange(4 + record[1], end, record[0])]
+        
+        
+def _conflate(conn, packets, udp=False):
+    # Drop the packets that only hold cars which are in a later packet of the
+    # same type, walking backwards so the latest packets are kept.
+    types = conn._conflate
+    conflated = conn._stats.conflated
+    seen = {}
+    kept = []
+    for data in reversed(packets):
+        ptype, ids = _conflation_key(data, udp)
+        if ids is not None and ptype in types:
+            later = seen.get(ptype)
+            if later is None:
+                later = seen[ptype] = set()
+            elif later.issuperset(ids):
+                conflated[ptype] = conflated.get(ptype, 0) + 1
+                continue
+            later.update(ids)
+        kept.append(data)
+    kept.reverse()
+    return kept
+    
+    
+def _handle_outsim_packet(conn, evt, cls, data, packet=None):
+    # The packet is decoded if it is needed and not passed in, and returned
+    # so it can be handed on without decoding it again.
+    stats = conn._stats
+    stats.received(evt, len(data))
+    callbacks = conn._callbacks.get(evt)
+    if callbacks:
+        start = _clock()
+        if packet is None:
+            packet = (conn._pool.get(evt) or cls()).unpack(data)
+        decoded = _clock()
+        stats.decoded(evt, decoded - start)
+        if _profiler:
+            _profiler.invoke(conn, evt, callbacks, (packet,))
+            stats.handled(evt, _clock() - decoded)
+        else:
+            stats.handled(evt, stats.call(conn, callbacks, (packet,)) - decoded)
+    return packet
+        
+        
 class _Binding(object):
     """Class to manage event bindings."""
     def __init__(self):
         """Create a new _Binding object."""
         self._callbacks = {}
+        self._pool = {}
+        self._conflate = set()
         
     def bind(self, evt, callback):
         """Bind an event callback.
@@ -407,6 +1203,7 @@ class _Binding(object):
             self._callbacks[evt].append(callback)
         else:
             self._callbacks[evt] = [callback]
+        self._rebuild()
         
     def unbind(self, evt, callback):
         """Unbind an event callback.
@@ -420,6 +1217,74 @@ class _Binding(object):
             self._callbacks[evt].remove(callback)
             if not self._callbacks[evt]:
                 del self._callbacks[evt]
+            self._rebuild()
+            
+    def _rebuild(self):
+        # Called when the bindings change.
+        pass
+        
+    def pool(self, *types):
+        """Decode packets of these types into the same object each time, 
+        rather than creating a new one. This saves creating lots of garbage 
+        for high rate packets like MCI, NLP and OutGauge, but the packet 
+        object and its sub-packets are overwritten by the next packet of the 
+        same type, so handlers must copy any values they want to keep.
+        
+        Args:
+            types - The packet types to pool, or ``EVT_OUTGAUGE`` and 
+                    ``EVT_OUTSIM`` for OutGauge and OutSim packets.
+        
+        """
+        for type_ in types:
+            if type_ == EVT_OUTGAUGE:
+                self._pool[type_] = insim_.OutGaugePack()
+            elif type_ == EVT_OUTSIM:
+                self._pool[type_] = insim_.OutSimPack()
+            else:
+                self._pool[type_] = _PACKET_MAP[type_]()
+        self._rebuild()
+        
+    def conflate(self, *types):
+        """Only handle the latest packet for each car when several packets of 
+        these types are waiting to be handled, so handlers that fall behind 
+        skip to the current positions. The number of packets skipped is 
+        counted in the connection stats.
+        
+        Args:
+            types - ``ISP_MCI`` and ``ISP_NLP``, which are conflated by PLID, 
+                    or ``EVT_OUTGAUGE`` and ``EVT_OUTSIM``, which are 
+                    conflated by ID.
+        
+        """
+        for type_ in types:
+            if type_ not in _CONFLATE_RECORDS and type_ not in (EVT_OUTGAUGE, EVT_OUTSIM):
+                raise InSimError('packet type %d cannot be conflated' % type_)
+        self._conflate.update(types)
+        
+    def unconflate(self, *types):
+        """Stop conflating packets of these types.
+        
+        Args:
+            types - The packet types to stop conflating, all types if none are given.
+        
+        """
+        if types:
+            self._conflate.difference_update(types)
+        else:
+            self._conflate.clear()
+        
+    def unpool(self, *types):
+        """Stop pooling packets of these types.
+        
+        Args:
+            types - The packet types to stop pooling, all types if none are given.
+        
+        """
+        if types:
+            [self._pool.pop(type_, None) for type_ in types]
+        else:
+            self._pool.clear()
+        self._rebuild()
                 
     def isbound(self, evt, callback):
         """Determin if an event callback has been bound.
@@ -444,7 +1309,10 @@ class _Binding(object):
         """
         callbacks = self._callbacks.get(evt)
         if callbacks:
-            [c(self, *args) for c in callbacks]  
+            if _profiler:
+                _profiler.invoke(self, evt, callbacks, args)
+            else:
+                [c(self, *args) for c in callbacks]
             
         
 class _InSim(_Binding):
@@ -460,6 +1328,15 @@ class _InSim(_Binding):
         self.name = name
         self.hostaddr = ()
         self.connected = False
+        self._stats = _Stats()
+        self._scheduler = None
+        self._raw_callbacks = {}
+        self._rebuild()
+        self._init_data = ''
+        self._backoff = None
+        self._reconnect_timer = None
+        self._held = None
+        self._measure_rtt = False
         self._tcp = _TcpSocket(dispatch_to=self)
         self._udp = _UdpSocket(dispatch_to=self, timeout=0)
             
@@ -470,11 +1347,94 @@ class _InSim(_Binding):
             self._udp.bind((host, udpport))           
             
     def close(self):
-        """Close the InSim connection."""
+        """Close the InSim connection, this also stops any reconnect."""
+        if _offloop():
+            _submit(self.close)
+            return
+        self._backoff = None
+        self._held = None
+        if self._reconnect_timer:
+            self._reconnect_timer.cancel()
+            self._reconnect_timer = None
         self.connected = False
         self._tcp.close()
         self._udp.close()
         
+    def reconnect(self, enabled=True, delay=_RECONNECT_DELAY, max_delay=_RECONNECT_MAX_DELAY,
+                  factor=_RECONNECT_FACTOR, jitter=_RECONNECT_JITTER, resync=True):
+        """Reconnect automatically when the connection is lost. The delay 
+        between attempts grows each time one fails, the last IS_ISI or IR_SEL 
+        is sent again on each new connection and the bindings are kept. 
+        Packets sent while waiting to reconnect are held and sent after the 
+        IS_ISI or IR_SEL.
+        
+        Args:
+            enabled - Set false to stop reconnecting.
+            delay - The number of seconds to wait before the first attempt.
+            max_delay - The longest number of seconds to wait between attempts.
+            factor - The amount the delay is multiplied by after each attempt.
+            jitter - The fraction the delay is randomly varied by.
+            resync - Set false to not request the connection, player and 
+                     result lists again after reconnecting.
+        
+        """
+        if enabled:
+            self._backoff = _Backoff(delay, max_delay, factor, jitter, resync)
+        else:
+            self._backoff = None
+            self._held = None
+            if self._reconnect_timer:
+                self._reconnect_timer.cancel()
+                self._reconnect_timer = None
+        
+    def bind_raw(self, ptype, callback):
+        """Bind a callback to receive the packet data without decoding it, 
+        the packet is only decoded if it also has a normal binding. Bind 
+        ``EVT_RAW`` to receive the data for every packet type.
+        
+        Args:
+            ptype - The type of packet.
+            callback - The function to call with the connection, the packet 
+                       type and a memoryview of the packet data.
+        
+        """
+        if ptype != EVT_RAW and not 0 <= ptype < 256:
+            raise InSimError('event %d cannot be bound raw' % ptype)
+        if ptype in self._raw_callbacks:
+            self._raw_callbacks[ptype].append(callback)
+        else:
+            self._raw_callbacks[ptype] = [callback]
+        self._rebuild()
+            
+    def unbind_raw(self, ptype, callback):
+        """Unbind a raw packet callback.
+        
+        Args:
+            ptype - The type of packet.
+            callback - The function to unbind.
+        
+        """
+        if ptype in self._raw_callbacks and callback in self._raw_callbacks[ptype]:
+            self._raw_callbacks[ptype].remove(callback)
+            if not self._raw_callbacks[ptype]:
+                del self._raw_callbacks[ptype]
+            self._rebuild()
+            
+    def _rebuild(self):
+        # Compile the bindings into a table indexed by packet type, each entry
+        # holds the packet class, the raw callbacks, the packet callbacks and
+        # the pooled packet to decode into, if there is one.
+        callbacks = self._callbacks
+        all_ = tuple(callbacks.get(EVT_ALL, ()))
+        raw_all = tuple(callbacks.get(EVT_RAW, ())) + tuple(self._raw_callbacks.get(EVT_RAW, ()))
+        table = [None] * 256
+        for ptype in xrange(256):
+            bound = tuple(callbacks.get(ptype, ())) + all_
+            raw = tuple(self._raw_callbacks.get(ptype, ())) + raw_all
+            if bound or raw:
+                table[ptype] = (_PACKET_MAP.get(ptype), raw, bound, self._pool.get(ptype))
+        self._table = table
+        
     def send(self, type_, **kwargs):
         """Send a packet to InSim.
         
@@ -487,7 +1447,10 @@ class _InSim(_Binding):
         
         """
         packet = _PACKET_MAP[type_](**kwargs)
-        self._tcp.send(packet.pack())
+        data = packet.pack()
+        if type_ == insim_.ISP_ISI or type_ == insim_.IRP_SEL:
+            self._init_data = data
+        self._send(data)
         return packet
         
     def sendp(self, *packets):
@@ -497,7 +1460,16 @@ class _InSim(_Binding):
             packets - A sequence of packets to send.
         
         """
-        [self._tcp.send(packet.pack()) for packet in packets]
+        [self._send(packet.pack()) for packet in packets]
+        
+    def sendraw(self, data):
+        """Send already packed packet data to InSim.
+        
+        Args:
+            data - The packed data, this may contain several packets.
+        
+        """
+        self._send(data)
         
     def sendm(self, msg, ucid=0, plid=0):
         """Send a message or command to InSim.
@@ -509,63 +1481,223 @@ class _InSim(_Binding):
         
         """
         if ucid or plid:
-            self._tcp.send(insim_.IS_MTC(Msg=msg, UCID=ucid, PLID=plid).pack())
+            self._send(insim_.IS_MTC(Msg=msg, UCID=ucid, PLID=plid).pack())
         elif msg.startswith('/') and len(msg) < 64:
-            self._tcp.send(insim_.IS_MST(Msg=msg).pack())            
+            self._send(insim_.IS_MST(Msg=msg).pack())            
         elif len(msg) < 96:
-            self._tcp.send(insim_.IS_MSX(Msg=msg).pack())
+            self._send(insim_.IS_MSX(Msg=msg).pack())
         else:
-            self._tcp.send(insim_.IS_MSX(Msg=msg[:95]).pack())
+            self._send(insim_.IS_MSX(Msg=msg[:95]).pack())
+            
+    def ping(self):
+        """Send a TINY_PING to LFS, the round trip time is recorded in the 
+        connection stats when the reply arrives. The ping is sent with ReqI 
+        255, which is reserved for it, and its reply is not dispatched."""
+        self._stats._ping_sent = _clock()
+        self._send(insim_.IS_TINY(ReqI=_PING_REQI, SubT=insim_.TINY_PING).pack())
+        
+    def measure_rtt(self, enabled=True):
+        """Send a ping with each keep alive reply, so the round trip time in 
+        the connection stats is kept current without calling ping().
+        
+        Args:
+            enabled - Set false to stop sending the pings.
+        
+        """
+        self._measure_rtt = enabled
+        
+    def stats(self):
+        """Get the performance counters for the connection.
+        
+        Returns:
+            A dict of counters, packet and byte counts are keyed by packet type.
+        
+        """
+        stats = self._stats.snapshot()
+        stats['send_queue'] = len(self._tcp._send_buff)
+        if self._scheduler:
+            stats['scheduled'] = len(self._scheduler)
+            stats['coalesced'] = self._scheduler.coalesced
+        return stats
+        
+    def throttle(self, rate=_SEND_RATE, burst=_SEND_BURST, priorities=None):
+        """Limit the rate packets are sent to InSim. Packets over the limit are
+        queued and sent in priority order, keep alives are never held back and
+        a queued button is replaced by a newer button with the same ClickID.
+        
+        Args:
+            rate - The number of packets per second to send, or None to stop throttling.
+            burst - The number of packets that can be sent at once.
+            priorities - An optional dict of packet type to ``PRIORITY_*`` overrides.
+        
+        """
+        scheduler, self._scheduler = self._scheduler, None
+        if scheduler:
+            if scheduler._timer:
+                scheduler._timer.cancel()
+            data = ''.join([entry[0] for queue in scheduler._queues for entry in queue if entry[0] is not None])
+            if data:
+                self._send(data)
+        if rate is not None:
+            priorities_ = dict(_PRIORITIES)
+            priorities_.update(priorities or {})
+            self._scheduler = _Scheduler(rate, burst, priorities_)
+            
+    def _send(self, data):
+        # Hand sends from other threads to the loop thread.
+        if _offloop():
+            _submit(self._send, data)
+            return
+        if self._held is not None:
+            self._held += data
+        elif self._scheduler is None:
+            self._stats.sent(data)
+            self._tcp.send(data)
+        else:
+            self._scheduler.submit(data)
+            self._release()
+            
+    def _release(self):
+        scheduler = self._scheduler
+        data = scheduler.release()
+        if data:
+            self._stats.sent(data)
+            self._tcp.send(data)
+            
+        # Wake up again when there is a token for the next queued packet.
+        if scheduler._timer is None and len(scheduler):
+            scheduler._timer = call_later((1.0 - scheduler._tokens) / scheduler.rate, self._release_later)
+        return bool(data)
+        
+    def _release_later(self):
+        if self._scheduler:
+            self._scheduler._timer = None
+            self._release()
             
     def _handle_connect(self):     
         self.connected = True
+        if self._backoff:
+            self._backoff.reset()
         self.dispatch(EVT_INIT)
         
     def _handle_close(self):
-        self.close()
+        self._drop()
         self.dispatch(EVT_CLOSE)
+        self._reconnect_later()
         
     def _handle_error(self):
-        self.close()
+        self._drop()
         self.dispatch(EVT_ERROR)
         traceback.print_exc()
+        self._reconnect_later()
+        
+    def _drop(self):
+        # Hold the packets sent from now until the reconnect, the close and
+        # error handlers may send some too.
+        self.connected = False
+        self._tcp.close()
+        if self._backoff and self._held is None:
+            self._held = ''
+            
+    def _reconnect_later(self):
+        # The handlers may have closed the connection or stopped reconnecting,
+        # the UDP socket is kept open while waiting to reconnect.
+        if not self._backoff:
+            self._udp.close()
+        elif not self._reconnect_timer:
+            self._reconnect_timer = call_later(self._backoff.next(), self._reopen)
+            
+    def _reopen(self):
+        self._reconnect_timer = None
+        self._stats.reconnects += 1
+        self._tcp = _TcpSocket(dispatch_to=self)
+        try:
+            self._tcp.connect(self.hostaddr)
+        except socket.error:
+            self._handle_error()
+            return
+        
+        # Send the init and resync requests before anything else, then the
+        # packets held while waiting.
+        if self._init_data:
+            data = self._init_data
+            if self._backoff.resync:
+                data += ''.join([insim_.IS_TINY(ReqI=_RESYNC_REQI, SubT=subt).pack() for subt in _RESYNC_SUBTS])
+            self._stats.sent(data)
+            self._tcp.send(data)
+        held, self._held = self._held, None
+        if held:
+            self._send(held)
     
     def _handle_tcp_read(self):
-        for data in self._tcp.get_packets():  
-            self._handle_insim_packet(data)
+        if self._conflate:
+            for data in _conflate(self, list(self._tcp.get_packets())):
+                self._handle_insim_packet(data)
+        else:
+            for data in self._tcp.get_packets():  
+                self._handle_insim_packet(data)
     
     def _handle_udp_read(self):
         data = self._udp.get_packet()
         size = len(data)
         if size in _OUTSIM_SIZE:
-            callbacks = self._callbacks.get(EVT_OUTSIM)
-            if callbacks:
-                packet = insim_.OutSimPack().unpack(data)
-                [c(self, packet) for c in callbacks]
+            _handle_outsim_packet(self, EVT_OUTSIM, insim_.OutSimPack, data)
         elif size in _OUTGAUGE_SIZE:
-            callbacks = self._callbacks.get(EVT_OUTGAUGE)
-            if callbacks:
-                packet = insim_.OutGaugePack().unpack(data)
-                [c(self, packet) for c in callbacks]
+            _handle_outsim_packet(self, EVT_OUTGAUGE, insim_.OutGaugePack, data)
         else:
-            self._handle_insim_packet(data)
+            self._handle_insim_packet(memoryview(data))
     
     def _handle_insim_packet(self, data):
         ptype = ord(data[1])
+        stats = self._stats
+        stats.received(ptype, len(data))
+        if ptype == insim_.ISP_TINY and self._handle_tiny(data):
+            return
+        entry = self._table[ptype]
+        if entry is None:
+            return
+        cls, raw, bound, pooled = entry
         
-        # Keep alive.
-        if ptype == insim_.ISP_TINY and ord(data[3]) == insim_.TINY_NONE:
-            self._tcp.send(data)
-            
+        # Handle raw packet events.
+        if raw:
+            if _profiler:
+                _profiler.invoke(self, ptype, raw, (ptype, data))
+            else:
+                stats.call(self, raw, (ptype, data))
+                    
         # Handle packet event.
-        bound = self._callbacks.get(ptype)
-        all_ = self._callbacks.get(EVT_ALL)
-        if bound or all_:
-            packet = _PACKET_MAP[ptype]().unpack(data)
-            if bound:
-                [c(self, packet) for c in bound]
-            if all_:
-                [c(self, packet) for c in all_]            
+        if bound:
+            if cls is None:
+                stats.dropped += 1
+                return
+            start = _clock()
+            try:
+                packet = (pooled or cls()).unpack(data.tobytes())
+            except struct.error:
+                stats.malformed += 1
+                return
+            decoded = _clock()
+            stats.decoded(ptype, decoded - start)
+            if _profiler:
+                _profiler.invoke(self, ptype, bound, (packet,))
+                stats.handled(ptype, _clock() - decoded)
+            else:
+                stats.handled(ptype, stats.call(self, bound, (packet,)) - decoded)
+            
+    def _handle_tiny(self, data):
+        # Reply to keep alives and time ping replies, returns true if the 
+        # packet is a ping reply, which is not dispatched.
+        subt = ord(data[3])
+        if subt == insim_.TINY_NONE:
+            self._send(data.tobytes())
+            if self._measure_rtt:
+                self.ping()
+        elif subt == insim_.TINY_REPLY and ord(data[2]) == _PING_REQI and self._stats._ping_sent:
+            stats = self._stats
+            stats.rtt = _clock() - stats._ping_sent
+            stats._ping_sent = 0.0
+            return True
+        return False
             
             
 class _OutSim(_Binding):
@@ -580,6 +1712,7 @@ class _OutSim(_Binding):
         _Binding.__init__(self)
         self.name = name
         self.hostaddr = ()
+        self._stats = _Stats()
         self._udp = _UdpSocket(dispatch_to=self, timeout=timeout)
         
     def _connect(self, host, port):
@@ -588,21 +1721,29 @@ class _OutSim(_Binding):
         
     def close(self):
         """Close the connection."""
+        if _offloop():
+            _submit(self.close)
+            return
         self._udp.close()
         
+    def stats(self):
+        """Get the performance counters for the connection.
+        
+        Returns:
+            A dict of counters, packet and byte counts are keyed by event type.
+        
+        """
+        return self._stats.snapshot()
+        
     def _handle_udp_read(self):
         data = self._udp.get_packet()
         size = len(data)
         if size in _OUTSIM_SIZE:
-            callbacks = self._callbacks.get(EVT_OUTSIM)
-            if callbacks:
-                packet = insim_.OutSimPack().unpack(data)
-                [c(self, packet) for c in callbacks]
+            _handle_outsim_packet(self, EVT_OUTSIM, insim_.OutSimPack, data)
         elif size in _OUTGAUGE_SIZE:
-            callbacks = self._callbacks.get(EVT_OUTGAUGE)
-            if callbacks:
-                packet = insim_.OutGaugePack().unpack(data)
-                [c(self, packet) for c in callbacks]
+            _handle_outsim_packet(self, EVT_OUTGAUGE, insim_.OutGaugePack, data)
+        else:
+            self._stats.dropped += 1
     
     def _handle_close(self):
         self.close()   
@@ -0,0 +1,231 @@
+# demux.py - OutGauge and OutSim demultiplexing module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import socket
+import errno
+import struct
+import collections
+import time
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'Collector',
+ ]
+
+
+# Constants.
+_TIME = struct.Struct('<I')
+_ID = struct.Struct('<i')
+_HISTORY_SIZE = 64
+_TIMEOUT = 30.0
+_CLOCK_RESTART = 1000
+
+
+class Collector(core._OutSim):
+    """Class to receive OutGauge or OutSim packets from many computers on one
+    port and split them into a Stream for each one.
+
+    Packets are split by their OutGauge or OutSim ID and, unless by_addr is
+    False, by the address they were sent from, so each rig can be given the
+    same ID. EVT_STREAM is dispatched on the collector with the new stream
+    when the first packet from a rig arrives, which is where the stream's
+    events should be bound. EVT_OUTGAUGE and EVT_OUTSIM can still be bound on
+    the collector to receive the packets from all of the rigs.
+
+    """
+    def __init__(self, host='127.0.0.1', port=30000, timeout=_TIMEOUT, history=_HISTORY_SIZE, by_addr=True, name='collector'):
+        """Create a new Collector object.
+
+        Args:
+            host - The local address the rigs send the packets to.
+            port - The local port the rigs send the packets to.
+            timeout - Number of seconds to wait for a packet before a stream
+                      times out and is removed (0 = never).
+            history - The number of packets each stream keeps.
+            by_addr - Split the packets by the address they were sent from
+                      as well as by ID.
+            name - An optional name for the connection.
+
+        """
+        core._OutSim.__init__(self, name)
+        self.streams = {}
+        self.timeout = timeout
+        self.history = history
+        self.by_addr = by_addr
+        self._udp.close()
+        self._udp = _AddressedUdpSocket(self)
+        self._connect(host, port)
+
+    def close(self):
+        """Close the connection and all of the streams."""
+        if core._offloop():
+            core._submit(self.close)
+            return
+        [stream.close() for stream in self.streams.values()]
+        core._OutSim.close(self)
+
+    def _handle_datagram(self, data, addr):
+        size = len(data)
+        if size in core._OUTSIM_SIZE:
+            evt, cls = core.EVT_OUTSIM, insim_.OutSimPack
+        elif size in core._OUTGAUGE_SIZE:
+            evt, cls = core.EVT_OUTGAUGE, insim_.OutGaugePack
+        else:
+            self._stats.dropped += 1
+            return
+        id_ = _ID.unpack_from(data, cls.pack_s.size)[0] if size > cls.pack_s.size else 0
+        key = (id_, addr) if self.by_addr else id_
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = self.streams[key] = Stream(self, key, id_, addr)
+            self.dispatch(core.EVT_STREAM, stream)
+        packet = stream._handle_packet(evt, cls, data, addr)
+        core._handle_outsim_packet(self, evt, cls, data, packet)
+
+
+class Stream(core._Binding):
+    """Class to hold the packets from one OutGauge or OutSim rig.
+
+    Bind EVT_OUTGAUGE or EVT_OUTSIM to receive its packets, EVT_TIMEOUT to be
+    told when it stops sending and EVT_GAP to be told when packets have been
+    lost, which is called with the number of packets missed. Gaps are found
+    from the Time field, which goes up by the OutGauge or OutSim delay with
+    each packet.
+
+    """
+    def __init__(self, collector, key, ID, addr):
+        """Create a new Stream object.
+
+        Args:
+            collector - The collector the stream belongs to.
+            key - The key of the stream in the collector's streams dict.
+            ID - The OutGauge or OutSim ID of the rig.
+            addr - The address the rig sends from.
+
+        """
+        core._Binding.__init__(self)
+        self.collector = collector
+        self.key = key
+        self.ID = ID
+        self.addr = addr
+        self.history = collections.deque(maxlen=collector.history)
+        self.interval = 0
+        self.gaps = 0
+        self.missed = 0
+        self.reordered = 0
+        self._stats = core._Stats()
+        self._last_time = None
+        self._timer = None
+        self._next_packet = 0.0
+        if collector.timeout:
+            self._timer = core.call_later(collector.timeout, self._check_timeout)
+
+    def close(self):
+        """Stop the stream, it is created again if the rig sends more packets."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self.collector.streams.get(self.key) is self:
+            del self.collector.streams[self.key]
+
+    def stats(self):
+        """Get the performance counters for the stream.
+
+        Returns:
+            A dict of counters, packet and byte counts are keyed by event type.
+
+        """
+        stats = self._stats.snapshot()
+        stats.update(gaps=self.gaps, missed=self.missed, reordered=self.reordered)
+        return stats
+
+    def packets(self):
+        """Get the packets the stream has kept, oldest first.
+
+        Returns:
+            A list of OutGaugePack or OutSimPack objects.
+
+        """
+        return [(insim_.OutSimPack() if len(data) in core._OUTSIM_SIZE else insim_.OutGaugePack()).unpack(data)
+                for data in self.history]
+
+    def _handle_packet(self, evt, cls, data, addr):
+        self.addr = addr
+        self.history.append(data)
+        if self._timer:
+            self._next_packet = time.time() + self.collector.timeout
+        time_ = _TIME.unpack_from(data)[0]
+        last, self._last_time = self._last_time, time_
+        if last is not None:
+            elapsed = time_ - last
+            if elapsed <= 0:
+                # Late packets are handled, but a jump back of a second or
+                # more is the game restarting the clock and is not counted.
+                if elapsed > -_CLOCK_RESTART:
+                    self.reordered += 1
+                    self._last_time = last
+            elif not self.interval or elapsed < self.interval:
+                # The smallest step seen is taken as the delay.
+                self.interval = elapsed
+            else:
+                missed = (elapsed + self.interval // 2) // self.interval - 1
+                if missed > 0:
+                    self.gaps += 1
+                    self.missed += missed
+                    self.dispatch(core.EVT_GAP, missed)
+        return core._handle_outsim_packet(self, evt, cls, data)
+
+    def _check_timeout(self):
+        remaining = self._next_packet - time.time()
+        if remaining > 0:
+            self._timer = core.call_later(remaining, self._check_timeout)
+        else:
+            self._timer = None
+            self.close()
+            self.dispatch(core.EVT_TIMEOUT)
+
+
+class _AddressedUdpSocket(core._UdpSocket):
+    """Class to read datagrams along with the address they were sent from."""
+    def __init__(self, dispatch_to):
+        core._UdpSocket.__init__(self, dispatch_to, 0.0)
+
+    def handle_read(self):
+        # Read the datagrams waiting in the socket together to save polling.
+        collector = self._dispatch_to
+        datagrams = []
+        try:
+            for i in xrange(core._CONFLATE_MAX_DATAGRAMS):
+                data, addr = self.socket.recvfrom(core._UDP_BUFFER_SIZE)
+                if len(data) % 4 > 0:
+                    collector._stats.malformed += 1
+                elif data:
+                    datagrams.append((data, addr))
+        except socket.error, err:
+            if err.args[0] not in (errno.EWOULDBLOCK, errno.EAGAIN):
+                raise
+        if collector._conflate and len(datagrams) > 1:
+            datagrams = _conflate(collector, datagrams)
+        for data, addr in datagrams:
+            collector._handle_datagram(data, addr)
+
+
+def _conflate(collector, datagrams):
+    # Conflate the datagrams from each address apart when the streams are
+    # split by address, keeping the order they arrived in.
+    groups = {}
+    for data, addr in datagrams:
+        groups.setdefault(addr if collector.by_addr else None, []).append(data)
+    kept = set()
+    for group in groups.itervalues():
+        kept.update([id(data) for data in core._conflate(collector, group, True)])
+    return [(data, addr) for data, addr in datagrams if id(data) in kept]
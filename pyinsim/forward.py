@@ -0,0 +1,143 @@
+# forward.py - OutGauge and OutSim forwarding module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import socket
+import time
+
+# Libraries
+import core
+
+__all__ = [
+    'Forwarder',
+ ]
+
+
+class Forwarder(core._OutSim):
+    """Class to receive OutGauge or OutSim packets once and forward them to
+    other programs.
+
+    The datagrams waiting in the socket are read together and sent on to
+    each destination as they were received, without being decoded. A
+    destination can be given a rate to only be sent that many packets a
+    second from each OutGauge or OutSim ID. The forwarder is also an
+    OutGauge and OutSim connection, so EVT_OUTGAUGE and EVT_OUTSIM can be
+    bound on it as well.
+
+    """
+    def __init__(self, host='127.0.0.1', port=30000, destinations=(), timeout=0.0, name='forwarder'):
+        """Create a new Forwarder object.
+
+        Args:
+            host - The local address LFS sends the packets to.
+            port - The local port LFS sends the packets to.
+            destinations - A sequence of (host, port) or (host, port, rate)
+                           tuples to forward the packets to.
+            timeout - Number of seconds to wait for a packet before timing out.
+            name - An optional name for the connection.
+
+        """
+        core._OutSim.__init__(self, name, timeout)
+        self.destinations = []
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(0)
+        self._connect(host, port)
+        [self.add(*destination) for destination in destinations]
+
+    def add(self, host, port, rate=0):
+        """Add a destination to forward the packets to.
+
+        Args:
+            host - The host to send the packets to.
+            port - The port to send the packets to.
+            rate - The most packets to send a second for each OutGauge or
+                   OutSim ID (0 = all of them).
+
+        Returns:
+            The destination, which counts the packets sent, skipped and
+            failed to send.
+
+        """
+        self.remove(host, port)
+        destination = _Destination((host, port), rate)
+        self.destinations.append(destination)
+        return destination
+
+    def remove(self, host, port):
+        """Stop forwarding the packets to a destination.
+
+        Args:
+            host - The host the packets are sent to.
+            port - The port the packets are sent to.
+
+        """
+        self.destinations = [d for d in self.destinations if d.addr != (host, port)]
+
+    def close(self):
+        """Close the connection."""
+        if core._offloop():
+            core._submit(self.close)
+            return
+        core._OutSim.close(self)
+        self._socket.close()
+
+    def _handle_udp_read(self):
+        if self._conflate:
+            # The socket has already read and conflated the waiting datagrams.
+            packets = [self._udp.get_packet()]
+        else:
+            packets = self._udp._read_pending()
+        if self.destinations:
+            sendto = self._socket.sendto
+            now = time.time()
+            [d._forward(sendto, packets, now) for d in self.destinations]
+        handle = core._OutSim._handle_udp_read
+        udp = self._udp
+        for data in packets:
+            udp._recv_buff = data
+            handle(self)
+
+
+class _Destination(object):
+    """Class to hold a forwarding destination and its counters."""
+    def __init__(self, addr, rate):
+        self.addr = addr
+        self.rate = rate
+        self.sent = 0
+        self.skipped = 0
+        self.errors = 0
+        self._interval = 1.0 / rate if rate else 0.0
+        self._due = {}
+
+    def _forward(self, sendto, packets, now):
+        addr = self.addr
+        if self._interval:
+            # Walk backwards so the latest packet for each ID is the one sent,
+            # anything that is not OutGauge or OutSim is passed straight on.
+            due = self._due
+            sending = []
+            for data in reversed(packets):
+                size = len(data)
+                if size not in core._OUTSIM_SIZE and size not in core._OUTGAUGE_SIZE:
+                    sending.append(data)
+                    continue
+                key = core._conflation_key(data, True)
+                if now < due.get(key, 0.0):
+                    self.skipped += 1
+                else:
+                    due[key] = now + self._interval
+                    sending.append(data)
+            sending.reverse()
+            packets = sending
+        for data in packets:
+            try:
+                sendto(data, addr)
+            except socket.error:
+                self.errors += 1
+            else:
+                self.sent += 1
@@ -958,7 +958,6 @@ class IS_ISI(object):
     """InSim Init - packet to initialise the InSim system.
 
     """
-    pack_s = struct.Struct('4B2HBcH15sx15sx')
     def __init__(self, ReqI=0, UDPPort=0, Flags=0, Prefix='\x00', Interval=0, Admin='', IName='pyinsim'):
         """Create a new IS_ISI packet.
 
@@ -983,25 +982,16 @@ class IS_ISI(object):
         self.Interval = Interval
         self.Admin = Admin
         self.IName = IName
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.UDPPort, self.Flags, self.InSimVer, self.Prefix, self.Interval, self.Admin, self.IName)
 
 class IS_VER(object):
     """VERsion.
 
     """
-    pack_s = struct.Struct('4B7sx5sxBB')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.Version, self.Product, self.InSimVer, self.Spare = self.pack_s.unpack(data)
-        self.Product = _eat_null_chars(self.Product)
-        self.Version = _eat_null_chars(self.Version)
-        return self
 
 class IS_TINY(object):
     """General purpose packet.
 
     """
-    pack_s = struct.Struct('4B')
     def __init__(self, ReqI=0, SubT=TINY_NONE):
         """Initialise a new IS_TINY packet.
 
@@ -1014,17 +1004,11 @@ class IS_TINY(object):
         self.Type = ISP_TINY
         self.ReqI = ReqI
         self.SubT = SubT
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.SubT)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.SubT = self.pack_s.unpack(data)
-        return self
 
 class IS_SMALL(object):
     """General purpose packet.
 
     """
-    pack_s = struct.Struct('4BI')
     def __init__(self, ReqI=0, SubT=SMALL_NONE, UVal=0):
         """Initialise a new IS_SMALL packet.
 
@@ -1039,17 +1023,11 @@ class IS_SMALL(object):
         self.ReqI = ReqI
         self.SubT = SubT
         self.UVal = UVal
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.SubT, self.UVal)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.SubT, self.UVal = self.pack_s.unpack(data)
-        return self
 
 class IS_TTC(object):
     """General purpose 8 byte packet (Target To Connection)
 
     """
-    pack_s = struct.Struct('8B')
     def __init__(self, ReqI=0, SubT=TTC_NONE, UCID=0, B1=0, B2=0, B3=0):
         self.Size = 8
         self.Type = ISP_TTC
@@ -1059,26 +1037,17 @@ class IS_TTC(object):
         self.B1 = B1        # B1, B2, B3 may be used in various ways depending on SubT
         self.B2 = B2
         self.B3 = B3
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.SubT, self.UCID, self.B1, self.B2, self.B3)
-
 
 class IS_STA(object):
     """STAte packet, sent whenever the data in the packet changes. To request
     this packet send a ``IS_TINY`` with a ``ReqI`` of non-zero and a ``SubT`` of ``TINY_STA``.
 
     """
-    pack_s = struct.Struct('4BfH10B5sx2B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.ReplaySpeed, self.Flags, self.InGameCam, self.ViewPLID, self.NumP, self.NumConns, self.NumFinished, self.RaceInProg, self.QualMins, self.RaceLaps, self.Spare2, self.Spare3, self.Track, self.Weather, self.Wind = self.pack_s.unpack(data)
-        self.Track = _eat_null_chars(self.Track)
-        return self
 
 class IS_SCH(object):
     """Single CHaracter
 
     """
-    pack_s = struct.Struct('4Bc3B')
     def __init__(self, ReqI=0, CharB='\x00', Flags=0):
         """Initialise a new IS_SCH packet.
 
@@ -1096,15 +1065,12 @@ class IS_SCH(object):
         self.Flags = Flags
         self.Spare2 = 0
         self.Spare3 = 0
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.CharB, self.Flags, self.Spare2, self.Spare3)
 
 class IS_SFP(object):
     """State Flags Pack. Send this packet to set the game state. Other states
     must be set by using key-presses or slash commands.
 
     """
-    pack_s = struct.Struct('4BH2B')
     def __init__(self, ReqI=0, Flag=0, OffOn=0):
         """Initialise a new IS_SFP packet.
 
@@ -1121,14 +1087,11 @@ class IS_SFP(object):
         self.Flag = Flag
         self.OffOn = OffOn
         self.Sp3 = 0
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.Flag, self.OffOn, self.Sp3)
 
 class IS_SCC(object):
     """Set Car Camera - Simplified camera packet (not SHIFT+U mode)
 
     """
-    pack_s = struct.Struct('8B')
     def __init__(self, ReqI=0, ViewPLID=0, InGameCam=0):
         """Initialise a new IS_SCC packet.
 
@@ -1146,14 +1109,11 @@ class IS_SCC(object):
         self.InGameCam = InGameCam
         self.Sp2 = 0
         self.Sp3 = 0
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.ViewPLID, self.InGameCam, self.Sp2, self.Sp3)
 
 class IS_CPP(object):
     """Cam Pos Pack - Full camera packet (in car or SHIFT+U mode)
 
     """
-    pack_s = struct.Struct('4B3i3H2Bf2H')
     def __init__(self, ReqI=0, Pos=[0,0,0], H=0, P=0, R=0, ViewPLID=0, InGameCam=0, FOV=0.0, Time=0, Flags=0):
         """Initialise a new IS_CPP packet.
 
@@ -1183,11 +1143,6 @@ class IS_CPP(object):
         self.FOV = FOV
         self.Time = Time
         self.Flags = Flags
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.Pos[0], self.Pos[1], self.Pos[2], self.H, self.P, self.R, self.ViewPLID, self.InGameCam, self.FOV, self.Time, self.Flags)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.Pos[0], self.Pos[1], self.Pos[2], self.H, self.P, self.R, self.ViewPLID, self.InGameCam, self.FOV, self.Time, self.Flags = self.pack_s.unpack(data)
-        return self
 
 class IS_ISM(object):
     """InSim Multi
@@ -1195,39 +1150,21 @@ class IS_ISM(object):
     LFS will send this packet when a host is started or joined.
 
     """
-    pack_s = struct.Struct('8B31sx')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.Host, self.Sp1, self.Sp2, self.Sp3, self.HName = self.pack_s.unpack(data)
-        self.HName = _eat_null_chars(self.HName)
-        return self
 
 class IS_MSO(object):
     """MSg Out - system messages and user messages
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.UCID, self.PLID, self.UserType, self.TextStart = self.pack_s.unpack(data[:8])
-        self.Msg = struct.unpack('%dsx' % int(self.Size - 9), data[8:])[0]
-        self.Msg = _eat_null_chars(self.Msg)
-        return self
 
 class IS_III(object):
     """InsIm Info - /i message from user to host's InSim
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.UCID, self.PLID, self.Sp2, self.Sp3 = self.pack_s.unpack(data[:8])
-        self.Msg = struct.unpack('%dsx' % self.Size - 9, data[8:])
-        self.Msg = _eat_null_chars(self.Msg)
-        return self
 
 class IS_MST(object):
     """MSg Type - send to LFS to type message or command
 
     """
-    pack_s = struct.Struct('4B63sx')
     def __init__(self, ReqI=0, Msg=''):
         """Initialise a new IS_MST packet.
 
@@ -1241,14 +1178,11 @@ class IS_MST(object):
         self.ReqI = ReqI
         self.Zero = 0
         self.Msg = Msg
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.Msg)
 
 class IS_MTC(object):
     """Msg To Connection - hosts only - send to a connection or a player
 
     """
-    pack_s = struct.Struct('8B')
     def __init__(self, ReqI=0, Sound=0, UCID=0, PLID=0, Msg=''):
         """Initialise a new IS_MTC packet.
 
@@ -1271,13 +1205,12 @@ class IS_MTC(object):
         self.Msg = Msg
     def pack(self):
         TEXT_SIZE = len(self.Msg) + (4 - (len(self.Msg) % 4))
-        return self.pack_s.pack(self.Size + TEXT_SIZE, self.Type, self.ReqI, self.Sound, self.UCID, self.PLID, self.Sp2, self.Sp3) + struct.pack('%ds' % TEXT_SIZE, self.Msg)
+        return self.pack_s.pack(self.pack_s.size + TEXT_SIZE, self.Type, self.ReqI, self.Sound, self.UCID, self.PLID, self.Sp2, self.Sp3) + struct.pack('%ds' % TEXT_SIZE, self.Msg)
 
 class IS_MOD(object):
     """MODe : send to LFS to change screen mode
 
     """
-    pack_s = struct.Struct('4B4i')
     def __init__(self, ReqI=0, Bits16=0, RR=0, Width=0, Height=0):
         """Initialise a new IS_MOD packet.
 
@@ -1297,67 +1230,36 @@ class IS_MOD(object):
         self.RR = RR
         self.Width = Width
         self.Height = Height
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.Bits16, self.RR, self.Width, self.Height)
 
 class IS_VTN(object):
     """VoTe Notify
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.UCID, self.Action, self.Spare2, self.Spare3 = self.pack_s.unpack(data)
-        return self
 
 class IS_RST(object):
     """Race STart
 
     """
-    pack_s = struct.Struct('8B5sx2B6H')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.RaceLaps, self.QualMins, self.NumP, self.Timing, self.Track, self.Weather, self.Wind, self.Flags, self.NumNodes, self.Finish, self.Split1, self.Split2, self.Split3 = self.pack_s.unpack(data)
-        self.Track = _eat_null_chars(self.Track)
-        return self
 
 class IS_NCN(object):
     """New ConN
 
     """
-    pack_s = struct.Struct('4B23sx23sx4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.UName, self.PName, self.Admin, self.Total, self.Flags, self.Sp3 = self.pack_s.unpack(data)
-        self.UName = _eat_null_chars(self.UName)
-        self.PName = _eat_null_chars(self.PName)
-        return self
 
 class IS_NCI(object):
     """New Connection Info
 
     """
-    pack_s = struct.Struct('8B2I')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.Language, self.Sp1, self.Sp2, self.Sp3, self.UserID, self.IPAddress = self.pack_s.unpack(data)
-        return self
 
 class IS_SLC(object):
     """SeLected Car - sent when a connection selects a car (empty if no car)
 
     """
-    pack_s = struct.Struct('4B4s')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.CName = self.pack_s.unpack(data)
-        self.CName = _eat_null_chars(self.CName)
-        return self
 
 class IS_CIM(object):
     """Conn Interface Mode
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.Mode, self.SubMode, self.SelType, self.Sp3 = self.pack_s.unpack(data)
-        return self
-
 # Mode identifiers
 CIM_NORMAL = 0          # not in a special mode
 CIM_OPTIONS = 1
@@ -1394,173 +1296,92 @@ class IS_CNL(object):
     """ConN Leave
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.Reason, self.Total, self.Sp2, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_CPR(object):
     """Conn Player Rename
 
     """
-    pack_s = struct.Struct('4B23sx7sx')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.PName, self.Plate = self.pack_s.unpack(data)
-        self.PName = _eat_null_chars(self.PName)
-        #self.Plate = _eat_null_chars(self.Plate) # No trailing zero on Plate.
-        return self
 
 class IS_NPL(object):
     """New PLayer joining race (if PLID already exists, then leaving pits)
 
     """
-    pack_s = struct.Struct('6BH23sx8s3sx15sx8Bi4B')
-    def unpack(self, data):
-        self.Tyres = [0,0,0,0]
-        self.Size, self.Type, self.ReqI, self.PLID, self.UCID, self.PType, self.Flags, self.PName, self.Plate, self.CName, self.SName, self.Tyres[0], self.Tyres[1], self.Tyres[2], self.Tyres[3], self.H_Mass, self.H_TRes, self.Model, self.Pass, self.Spare, self.SetF, self.NumP, self.Sp2, self.Sp3 = self.pack_s.unpack(data)
-        self.PName = _eat_null_chars(self.PName)
-        #self.Plate = _eat_null_chars(self.Plate) # No trailing zero
-        self.CName = _eat_null_chars(self.CName)
-        self.SName = _eat_null_chars(self.SName)
-        return self
 
 class IS_PLP(object):
     """PLayer Pits (go to settings - stays in player list)
 
     """
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID = self.pack_s.unpack(data)
-        return self
 
 class IS_PLL(object):
     """PLayer Leave race (spectate - removed from player list)
 
     """
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID = self.pack_s.unpack(data)
-        return self
 
 class IS_LAP(object):
     """LAP time
 
     """
-    pack_s = struct.Struct('4B2I2H4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.LTime, self.ETime, self.LapsDone, self.Flags, self.Sp0, self.Penalty, self.NumStops, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_SPX(object):
     """SPlit X time
 
     """
-    pack_s = struct.Struct('4B2I4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.STime, self.ETime, self.Split, self.Penalty, self.NumStops, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_PIT(object):
     """PIT stop (stop at pit garage)
 
     """
-    pack_s = struct.Struct('4B2H8B2I')
-    def unpack(self, data):
-        self.Tyres = [0, 0, 0, 0]
-        self.Size, self.Type, self.ReqI, self.PLID, self.LapsDone, self.Flags, self.Sp0, self.Penalty, self.NumStops, self.Sp3, self.Tyres[0], self.Tyres[1], self.Tyres[2], self.Tyres[3], self.Work, self.Spare = self.pack_s.unpack(data)
-        return self
 
 class IS_PSF(object):
     """Pit Stop Finished
 
     """
-    pack_s = struct.Struct('4B2I')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.STime, self.Spare = self.pack_s.unpack(data)
-        return self
 
 class IS_PLA(object):
     """Pit LAne
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.Fact, self.Sp1, self.Sp2, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_CCH(object):
     """Camera CHange
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.Camera, self.Sp1, self.Sp2, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_PEN(object):
     """PENalty (given or cleared)
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.OldPen, self.NewPen, self.Reason, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_TOC(object):
     """Take Over Car
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.OldUCID, self.NewUCID, self.Sp2, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_FLG(object):
     """FLaG (yellow or blue flag changed)
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.OffOn, self.Flag, self.CarBehind, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_PFL(object):
     """Player FLags (help flags changed)
 
     """
-    pack_s = struct.Struct('4B2H')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.Flags, self.Spare = self.pack_s.unpack(data)
-        return self
 
 class IS_FIN(object):
     """FINished race notification (not a final result - use :class:`IS_RES`)
 
     """
-    pack_s = struct.Struct('4B2I4B2H')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.TTime, self.BTime, self.SpA, self.NumStops, self.Confirm, self.SpB, self.LapsDone, self.Flags = self.pack_s.unpack(data)
-        return self
 
 class IS_RES(object):
     """RESult (qualify or confirmed finish)
 
     """
-    pack_s = struct.Struct('4B23sx23sx7sx3sx2I4B2H2BH')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.UName, self.PName, self.Plate, self.CName, self.TTime, self.BTime, self.SpA, self.NumStops, self.Confirm, self.SpB, self.LapsDone, self.Flags, self.ResultNum, self.NumRes, self.PSeconds = self.pack_s.unpack(data)
-        self.UName = _eat_null_chars(self.UName)
-        self.PName = _eat_null_chars(self.PName)
-        self.Plate = _eat_null_chars(self.Plate) # No trailing zero
-        self.CName = _eat_null_chars(self.CName)
-        return self
 
 class IS_REO(object):
     """REOrder (when race restarts after qualifying). The NumP value
     is filled in automatically from the PLID length.
 
     """
-    pack_s = struct.Struct('4B')
     def __init__(self, ReqI=0, PLID=[]):
         """Initialise a new IS_REO packet.
 
@@ -1576,61 +1397,44 @@ class IS_REO(object):
         self.PLID = PLID
     def pack(self):
         plid = ''.join([chr(p) for p in self.PLID]).ljust(MAX_PLAYERS, '\x00')
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, len(self.PLID)) + plid
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.NumP = self.pack_s.unpack(data[:4])
-        self.PLID = [ord(data[4+i]) for i in xrange(self.NumP)]
-        return self
+        return self.pack_s.pack(self.pack_s.size + MAX_PLAYERS, self.Type, self.ReqI, len(self.PLID)) + plid
 
 class IS_NLP(object):
     """Node and Lap Packet - variable size
 
     """
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.NumP = self.pack_s.unpack(data[:4])
-        data = data[4:]
-        self.Info = [NodeLap(data, i) for i in xrange(0, self.NumP * 6, 6)]
-        return self
 
 class NodeLap(object):
     """Car info in 6 bytes - there is an array of these in the :class:`IS_NLP`
 
     """
-    pack_s = struct.Struct('2H2B')
-    def __init__(self, data, index):
+    def __init__(self, data=None, index=0):
         """Initialise a new NodeLap sub-packet.
 
         """
-        self.Node, self.Lap, self.PLID, self.Position = self.pack_s.unpack(data[index:index+6])
+        if data is not None:
+            self.unpack(data, index)
 
 class IS_MCI(object):
     """Multi Car Info - if more than 8 in race then more than one of these is sent
 
     """
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.NumC = self.pack_s.unpack(data[:4])
-        data = data[4:]
-        self.Info = [CompCar(data, i) for i in xrange(0, self.NumC * 28, 28)]
-        return self
 
 class CompCar(object):
     """Car info in 28 bytes - there is an array of these in the :class:`IS_MCI`
 
     """
-    pack_s = struct.Struct('2H4B3i3Hh')
-    def __init__(self, data, index):
+    def __init__(self, data=None, index=0):
         """Initialise a new CompCar sub-packet.
 
         """
-        self.Node, self.Lap, self.PLID, self.Position, self.Info, self.Sp3, self.X, self.Y, self.Z, self.Speed, self.Direction, self.Heading, self.AngVel = self.pack_s.unpack(data[index:index+28])
+        if data is not None:
+            self.unpack(data, index)
 
 class IS_MSX(object):
     """MSg eXtended - like ``IS_MST`` but longer (not for commands)
 
     """
-    pack_s = struct.Struct('4B95sx')
     def __init__(self, ReqI=0, Msg=''):
         """Initialise a new IS_MSX packet.
 
@@ -1644,14 +1448,11 @@ class IS_MSX(object):
         self.ReqI = ReqI
         self.Zero = 0
         self.Msg = Msg
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.Msg)
 
 class IS_MSL(object):
     """MSg Local - message to appear on local computer only
 
     """
-    pack_s = struct.Struct('4B127sx')
     def __init__(self, ReqI=0, Sound=0, Msg=''):
         """Initialise a new IS_MSL packet.
 
@@ -1666,23 +1467,16 @@ class IS_MSL(object):
         self.ReqI = ReqI
         self.Sound = Sound
         self.Msg = Msg
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Sound, self.Msg)
 
 class IS_CRS(object):
     """Car ReSet
 
     """
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID = self.pack_s.unpack(data)
-        return self
 
 class IS_BFN(object):
     """Button FunctioN - delete buttons / receive button requests
 
     """
-    pack_s = struct.Struct('8B')
     def __init__(self, ReqI=0, SubT=0, UCID=0, ClickID=0, MaxClick=0, Inst=0):
         """Initialise a new IS_BFN packet.
 
@@ -1703,36 +1497,21 @@ class IS_BFN(object):
         self.ClickID = ClickID
         self.MaxClick = MaxClick
         self.Inst = Inst
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.SubT, self.UCID, self.ClickID, self.MaxClick, self.Inst)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.SubT, self.UCID, self.ClickID, self.MaxClick, self.Inst = self.pack_s.unpack(data)
-        return self
 
 class IS_AXI(object):
     """AutoX Info
 
     """
-    pack_s = struct.Struct('6BH31sx')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.AXStart, self.NumCP, self.NumO, self.LName = self.pack_s.unpack(data)
-        self.LName = _eat_null_chars(self.LName)
-        return self
 
 class IS_AXO(object):
     """AutoX Object
 
     """
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID = self.pack_s.unpack(data)
-        return self
 
 class IS_BTN(object):
     """BuTtoN - button header - followed by 0 to 240 characters
 
     """
-    pack_s = struct.Struct('12B')
     def __init__(self, ReqI=0, UCID=0, ClickID=0, Inst=0, BStyle=0, TypeIn=0, L=0, T=0, W=0, H=0, Text=''):
         """Initialise a new IS_BTN packet.
 
@@ -1765,32 +1544,22 @@ class IS_BTN(object):
         self.Text = Text
     def pack(self):
         TEXT_SIZE = int(math.ceil(len(self.Text) / 4.0)) * 4
-        return self.pack_s.pack(self.Size + TEXT_SIZE, self.Type, self.ReqI, self.UCID, self.ClickID, self.Inst, self.BStyle, self.TypeIn, self.L, self.T, self.W, self.H) + struct.pack('%ds' % TEXT_SIZE, self.Text)
+        return self.pack_s.pack(self.pack_s.size + TEXT_SIZE, self.Type, self.ReqI, self.UCID, self.ClickID, self.Inst, self.BStyle, self.TypeIn, self.L, self.T, self.W, self.H) + struct.pack('%ds' % TEXT_SIZE, self.Text)
 
 class IS_BTC(object):
     """BuTton Click - sent back when user clicks a button
 
     """
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.ClickID, self.Inst, self.CFlags, self.Sp3 = self.pack_s.unpack(data)
-        return self
 
 class IS_BTT(object):
     """BuTton Type - sent back when user types into a text entry button
 
     """
-    pack_s = struct.Struct('8B95sx')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.UCID, self.ClickID, self.Inst, self.TypeIn, self.Sp3, self.Text = self.pack_s.unpack(data)
-        self.Text = _eat_null_chars(self.Text)
-        return self
 
 class IS_RIP(object):
     """Replay Information Packet
 
     """
-    pack_s = struct.Struct('8B2H63sx')
     def __init__(self, ReqI=0, Error=0, MPR=0, Paused=0, Options=0, CTime=0, TTime=0, RName=''):
         """Initialise a new IS_RIP packet.
 
@@ -1816,18 +1585,11 @@ class IS_RIP(object):
         self.CTime = CTime
         self.TTime = TTime
         self.RName = RName
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Error, self.MPR, self.Paused, self.Options, self.Sp3, self.CTime, self.TTime, self.RName)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Error, self.MPR, self.Paused, self.Options, self.Sp3, self.CTime, self.TTime, self.RName = self.pack_s.unpack(data)
-        self.RName = _eat_null_chars(self.RName)
-        return self
 
 class IS_SSH(object):
     """ScreenSHot
 
     """
-    pack_s = struct.Struct('8B31sx')
     def __init__(self, ReqI=0, Error=0, BMP=''):
         """Initialise a new IS_SSH packet.
 
@@ -1846,31 +1608,22 @@ class IS_SSH(object):
         self.Sp2 = 0
         self.Sp3 = 0
         self.BMP = BMP
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Error, self.Sp0, self.Sp1, self.Sp2, self.Sp3, self.BMP)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Error, self.Sp0, self.Sp1, self.Sp2, self.Sp3, self.BMP = self.pack_s.unpack(data)
-        self.BMP = _eat_null_chars(self.BMP)
-        return self
 
 class CarContact(object):
     """Info about one car in a contact - two of these in the IS_CON
 
     """
-    pack_s = struct.Struct('3Bb6b2B2h')
-    def __init__(self, data):
-        self.PLID, self.Info, self.Sp2, self.Steer, self.ThrBrk, self.CluHan, self.GearSp, self.Speed, self.Direction, self.Heading, self.AccelF, self.AccelR, self.X, self.Y = self.pack_s.unpack(data)
+    def __init__(self, data=None, index=0):
+        """Initialise a new CarContact sub-packet.
+
+        """
+        if data is not None:
+            self.unpack(data, index)
 
 class IS_CON(object):
     """CONtact - between two cars (A and B are sorted by PLID)
 
     """
-    pack_s = struct.Struct('4B2H')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.SpClose, self.Time = self.pack_s.unpack(data[:8])
-        self.A = CarContact(data[8:24])
-        self.B = CarContact(data[24:])
-        return self
 
 class CarContOBJ(object):
     def __init__(self):
@@ -1881,32 +1634,34 @@ class CarContOBJ(object):
         self.X = 0
         self.Y = 0
 
+    # IS_UCO and IS_CSC called the Zbyte field Sp2.
+    @property
+    def Sp2(self):
+        return self.Zbyte
+
+    @Sp2.setter
+    def Sp2(self, value):
+        self.Zbyte = value
+
 OBH_LAYOUT = 1
 OBH_CAN_MOVE = 2
 OBH_WAS_MOVING = 4
 OBH_ON_SPOT = 8
 
 class IS_OBH(object):
-    pack_s = struct.Struct('4B2H4B2h2h4B')
-    def unpack(self, data):
-        self.C = CarContOBJ()
-        self.Size, self.Type, self.ReqI, self.PLID, self.SpClose, self.Time, self.C.Direction, self.C.Heading, self.C.Speed, self.C.Zbyte, self.C.X, self.C.Y, self.X, self.Y, self.Zbyte, self.Sp1, self.Index, self.OBHFlags = self.pack_s.unpack(data)
-        return self
+    """OBject Hit - car hit an autocross object or an unknown object
+
+    """
 
 class IS_HLV(object):
-    pack_s = struct.Struct('6BH4B2h')
-    def unpack(self, data):
-        self.C = CarContOBJ()
-        self.Size, self.Type, self.ReqI, self.PLID, self.HLVC, self.Sp1, self.Time, self.C.Direction, self.C.Heading, self.C.Speed, self.C.Zbyte, self.C.X, self.C.Y = self.pack_s.unpack(data)
-        return self
+    """Hot Lap Validity - off track / hit wall / speeding in pits / out of bounds
+
+    """
 
 class IS_UCO(object):
-    pack_s = struct.Struct('8BI4B2h')
-    def unpack(self, data):
-        self.C = CarContOBJ() # 4B2h
-        self.Size, self.Type, self.ReqI, self.PLID, self.Sp0, self.UCOAction, self.Sp2, self.Sp3, self.Time, self.C.Direction, self.C.Heading, self.C.Speed, self.C.Sp2, self.C.X, self.C.Y = self.pack_s.unpack(data[:20])
-        self.Info = ObjectInfo(data[20:], 0)
-        return self
+    """User Control Object - reports crossing an InSim checkpoint / entering an InSim circle
+
+    """
 
 UCO_CIRCLE_ENTER = 0
 UCO_CIRCLE_LEAVE = 1
@@ -1914,11 +1669,9 @@ UCO_CP_FWD = 2
 UCO_CP_REV = 3
 
 class IS_CSC(object):
-    pack_s = struct.Struct('8BI4B2h')
-    def unpack(self, data):
-        self.C = CarContOBJ() # 4B2h
-        self.Size, self.Type, self.ReqI, self.PLID, self.Sp0, self.CSCAction, self.Sp2, self.Sp3, self.Time, self.C.Direction, self.C.Heading, self.C.Speed, self.C.Sp2, self.C.X, self.C.Y = self.pack_s.unpack(data)
-        return self
+    """Car State Changed - reports a change in a car's state (currently start or stop)
+
+    """
 
 CSC_STOP = 0
 CSC_START = 1
@@ -1927,7 +1680,6 @@ class IS_OCO(object):
     """ Object COntrol
 
     """
-    pack_s = struct.Struct('8B')
     def __init__(self, OCOAction=0, Index=0, Identifier=0, Data=0):
         """ Initialise a new IS_OCO packet
         Args:
@@ -1955,11 +1707,6 @@ class IS_OCO(object):
         self.Index = Index
         self.Identifier = Identifier
         self.Data = Data
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.OCOAction, self.Index, self.Identifier, self.Data)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.OCOAction, self.Index, self.Identifier, self.Data = self.pack_s.unpack(data)
-        return self
 
 OCO_ZERO = 0            # reserved
 OCO_1 = 1
@@ -1973,9 +1720,15 @@ OCO_INDEX_MAIN = 240    # special value to override the main start light system
 
 
 class ObjectInfo(object):
-    pack_s = struct.Struct('2h4B')
-    def __init__(self, data, index):
-        self.X, self.Y, self.Zbyte, self.Flags, self.Index, self.Heading = self.pack_s.unpack(data[index:index+8])
+    """Object layout info in 8 bytes - there is an array of these in the :class:`IS_AXM`
+
+    """
+    def __init__(self, data=None, index=0):
+        """Initialise a new ObjectInfo sub-packet.
+
+        """
+        if data is not None:
+            self.unpack(data, index)
 
 # PMOAction
 PMO_LOADING_FILE = 0
@@ -1995,10 +1748,9 @@ PMO_SELECTION_REAL = 4
 PMO_AVOID_CHECK = 8
 
 class IS_AXM(object):
-    pack_s = struct.Struct('8B')
     def __init__(self, ReqI=0, NumO=0, UCID=0, PMOAction=0, PMOFlags=0, Sp3=0, Info=[]):
         self.Size = 8
-        self.Type = ISP_OCO
+        self.Type = ISP_AXM
         self.ReqI = ReqI
         self.NumO = NumO
         self.UCID = UCID
@@ -2007,23 +1759,13 @@ class IS_AXM(object):
         self.Sp3 = Sp3
         self.Info = Info
     def pack(self):
-        data = self.pack_s.pack(self.Size + (self.NumO * 8), self.Type, self.ReqI, self.NumO, self.UCID, self.PMOAction, self.PMOFlags, self.Sp3)
-        for i in range(self.NumO):
-            data = data + self.Info[i].pack()
-        return data
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.NumO, self.UCID, self.PMOAction, self.PMOFlags, self.Sp3 = self.pack_s.unpack(data[:8])
-        data = data[8:]
-        self.Info = [ObjectInfo(data, i) for i in xrange(0, self.NumO * 8, 8)]
-        return self
+        data = self.pack_s.pack(self.pack_s.size + len(self.Info) * 8, self.Type, self.ReqI, len(self.Info), self.UCID, self.PMOAction, self.PMOFlags, self.Sp3)
+        return data + ''.join([info.pack() for info in self.Info])
 
 class IS_ACR(object):
-    pack_s = struct.Struct('8B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Zero, self.UCID, self.Admin, self.Result, self.Sp3 = self.pack_s.unpack(data[:8])
-        self.Text = struct.unpack('%dsx' % self.Size - 9, data[8:])
-        self.Text = _eat_null_chars(self.Text)
-        return self
+    """Admin Command Report - a user typed an admin command
+
+    """
 
 CAR_NONE = 0
 CAR_XFG = 1
@@ -2049,7 +1791,6 @@ CAR_FBM = 0x80000
 CAR_ALL = 0xffffffff
 
 class IS_PLC(object):
-    pack_s = struct.Struct('8BI')
     def __init__(self, UCID=0, Cars=CAR_NONE):
         self.Size = 12
         self.Type = ISP_PLC
@@ -2060,8 +1801,6 @@ class IS_PLC(object):
         self.Sp2 = 0
         self.Sp3 = 0
         self.Cars = Cars
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.UCID, self.Sp1, self.Sp2, self.Sp3, self.Cars)
 
 JRR_REJECT = 0
 JRR_SPAWN = 1
@@ -2073,21 +1812,16 @@ JRR_6 = 6
 JRR_7 = 7
 
 class IS_JRR(object):
-    pack_s = struct.Struct('8B2h4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.PLID, self.UCID, self.JRRAction, self.Sp2, self.Sp3, self.X, self.Y, self.Zbyte, self.Flags, self.Index, self.Heading = self.pack_s.unpack(data)
-        return self
+    """Join Request Reply - send one of these back to LFS in response to a join request
+
+    """
 
 class CarHCP(object):
-    pack_s = struct.Struct('2B')
     def __init__(self, H_Mass=0, H_TRes=0):
         self.H_Mass = H_Mass
         self.H_TRes = H_TRes
-    def pack(self):
-        return self.pack_s.pack(self.H_Mass, self.H_TRes)
 
 class IS_HCP(object):
-    pack_s = struct.Struct('4B')
     def __init__(self, ReqI=0, Zero=0, Info=[]):
         self.Size = 68
         self.Type = ISP_HCP
@@ -2116,32 +1850,29 @@ IR_ERR_SPEC     = 5
 IR_ERR_NOSPEC   = 6
 
 class IR_HLR(object):
-    pack_s = struct.Struct('4B')
     def __init__(self, ReqI=0):
         self.Size = 4
         self.Type = IRP_HLR
         self.ReqI = ReqI
         self.Sp0 = 0
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Sp0)
 
 class IR_HOS(object):
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.NumHosts = self.pack_s.unpack(data[:4])
-        data = data[4:]
-        self.Info = [HInfo(data, i) for i in xrange(0, self.NumHosts * 40, 40)]
-        return self
+    """Hostlist (hosts connected to the Relay)
+
+    """
 
 class HInfo(object):
-    pack_s = struct.Struct('31sx5sx2B')
-    def __init__(self, data, index):
-        self.HName, self.Track, self.Flags, self.NumConns = self.pack_s.unpack(data[index:index+40])
-        self.HName = _eat_null_chars(self.HName)
-        self.Track = _eat_null_chars(self.Track)
+    """Host info in 40 bytes - there is an array of these in the :class:`IR_HOS`
+
+    """
+    def __init__(self, data=None, index=0):
+        """Initialise a new HInfo sub-packet.
+
+        """
+        if data is not None:
+            self.unpack(data, index)
 
 class IR_SEL(object):
-    pack_s = struct.Struct('4B31sx15sx15sx')
     def __init__(self, ReqI=0, HName='', Admin='', Spec=''):
         self.Size = 68
         self.Type = IRP_SEL
@@ -2150,34 +1881,25 @@ class IR_SEL(object):
         self.HName = HName
         self.Admin = Admin
         self.Spec = Spec
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Zero, self.HName, self.Admin, self.Spec)
 
 class IR_ARQ(object):
-    pack_s = struct.Struct('4B')
     def __init__(self, ReqI=0):
         self.Size = 4
         self.Type = IRP_ARQ
         self.ReqI = ReqI
         self.Sp0 = 0
-    def pack(self):
-        return self.pack_s.pack(self.Size, self.Type, self.ReqI, self.Sp0)
 
 class IR_ARP(object):
-    pack_s = struct.Struct('4B')
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.Admin = self.pack_s.unpack(data)
-        return self
+    """Admin Response
+
+    """
 
 class IR_ERR(object):
-    pack_s = struct.Struct('4B'
-)
-    def unpack(self, data):
-        self.Size, self.Type, self.ReqI, self.ErrNo = self.pack_s.unpack(data)
-        return self
+    """Relay ERRor
+
+    """
 
 class OutSimPack(object):
-    pack_s = struct.Struct('I12f3i')
     def __init__(self):
         self.Time = 0
         self.AngVel = [0.0, 0.0, 0.0]
@@ -2188,12 +1910,6 @@ class OutSimPack(object):
         self.Vel = [0.0, 0.0, 0.0]
         self.Pos = [0, 0, 0]
         self.ID = 0
-    def unpack(self, data):
-        self.Time, self.AngVel[0], self.AngVel[1], self.AngVel[2], self.Heading, self.Pitch, self.Roll, self.Accel[0], self.Accel[1], self.Accel[2], self.Vel[0], self.Vel[1], self.Vel[2], self.Pos[0], self.Pos[1], self.Pos[2] = self.pack_s.unpack(data[:64])
-        if len(data) == 68:
-            self.ID = struct.unpack('i', data[64:])
-        return self
-
 # Bits for OutGaugePack Flags
 OG_SHIFT = 1
 OG_CTRL = 2
@@ -2217,7 +1933,6 @@ DL_SPARE = 2048
 DL_NUM= 4096
 
 class OutGaugePack(object):
-    pack_s = struct.Struct('I3sxH2B7f2I3f15sx15sx')
     def __init__(self):
         self.Time = 0
         self.Car = ''
@@ -2239,14 +1954,278 @@ class OutGaugePack(object):
         self.Display1 = ''
         self.Display2 = ''
         self.ID = 0
-    def unpack(self, data):
-        self.Time, self.Car, self.Flags, self.Gear, self.PLID, self.Speed, self.RPM, self.Turbo, self.EngTemp,self.Fuel, self.OilPress, self.OilTemp, self.DashLights, self.ShowLights, self.Throttle, self.Brake, self.Clutch, self.Display1,self.Display2 = self.pack_s.unpack(data[:92])
-        self.Display1 = _eat_null_chars(self.Display1)
-        self.Display2 = _eat_null_chars(self.Display2)
-        if len(data) == 96:
-            self.ID = struct.unpack('i', data[92:])
-        return self
 
+# Packet layouts, the pack and unpack methods of the packet classes are
+# generated from these when the module is imported. Each field is Name:format
+# where format is one of:
+#
+#   a struct format - one value, or a list if the count is more than one,
+#                     strings have trailing zeros removed unless followed by !
+#   a struct format followed by ? - a value only present in longer packets
+#   Name            - a sub-packet
+#   Name*Count      - a list of sub-packets, Count is a number or a field
+#   B*Count         - a list of bytes
+#   text            - the text to the end of the packet
+#
+# A field with no format is a byte. Sub-packets must come before the packets
+# that contain them, and variable length fields must come last.
+_HEADER = 'Size Type ReqI'
+_LAYOUTS = [
+    (NodeLap, 'Node:H Lap:H PLID Position'),
+    (CompCar, 'Node:H Lap:H PLID Position Info Sp3 X:i Y:i Z:i Speed:H Direction:H Heading:H AngVel:h'),
+    (CarContact, 'PLID Info Sp2 Steer:b ThrBrk CluHan GearSp Speed Direction Heading AccelF:b AccelR:b X:h Y:h'),
+    (CarContOBJ, 'Direction Heading Speed Zbyte X:h Y:h'),
+    (ObjectInfo, 'X:h Y:h Zbyte Flags Index Heading'),
+    (CarHCP, 'H_Mass H_TRes'),
+    (HInfo, 'HName:31sx Track:5sx Flags NumConns'),
+    (IS_ISI, _HEADER + ' Zero UDPPort:H Flags:H InSimVer Prefix:c Interval:H Admin:15sx IName:15sx'),
+    (IS_VER, _HEADER + ' Zero Version:7sx Product:5sx InSimVer Spare'),
+    (IS_TINY, _HEADER + ' SubT'),
+    (IS_SMALL, _HEADER + ' SubT UVal:I'),
+    (IS_TTC, _HEADER + ' SubT UCID B1 B2 B3'),
+    (IS_STA, _HEADER + ' Zero ReplaySpeed:f Flags:H InGameCam ViewPLID NumP NumConns NumFinished RaceInProg QualMins RaceLaps Spare2 Spare3 Track:5sx Weather Wind'),
+    (IS_SCH, _HEADER + ' Zero CharB:c Flags Spare2 Spare3'),
+    (IS_SFP, _HEADER + ' Zero Flag:H OffOn Sp3'),
+    (IS_SCC, _HEADER + ' Zero ViewPLID InGameCam Sp2 Sp3'),
+    (IS_CPP, _HEADER + ' Zero Pos:3i H:H P:H R:H ViewPLID InGameCam FOV:f Time:H Flags:H'),
+    (IS_ISM, _HEADER + ' Zero Host Sp1 Sp2 Sp3 HName:31sx'),
+    (IS_MSO, _HEADER + ' Zero UCID PLID UserType TextStart Msg:text'),
+    (IS_III, _HEADER + ' Zero UCID PLID Sp2 Sp3 Msg:text'),
+    (IS_MST, _HEADER + ' Zero Msg:63sx'),
+    (IS_MTC, _HEADER + ' Sound UCID PLID Sp2 Sp3 Msg:text'),
+    (IS_MOD, _HEADER + ' Zero Bits16:i RR:i Width:i Height:i'),
+    (IS_VTN, _HEADER + ' Zero UCID Action Spare2 Spare3'),
+    (IS_RST, _HEADER + ' Zero RaceLaps QualMins NumP Timing Track:5sx Weather Wind Flags:H NumNodes:H Finish:H Split1:H Split2:H Split3:H'),
+    (IS_NCN, _HEADER + ' UCID UName:23sx PName:23sx Admin Total Flags Sp3'),
+    (IS_NCI, _HEADER + ' UCID Language Sp1 Sp2 Sp3 UserID:I IPAddress:I'),
+    (IS_SLC, _HEADER + ' UCID CName:4s'),
+    (IS_CIM, _HEADER + ' UCID Mode SubMode SelType Sp3'),
+    (IS_CNL, _HEADER + ' UCID Reason Total Sp2 Sp3'),
+    (IS_CPR, _HEADER + ' UCID PName:23sx Plate:7sx!'),
+    (IS_NPL, _HEADER + ' PLID UCID PType Flags:H PName:23sx Plate:8s! CName:3sx SName:15sx Tyres:4B H_Mass H_TRes Model Pass Spare:i SetF NumP Sp2 Sp3'),
+    (IS_PLP, _HEADER + ' PLID'),
+    (IS_PLL, _HEADER + ' PLID'),
+    (IS_LAP, _HEADER + ' PLID LTime:I ETime:I LapsDone:H Flags:H Sp0 Penalty NumStops Sp3'),
+    (IS_SPX, _HEADER + ' PLID STime:I ETime:I Split Penalty NumStops Sp3'),
+    (IS_PIT, _HEADER + ' PLID LapsDone:H Flags:H Sp0 Penalty NumStops Sp3 Tyres:4B Work:I Spare:I'),
+    (IS_PSF, _HEADER + ' PLID STime:I Spare:I'),
+    (IS_PLA, _HEADER + ' PLID Fact Sp1 Sp2 Sp3'),
+    (IS_CCH, _HEADER + ' PLID Camera Sp1 Sp2 Sp3'),
+    (IS_PEN, _HEADER + ' PLID OldPen NewPen Reason Sp3'),
+    (IS_TOC, _HEADER + ' PLID OldUCID NewUCID Sp2 Sp3'),
+    (IS_FLG, _HEADER + ' PLID OffOn Flag CarBehind Sp3'),
+    (IS_PFL, _HEADER + ' PLID Flags:H Spare:H'),
+    (IS_FIN, _HEADER + ' PLID TTime:I BTime:I SpA NumStops Confirm SpB LapsDone:H Flags:H'),
+    (IS_RES, _HEADER + ' PLID UName:23sx PName:23sx Plate:7sx CName:3sx TTime:I BTime:I SpA NumStops Confirm SpB LapsDone:H Flags:H ResultNum NumRes PSeconds:H'),
+    (IS_REO, _HEADER + ' NumP PLID:B*NumP'),
+    (IS_NLP, _HEADER + ' NumP Info:NodeLap*NumP'),
+    (IS_MCI, _HEADER + ' NumC Info:CompCar*NumC'),
+    (IS_MSX, _HEADER + ' Zero Msg:95sx'),
+    (IS_MSL, _HEADER + ' Sound Msg:127sx'),
+    (IS_CRS, _HEADER + ' PLID'),
+    (IS_BFN, _HEADER + ' SubT UCID ClickID MaxClick Inst'),
+    (IS_AXI, _HEADER + ' Zero AXStart NumCP NumO:H LName:31sx'),
+    (IS_AXO, _HEADER + ' PLID'),
+    (IS_BTN, _HEADER + ' UCID ClickID Inst BStyle TypeIn L T W H Text:text'),
+    (IS_BTC, _HEADER + ' UCID ClickID Inst CFlags Sp3'),
+    (IS_BTT, _HEADER + ' UCID ClickID Inst TypeIn Sp3 Text:95sx'),
+    (IS_RIP, _HEADER + ' Error MPR Paused Options Sp3 CTime:H TTime:H RName:63sx'),
+    (IS_SSH, _HEADER + ' Error Sp0 Sp1 Sp2 Sp3 BMP:31sx'),
+    (IS_CON, _HEADER + ' Zero SpClose:H Time:H A:CarContact B:CarContact'),
+    (IS_OBH, _HEADER + ' PLID SpClose:H Time:H C:CarContOBJ X:h Y:h Zbyte Sp1 Index OBHFlags'),
+    (IS_HLV, _HEADER + ' PLID HLVC Sp1 Time:H C:CarContOBJ'),
+    (IS_UCO, _HEADER + ' PLID Sp0 UCOAction Sp2 Sp3 Time:I C:CarContOBJ Info:ObjectInfo'),
+    (IS_CSC, _HEADER + ' PLID Sp0 CSCAction Sp2 Sp3 Time:I C:CarContOBJ'),
+    (IS_OCO, _HEADER + ' Zero OCOAction Index Identifier Data'),
+    (IS_AXM, _HEADER + ' NumO UCID PMOAction PMOFlags Sp3 Info:ObjectInfo*NumO'),
+    (IS_ACR, _HEADER + ' Zero UCID Admin Result Sp3 Text:text'),
+    (IS_PLC, _HEADER + ' Zero UCID Sp1 Sp2 Sp3 Cars:I'),
+    (IS_JRR, _HEADER + ' PLID UCID JRRAction Sp2 Sp3 X:h Y:h Zbyte Flags Index Heading'),
+    (IS_HCP, _HEADER + ' Zero Info:CarHCP*32'),
+    (IR_HLR, _HEADER + ' Sp0'),
+    (IR_HOS, _HEADER + ' NumHosts Info:HInfo*NumHosts'),
+    (IR_SEL, _HEADER + ' Zero HName:31sx Admin:15sx Spec:15sx'),
+    (IR_ARQ, _HEADER + ' Sp0'),
+    (IR_ARP, _HEADER + ' Admin'),
+    (IR_ERR, _HEADER + ' ErrNo'),
+    (OutSimPack, 'Time:I AngVel:3f Heading:f Pitch:f Roll:f Accel:3f Vel:3f Pos:3i ID:i?'),
+    (OutGaugePack, 'Time:I Car:3sx! Flags:H Gear PLID Speed:f RPM:f Turbo:f EngTemp:f Fuel:f OilPress:f OilTemp:f DashLights:I ShowLights:I Throttle:f Brake:f Clutch:f Display1:15sx Display2:15sx ID:i?'),
+]
+
+_variable_structs = {}
+
+
+def _variable_struct(format_):
+    # Cache the structs for variable length fields by format.
+    struct_ = _variable_structs.get(format_)
+    if struct_ is None:
+        struct_ = _variable_structs[format_] = struct.Struct(format_)
+    return struct_
+
+
+def _compile_layout(cls, layout, sub_packets):
+    formats = []    # struct formats of the fixed size fields
+    create = []     # statements creating the sub-packets
+    targets = []    # targets of the unpacked values
+    convert = []    # statements converting the unpacked values
+    values = []     # expressions of the values to pack
+    variable = []   # the variable length field
+    names = {}
+
+    def add_fields(layout, obj, attr):
+        for field in layout.split():
+            name, _, spec = field.partition(':')
+            spec = spec or 'B'
+            if variable:
+                raise ValueError('%s.%s follows a variable length field' % (cls.__name__, name))
+            if spec == 'text' or spec[-1] == '?' or '*' in spec:
+                variable.append((name, spec))
+            elif spec in sub_packets:
+                local = '_p%d' % len(create)
+                names[spec] = sub_packets[spec][0]
+                # Reuse the sub-packet if this packet has been unpacked before.
+                create.append("%s = %s.__dict__.get('_%s')" % (local, obj, name))
+                create.append('if %s is None:' % local)
+                create.append('    %s = %s._%s = _new(%s)' % (local, obj, name, spec))
+                create.append('%s.%s = %s' % (obj, name, local))
+                add_fields(sub_packets[spec][1], local, '%s.%s' % (attr, name))
+            else:
+                strip = spec[-1] != '!'
+                spec = spec.rstrip('!')
+                code = spec.rstrip('x')[-1]
+                count = int(spec.rstrip('x')[:-1] or 1)
+                formats.append(spec)
+                if code == 's':
+                    if strip:
+                        local = '_v%d' % len(targets)
+                        targets.append(local)
+                        convert.append("%s.%s = %s.rstrip('\\x00')" % (obj, name, local))
+                    else:
+                        targets.append('%s.%s' % (obj, name))
+                    values.append('%s.%s' % (attr, name))
+                elif count > 1:
+                    locals_ = ['_v%d' % (len(targets) + i) for i in xrange(count)]
+                    targets.extend(locals_)
+                    convert.append('%s.%s = [%s]' % (obj, name, ', '.join(locals_)))
+                    values.extend(['%s.%s[%d]' % (attr, name, i) for i in xrange(count)])
+                else:
+                    targets.append('%s.%s' % (obj, name))
+                    values.append('%s.%s' % (attr, name))
+
+    add_fields(layout, 'self', 'self')
+    fixed = struct.Struct(''.join(formats))
+    lines = ['def unpack(self, data, index=0):']
+    lines.extend(create)
+    lines.append('%s, = _fixed.unpack_from(data, index)' % ', '.join(targets))
+    lines.extend(convert)
+    for name, spec in variable:
+        if spec == 'text':
+            lines.append("self.%s = data[index + %d:].rstrip('\\x00')" % (name, fixed.size))
+        elif spec[-1] == '?':
+            optional = struct.Struct(spec[:-1])
+            names['_optional'] = optional
+            lines.append('if len(data) - index >= %d:' % (fixed.size + optional.size))
+            lines.append('    self.%s, = _optional.unpack_from(data, index + %d)' % (name, fixed.size))
+            # Pooled packets must not keep the field of an earlier packet.
+            lines.append('else:')
+            lines.append('    self.%s = 0' % name)
+        else:
+            item, count = spec.split('*')
+            if not count.isdigit():
+                count = 'self.' + count
+            if item in sub_packets:
+                # Reuse the sub-packets if this packet has been unpacked before.
+                names[item] = sub_packets[item][0]
+                lines.append("items = self.__dict__.get('_%s')" % name)
+                lines.append('if items is None:')
+                lines.append('    items = self._%s = []' % name)
+                lines.append('while len(items) < %s:' % count)
+                lines.append('    items.append(_new(%s))' % item)
+                lines.append('self.%s = items[:%s]' % (name, count))
+                lines.append('offset = index + %d' % fixed.size)
+                lines.append('for item in self.%s:' % name)
+                lines.append('    item.unpack(data, offset)')
+                lines.append('    offset += %d' % sub_packets[item][0].pack_s.size)
+            else:
+                lines.append("self.%s = list(_variable_struct('%%d%s' %% %s).unpack_from(data, index + %d))" % (name, item, count, fixed.size))
+    lines.append('return self')
+    source = '\n    '.join(lines) + '\n'
+    pack = _pack_source(cls, variable, values, fixed, sub_packets)
+    if pack:
+        source += 'def pack(self):\n    ' + '\n    '.join(pack) + '\n'
+    items, fields = _export_source(layout, 'self', sub_packets)
+    source += 'def to_dict(self):\n    return {%s}\n' % ', '.join(items)
+    source += 'def to_tuple(self):\n    return (%s,)\n' % ', '.join(fields)
+    names.update(_fixed=fixed, _new=object.__new__, _variable_struct=_variable_struct)
+    exec compile(source, '<%s layout>' % cls.__name__, 'exec') in names
+    cls.pack_s = fixed
+    cls.unpack = names['unpack']
+    cls.to_dict = names['to_dict']
+    cls.to_tuple = names['to_tuple']
+    if pack:
+        cls.pack = names['pack']
+
+
+def _pack_source(cls, variable, values, fixed, sub_packets):
+    # Packets with a variable length field that are sent have their own pack.
+    if not variable:
+        return ['return _fixed.pack(%s)' % ', '.join(values)]
+    if 'pack' in cls.__dict__:
+        return None
+    name, spec = variable[0]
+    if spec == 'text':
+        # Pad the text with at least one zero to a multiple of four bytes.
+        values[0] = '%d + len(text)' % fixed.size
+        return ["text = self.%s + '\\x00' * (4 - len(self.%s) %% 4)" % (name, name),
+                'return _fixed.pack(%s) + text' % ', '.join(values)]
+    if spec[-1] == '?':
+        # LFS only sends the optional field when it is set.
+        return ['if not self.%s:' % name,
+                '    return _fixed.pack(%s)' % ', '.join(values),
+                'return _fixed.pack(%s) + _optional.pack(self.%s)' % (', '.join(values), name)]
+    # Pad the records with zeros to a multiple of four bytes.
+    item, count = spec.split('*')
+    values[0] = '%d + len(records)' % fixed.size
+    if not count.isdigit():
+        values[values.index('self.' + count)] = 'len(self.%s)' % name
+    return ["records = ''.join([item.pack() for item in self.%s])" % name,
+            "records += '\\x00' * (-(%d + len(records)) %% 4)" % fixed.size,
+            'return _fixed.pack(%s) + records' % ', '.join(values)]
+
+
+def _export_source(layout, attr, sub_packets):
+    # The to_dict items and to_tuple values of the fields, sub-packets are
+    # exported as dicts and tuples too.
+    items = []
+    fields = []
+    for field in layout.split():
+        name, _, spec = field.partition(':')
+        spec = spec or 'B'
+        value = '%s.%s' % (attr, name)
+        item = spec.split('*')[0]
+        if item in sub_packets and '*' in spec:
+            items.append("'%s': [item.to_dict() for item in %s]" % (name, value))
+            fields.append('tuple([item.to_tuple() for item in %s])' % value)
+        elif spec in sub_packets:
+            sub_items, sub_fields = _export_source(sub_packets[spec][1], value, sub_packets)
+            items.append("'%s': {%s}" % (name, ', '.join(sub_items)))
+            fields.append('(%s,)' % ', '.join(sub_fields))
+        elif '*' in spec or spec[0].isdigit() and spec.rstrip('x!')[-1] != 's':
+            items.append("'%s': %s" % (name, value))
+            fields.append('tuple(%s)' % value)
+        else:
+            items.append("'%s': %s" % (name, value))
+            fields.append(value)
+    return items, fields
+
+
+def _compile_layouts():
+    sub_packets = {}
+    for cls, layout in _LAYOUTS:
+        _compile_layout(cls, layout, sub_packets)
+        sub_packets[cls.__name__] = (cls, layout)
+
+_compile_layouts()
 
 if __name__ == '__main__':
     pass
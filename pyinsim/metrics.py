@@ -0,0 +1,188 @@
+# metrics.py - performance metrics export module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import socket
+import asyncore
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'connections',
+    'metrics',
+    'serve_metrics',
+ ]
+
+
+# Constants.
+_REQUEST_END = '\r\n\r\n'
+_MAX_REQUEST_SIZE = 4096
+_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+def _type_names():
+    names = {core.EVT_OUTSIM: 'OUTSIM', core.EVT_OUTGAUGE: 'OUTGAUGE'}
+    for name in dir(insim_):
+        if name.startswith('ISP_') or name.startswith('IRP_'):
+            names[getattr(insim_, name)] = name
+    return names
+
+_TYPE_NAMES = _type_names()
+
+
+def connections():
+    """Get all of the open InSim, OutGauge and OutSim connections.
+
+    Returns:
+        A list of connection objects.
+
+    """
+    conns = []
+    for dispatcher in asyncore.socket_map.values():
+        conn = getattr(dispatcher, '_dispatch_to', None)
+        if conn is not None and conn not in conns:
+            conns.append(conn)
+    return conns
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def metrics(conns=None):
+    """Format the connection stats in the Prometheus text exposition format.
+
+    Args:
+        conns - The connections to export, defaults to all open connections.
+
+    Returns:
+        The metrics text.
+
+    """
+    if conns is None:
+        conns = connections()
+    samples = [(conn, conn.stats()) for conn in conns]
+    lines = []
+
+    def family(name, kind, help_):
+        lines.append('# HELP pyinsim_%s %s' % (name, help_))
+        lines.append('# TYPE pyinsim_%s %s' % (name, kind))
+
+    def sample(name, conn, value, ptype=None):
+        if ptype is None:
+            labels = 'connection="%s"' % _escape(conn.name)
+        else:
+            labels = 'connection="%s",type="%s"' % (_escape(conn.name), _TYPE_NAMES.get(ptype, ptype))
+        lines.append('pyinsim_%s{%s} %r' % (name, labels, value))
+
+    for key, kind, help_ in (('packets_in', 'counter', 'Packets received.'),
+                             ('bytes_in', 'counter', 'Bytes received.'),
+                             ('packets_out', 'counter', 'Packets sent.'),
+                             ('bytes_out', 'counter', 'Bytes sent.'),
+                             ('decode_time', 'counter', 'Seconds spent decoding packets.'),
+                             ('handler_time', 'counter', 'Seconds spent in packet handlers.')):
+        if key.endswith('time'):
+            name = key + '_seconds_total'
+        else:
+            name = key + '_total'
+        family(name, kind, help_)
+        for conn, stats in samples:
+            for ptype, value in sorted(stats[key].items()):
+                sample(name, conn, value, ptype)
+
+    family('callback_seconds_total', 'counter', 'Seconds spent in each callback.')
+    for conn, stats in samples:
+        for name, value in sorted(stats['callback_time'].items()):
+            lines.append('pyinsim_callback_seconds_total{connection="%s",callback="%s"} %r' % (
+                _escape(conn.name), _escape(name), value))
+
+    family('conflated_total', 'counter', 'Stale packets skipped by conflation.')
+    for conn, stats in samples:
+        for ptype, value in sorted(stats['conflated'].items()):
+            sample('conflated_total', conn, value, ptype)
+
+    for key, help_ in (('malformed', 'Malformed packets discarded.'),
+                       ('dropped', 'Unknown packets discarded.'),
+                       ('reconnects', 'Reconnect attempts.')):
+        family(key + '_total', 'counter', help_)
+        for conn, stats in samples:
+            sample(key + '_total', conn, stats[key])
+
+    family('send_queue_bytes', 'gauge', 'Bytes waiting to be sent.')
+    for conn, stats in samples:
+        if 'send_queue' in stats:
+            sample('send_queue_bytes', conn, stats['send_queue'])
+
+    family('rtt_seconds', 'gauge', 'Round trip time of the last ping.')
+    for conn, stats in samples:
+        if stats['rtt'] is not None:
+            sample('rtt_seconds', conn, stats['rtt'])
+
+    family('uptime_seconds', 'gauge', 'Seconds since the counters were reset.')
+    for conn, stats in samples:
+        sample('uptime_seconds', conn, stats['uptime'])
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(host='127.0.0.1', port=9100):
+    """Serve the connection metrics over HTTP from the pyinsim loop.
+
+    Args:
+        host - The local address to listen on.
+        port - The port to listen on.
+
+    Returns:
+        The metrics server, call close() on it to stop serving.
+
+    """
+    return _MetricsServer(host, port)
+
+
+class _MetricsServer(asyncore.dispatcher):
+    """Class to accept metrics HTTP requests."""
+    _internal = True
+    def __init__(self, host, port):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(5)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            _MetricsRequest(pair[0])
+
+
+class _MetricsRequest(asyncore.dispatcher_with_send):
+    """Class to answer a single metrics HTTP request."""
+    def __init__(self, sock):
+        asyncore.dispatcher_with_send.__init__(self, sock)
+        self._recv_buff = ''
+        self._done = False
+
+    def handle_read(self):
+        self._recv_buff += self.recv(_MAX_REQUEST_SIZE)
+        if self._done:
+            return
+        if _REQUEST_END in self._recv_buff or len(self._recv_buff) >= _MAX_REQUEST_SIZE:
+            self._done = True
+            body = metrics()
+            self.send('HTTP/1.0 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s' % (_CONTENT_TYPE, len(body), body))
+            if not self.out_buffer:
+                self.close()
+
+    def handle_write(self):
+        asyncore.dispatcher_with_send.handle_write(self)
+        if self._done and not self.out_buffer:
+            self.close()
+
+    def handle_close(self):
+        self.close()
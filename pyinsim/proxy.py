@@ -0,0 +1,245 @@
+# proxy.py - InSim fan-out proxy module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import socket
+import asyncore
+import traceback
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'Proxy',
+ ]
+
+
+# Constants.
+_BUFFER_SIZE = 8192
+_MAX_SEND_BUFFER = 1048576
+# The ReqIs the proxy gives to client requests, the upstream owner must use
+# ReqIs below these and those above are kept for the connection's resync
+# requests and pings.
+_FIRST_REQI = 128
+_LAST_REQI = core._RESYNC_REQI - 1
+
+# Packets LFS only sends when they are asked for in the IS_ISI flags.
+_FLAG_TYPES = {
+    insim_.ISF_NLP: (insim_.ISP_NLP,),
+    insim_.ISF_MCI: (insim_.ISP_MCI,),
+    insim_.ISF_CON: (insim_.ISP_CON,),
+    insim_.ISF_OBH: (insim_.ISP_OBH,),
+    insim_.ISF_HLV: (insim_.ISP_HLV,),
+    insim_.ISF_AXM_LOAD | insim_.ISF_AXM_EDIT: (insim_.ISP_AXM,),
+    insim_.ISF_REQ_JOIN: (insim_.ISP_JRR,),
+}
+
+
+class Proxy(object):
+    """Class to share one InSim connection with many local InSim clients.
+
+    Packets from LFS are forwarded to the clients as raw bytes, without being
+    decoded, and the same data is sent to every client. Requests made by
+    a client have their ReqI rewritten so the replies are only sent back to
+    that client. ReqIs 128 to 253 are kept for the clients, so requests the
+    upstream connection makes itself must use a ReqI below 128. A client that
+    falls more than a megabyte behind is disconnected.
+
+    """
+    def __init__(self, upstream, host='127.0.0.1', port=29998, subscriptions=None):
+        """Create a new Proxy object.
+
+        Args:
+            upstream - The InSim connection to LFS.
+            host - The local address to accept clients on.
+            port - The local port to accept clients on.
+            subscriptions - An optional function called with each client when
+                            its IS_ISI arrives, returning the packet types to
+                            forward to it (None = all).
+
+        """
+        self.upstream = upstream
+        self.subscriptions = subscriptions
+        self.clients = []
+        self._routes = [None] * (_LAST_REQI + 1)
+        self._reqis = {}
+        self._next_reqi = _FIRST_REQI
+        self._ver = None
+        self._server = _ProxyServer(self, host, port)
+        upstream.bind(core.EVT_RAW, self._upstream_packet)
+        upstream.bind(core.EVT_CLOSE, self._upstream_closed)
+
+    def close(self):
+        """Stop accepting clients and close the open client connections."""
+        self._server.close()
+        [c.close() for c in self.clients[:]]
+        self.upstream.unbind(core.EVT_RAW, self._upstream_packet)
+        self.upstream.unbind(core.EVT_CLOSE, self._upstream_closed)
+
+    def _route(self, client, reqi):
+        # Map the client ReqI onto a proxy ReqI, reusing the oldest slot once
+        # all of them have been handed out.
+        key = (client, reqi)
+        proxy_reqi = self._reqis.get(key)
+        if proxy_reqi is None:
+            proxy_reqi = self._next_reqi
+            self._next_reqi = _FIRST_REQI if proxy_reqi == _LAST_REQI else proxy_reqi + 1
+            old = self._routes[proxy_reqi]
+            if old is not None:
+                del self._reqis[old]
+            self._routes[proxy_reqi] = key
+            self._reqis[key] = proxy_reqi
+        return proxy_reqi
+
+    def _forget(self, client):
+        for reqi, key in enumerate(self._routes):
+            if key is not None and key[0] is client:
+                self._routes[reqi] = None
+                del self._reqis[key]
+
+    def _client_packet(self, client, data):
+        ptype = ord(data[1])
+        if ptype == insim_.ISP_TINY:
+            subt = ord(data[3])
+            if subt == insim_.TINY_NONE:
+                return # Keep alive reply, LFS gets ours.
+            if subt == insim_.TINY_CLOSE:
+                client.close()
+                return
+        elif ptype == insim_.ISP_ISI:
+            self._client_init(client, data)
+            return
+
+        reqi = ord(data[2])
+        if reqi:
+            data = data[:2] + chr(self._route(client, reqi)) + data[3:]
+        self.upstream.sendraw(data)
+
+    def _client_init(self, client, data):
+        isi = insim_.IS_ISI()
+        isi.unpack(data)
+        client.name = isi.IName
+        types = None
+        if self.subscriptions:
+            types = self.subscriptions(client)
+        if types is None:
+            client.subscribe()
+            for flags, flag_types in _FLAG_TYPES.iteritems():
+                if not isi.Flags & flags:
+                    client.unsubscribe(*flag_types)
+        else:
+            client.subscribe(*types)
+        if isi.ReqI:
+            if self._ver:
+                client.send(self._ver[:2] + chr(isi.ReqI) + self._ver[3:])
+            else:
+                self.upstream.sendraw(insim_.IS_TINY(ReqI=self._route(client, isi.ReqI), SubT=insim_.TINY_VER).pack())
+
+    def _upstream_packet(self, upstream, ptype, data):
+        # Copy the data once, all of the clients share it.
+        data = data.tobytes()
+        if ptype == insim_.ISP_VER:
+            self._ver = data
+        reqi = ord(data[2])
+        if _FIRST_REQI <= reqi <= _LAST_REQI:
+            key = self._routes[reqi]
+            if key is not None:
+                if key[0].connected:
+                    key[0].send(data[:2] + chr(key[1]) + data[3:])
+                return
+        # Slow clients may be closed while sending, so loop over a copy.
+        for client in self.clients[:]:
+            if client.types[ptype]:
+                client.send(data)
+
+    def _upstream_closed(self, upstream):
+        [c.close() for c in self.clients[:]]
+
+
+class _ProxyServer(asyncore.dispatcher):
+    """Class to accept proxy clients."""
+    def __init__(self, proxy, host, port):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(5)
+        self._proxy = proxy
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            self._proxy.clients.append(_ProxyClient(self._proxy, pair[0], pair[1]))
+
+
+class _ProxyClient(asyncore.dispatcher):
+    """Class to handle a local client of the proxy."""
+    def __init__(self, proxy, sock, addr):
+        asyncore.dispatcher.__init__(self, sock)
+        self.name = ''
+        self.addr = addr
+        self.types = [False] * 256
+        self._proxy = proxy
+        self._send_buff = ''
+        self._recv_buff = ''
+
+    def subscribe(self, *types):
+        """Forward packet types to the client, all types if none are given."""
+        for ptype in types or xrange(256):
+            self.types[ptype] = True
+
+    def unsubscribe(self, *types):
+        """Stop forwarding packet types to the client, all types if none are given."""
+        for ptype in types or xrange(256):
+            self.types[ptype] = False
+
+    def send(self, data):
+        # Drop clients that cannot keep up rather than buffer without limit.
+        if len(self._send_buff) + len(data) > _MAX_SEND_BUFFER:
+            self.close()
+        else:
+            self._send_buff += data
+
+    def writable(self):
+        return bool(self._send_buff)
+
+    def handle_write(self):
+        sent = asyncore.dispatcher.send(self, self._send_buff)
+        self._send_buff = self._send_buff[sent:]
+
+    def handle_read(self):
+        data = self.recv(_BUFFER_SIZE)
+        if not data:
+            return
+        self._recv_buff += data
+        buff = self._recv_buff
+        index = 0
+        while index < len(buff):
+            size = ord(buff[index])
+            if size % 4 or not size:
+                self.close()
+                return
+            if index + size > len(buff):
+                break
+            self._proxy._client_packet(self, buff[index:index + size])
+            index += size
+        self._recv_buff = buff[index:]
+
+    def handle_close(self):
+        self.close()
+
+    def handle_error(self):
+        self.close()
+        traceback.print_exc()
+
+    def close(self):
+        asyncore.dispatcher.close(self)
+        if self in self._proxy.clients:
+            self._proxy.clients.remove(self)
+            self._proxy._forget(self)
@@ -0,0 +1,249 @@
+# relaypool.py - pooled relay connections module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import bisect
+
+# Libraries
+import insim as insim_
+import core
+import func
+
+__all__ = [
+    'HostIndex',
+    'RelayPool',
+ ]
+
+
+# Constants.
+_RELAY_HOST = 'isrelay.lfs.net'
+_RELAY_PORT = 47474
+_REFRESH = 60.0
+_HOS_HEADER_SIZE = 4
+_HINFO_SIZE = 40
+
+
+def _key(name):
+    return func.stripcols(name).lower()
+
+
+class HostIndex(object):
+    """Class to hold the relay host list, indexed by name and track."""
+    def __init__(self):
+        """Create a new HostIndex object."""
+        self.hosts = {}
+        self._names = []
+        self._tracks = {}
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __iter__(self):
+        return self.hosts.itervalues()
+
+    def get(self, HName):
+        """Get a host by its name, or None if it is not in the list."""
+        return self.hosts.get(HName)
+
+    def search(self, prefix='', track=None, min_conns=0, max_conns=None, flags=0, exclude=0):
+        """Find the hosts that match all of the conditions.
+
+        Args:
+            prefix - The start of the host name, colours and case are ignored.
+            track - The short track name, E.G. 'BL1'.
+            min_conns - The fewest connections the host can have.
+            max_conns - The most connections the host can have.
+            flags - ``HOS_*`` flags that must be set.
+            exclude - ``HOS_*`` flags that must not be set.
+
+        Returns:
+            A list of ``HInfo`` objects sorted by name.
+
+        """
+        if track is not None:
+            hosts = sorted(self._tracks.get(track, ()), key=lambda h: _key(h.HName))
+            if prefix:
+                prefix = _key(prefix)
+                hosts = [h for h in hosts if _key(h.HName).startswith(prefix)]
+        else:
+            prefix = _key(prefix)
+            index = bisect.bisect_left(self._names, (prefix,))
+            hosts = []
+            for key, name in self._names[index:]:
+                if not key.startswith(prefix):
+                    break
+                hosts.append(self.hosts[name])
+        return [h for h in hosts
+                if h.NumConns >= min_conns
+                and (max_conns is None or h.NumConns <= max_conns)
+                and h.Flags & flags == flags
+                and not h.Flags & exclude]
+
+    def update(self, hosts):
+        """Replace the host list.
+
+        Args:
+            hosts - A dict of ``HInfo`` objects keyed by host name.
+
+        Returns:
+            A tuple of the added, removed and changed hosts.
+
+        """
+        old = self.hosts
+        added = [h for n, h in hosts.iteritems() if n not in old]
+        removed = [h for n, h in old.iteritems() if n not in hosts]
+        changed = [h for n, h in hosts.iteritems() if n in old and old[n] is not h]
+        self.hosts = hosts
+        if added or removed:
+            self._names = sorted([(_key(name), name) for name in hosts])
+        self._tracks = {}
+        for host in hosts.itervalues():
+            self._tracks.setdefault(host.Track, []).append(host)
+        return added, removed, changed
+
+
+class RelayPool(core._Binding):
+    """Class to keep a number of relay connections open for reuse, and a
+    host list that is refreshed in the background.
+
+    The host list is requested on its own connection every refresh period and
+    stored in a HostIndex. Host records that have not changed since the last
+    refresh are not decoded again. Bind ``EVT_HOSTS`` to be called with the
+    added, removed and changed hosts after each refresh.
+
+    """
+    def __init__(self, size=4, host=_RELAY_HOST, port=_RELAY_PORT, refresh=_REFRESH, name='relay pool'):
+        """Create a new RelayPool object.
+
+        Args:
+            size - The number of relay connections to keep open for hosts.
+            host - The InSim relay host.
+            port - The InSim relay port.
+            refresh - The number of seconds between host list requests.
+            name - The name of the pool, used to name the connections.
+
+        """
+        core._Binding.__init__(self)
+        self.size = size
+        self.index = HostIndex()
+        self._addr = (host, port)
+        self._name = name
+        self._idle = []
+        self._busy = set()
+        self._raw = {}
+        self._pending = None
+        self._requested = 0.0
+        self._refresh = refresh
+        self._directory = core.relay(host, port, name='%s directory' % name, reconnect=True)
+        self._directory.bind_raw(insim_.IRP_HOS, self._host_list)
+        self._directory.bind(core.EVT_INIT, self._directory_init)
+        self._directory.bind(core.EVT_CLOSE, self._directory_lost)
+        self._directory.bind(core.EVT_ERROR, self._directory_lost)
+        self._timer = core.call_every(refresh, self.refresh)
+        self.refresh()
+        for i in xrange(size):
+            self._idle.append(self._open(i + 1))
+
+    def _open(self, number):
+        conn = core.relay(self._addr[0], self._addr[1], name='%s %d' % (self._name, number), reconnect=True)
+        conn._pool_host = None
+        conn._pool_callbacks = dict([(evt, list(c)) for evt, c in conn._callbacks.iteritems()])
+        conn._pool_raw_callbacks = dict([(ptype, list(c)) for ptype, c in conn._raw_callbacks.iteritems()])
+        return conn
+
+    def close(self):
+        """Close all of the relay connections."""
+        self._timer.cancel()
+        self._directory.close()
+        [c.close() for c in self._idle + list(self._busy)]
+        self._idle = []
+        self._busy.clear()
+
+    def refresh(self):
+        """Request the host list from the relay now, unless a request is 
+        still being answered. A list that has not finished after half the 
+        refresh period is given up on and requested again."""
+        now = core._clock()
+        if self._pending is not None and now - self._requested < self._refresh / 2.0:
+            return
+        if self._directory.connected:
+            self._pending = {}
+            self._requested = now
+            self._directory.send(insim_.IRP_HLR)
+
+    def acquire(self, HName, Admin='', Spec=''):
+        """Take a connection from the pool and select a host on it, a
+        connection that already has the host selected is used if there is one.
+
+        Args:
+            HName - The name of the host to select.
+            Admin - The host admin password.
+            Spec - The host spectator password.
+
+        Returns:
+            The relay connection.
+
+        """
+        for conn in self._idle:
+            if conn._pool_host == HName:
+                break
+        else:
+            if not self._idle:
+                raise core.InSimError('no relay connections left in the pool')
+            conn = self._idle[-1]
+        self._idle.remove(conn)
+        self._busy.add(conn)
+        if conn._pool_host != HName:
+            conn.send(insim_.IRP_SEL, HName=HName, Admin=Admin, Spec=Spec)
+            conn._pool_host = HName
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, the events bound on it since it
+        was acquired are unbound."""
+        if conn not in self._busy:
+            raise core.InSimError('connection %s is not from this pool' % conn.name)
+        self._busy.remove(conn)
+        conn._callbacks = dict([(evt, list(c)) for evt, c in conn._pool_callbacks.iteritems()])
+        conn._raw_callbacks = dict([(ptype, list(c)) for ptype, c in conn._pool_raw_callbacks.iteritems()])
+        conn._rebuild()
+        self._idle.append(conn)
+
+    def _directory_init(self, relay):
+        self._pending = None
+        self.refresh()
+
+    def _directory_lost(self, relay):
+        # The rest of the host list is not coming.
+        self._pending = None
+
+    def _host_list(self, relay, ptype, data):
+        if self._pending is None:
+            return
+        data = data.tobytes()
+        pending = self._pending
+        old = self.index.hosts
+        for offset in xrange(_HOS_HEADER_SIZE, _HOS_HEADER_SIZE + ord(data[3]) * _HINFO_SIZE, _HINFO_SIZE):
+            # Only decode the records that have changed.
+            record = data[offset:offset + _HINFO_SIZE]
+            if ord(record[38]) & insim_.HOS_FIRST:
+                pending.clear()
+            name = record[:31].rstrip('\x00')
+            if self._raw.get(name) == record and name in old:
+                pending[name] = old[name]
+            else:
+                host = insim_.HInfo(data, offset)
+                self._raw[name] = record
+                pending[name] = host
+            if ord(record[38]) & insim_.HOS_LAST:
+                self._pending = None
+                for name in self._raw.keys():
+                    if name not in pending:
+                        del self._raw[name]
+                self.dispatch(core.EVT_HOSTS, *self.index.update(pending))
+                return
@@ -0,0 +1,186 @@
+# rules.py - OutGauge rule module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'EDGE_BOTH',
+    'EDGE_FALL',
+    'EDGE_RISE',
+    'Rules',
+ ]
+
+
+# Edge constants, when a rule calls its callback.
+EDGE_RISE = 1
+EDGE_FALL = 2
+EDGE_BOTH = 3
+
+# The OutGauge fields rules can test.
+_FIELDS = frozenset([name for name, value in insim_.OutGaugePack().to_dict().iteritems()
+                     if isinstance(value, (int, long, float))])
+
+
+class Rules(object):
+    """Class to test a set of rules against OutGauge packets.
+
+    Each rule is a test of one field of the packet, such as RPM above a
+    value or a DashLights bit being set. The rules are compiled into one
+    function that tests all of them for each packet and only calls the
+    callback of a rule when its result changes. Callbacks are called with
+    the connection, the packet and whether the rule is now true. Each
+    connection the rules are bound to, such as each Stream of a Collector,
+    keeps its own results.
+
+    """
+    def __init__(self):
+        """Create a new Rules object."""
+        self._rules = []
+        self._states = {}
+        self._evaluate = None
+
+    def above(self, field, value, callback, hysteresis=0.0, edge=EDGE_RISE):
+        """Add a rule that is true when a field is above a value.
+
+        Args:
+            field - The name of the OutGaugePack field.
+            value - The value the field must be above.
+            callback - The function to call when the rule changes.
+            hysteresis - How far the field must fall below the value before
+                         the rule is false again.
+            edge - EDGE_RISE, EDGE_FALL or EDGE_BOTH.
+
+        """
+        value = float(value)
+        self._add(field, '%s > %r if state[%%d] else %s > %r' % (field, value - hysteresis, field, value), callback, edge)
+
+    def below(self, field, value, callback, hysteresis=0.0, edge=EDGE_RISE):
+        """Add a rule that is true when a field is below a value.
+
+        Args:
+            field - The name of the OutGaugePack field.
+            value - The value the field must be below.
+            callback - The function to call when the rule changes.
+            hysteresis - How far the field must rise above the value before
+                         the rule is false again.
+            edge - EDGE_RISE, EDGE_FALL or EDGE_BOTH.
+
+        """
+        value = float(value)
+        self._add(field, '%s < %r if state[%%d] else %s < %r' % (field, value + hysteresis, field, value), callback, edge)
+
+    def equals(self, field, value, callback, edge=EDGE_RISE):
+        """Add a rule that is true when a field is equal to a value.
+
+        Args:
+            field - The name of the OutGaugePack field.
+            value - The value to compare the field to.
+            callback - The function to call when the rule changes.
+            edge - EDGE_RISE, EDGE_FALL or EDGE_BOTH.
+
+        """
+        self._add(field, '%s == %r' % (field, float(value)), callback, edge)
+
+    def flag(self, field, mask, callback, edge=EDGE_RISE):
+        """Add a rule that is true when all of the bits of a mask are set in
+        a field, such as DL_SHIFT in ShowLights.
+
+        Args:
+            field - The name of the OutGaugePack field.
+            mask - The bits to test.
+            callback - The function to call when the rule changes.
+            edge - EDGE_RISE, EDGE_FALL or EDGE_BOTH.
+
+        """
+        mask = int(mask)
+        self._add(field, '%s & %d == %d' % (field, mask, mask), callback, edge)
+
+    def remove(self, callback):
+        """Remove the rules that call a callback.
+
+        Args:
+            callback - The function to remove the rules of.
+
+        """
+        self._rules = [rule for rule in self._rules if rule[2] != callback]
+        self._changed()
+
+    def clear(self):
+        """Remove all of the rules."""
+        self._rules = []
+        self._changed()
+
+    def bind(self, conn):
+        """Test the rules against the packets of a connection.
+
+        Args:
+            conn - The OutGauge connection, or a Stream of a Collector.
+
+        """
+        conn.bind(core.EVT_OUTGAUGE, self.evaluate)
+
+    def unbind(self, conn):
+        """Stop testing the rules against the packets of a connection.
+
+        Args:
+            conn - The OutGauge connection, or a Stream of a Collector.
+
+        """
+        conn.unbind(core.EVT_OUTGAUGE, self.evaluate)
+        self._states.pop(conn, None)
+
+    def evaluate(self, conn, packet):
+        """Test the rules against a packet and call the callbacks of those
+        that have changed.
+
+        Args:
+            conn - The connection the packet is from, which keeps the results.
+            packet - The OutGaugePack to test.
+
+        """
+        state = self._states.get(conn)
+        if state is None:
+            state = self._states[conn] = [False] * len(self._rules)
+        if self._evaluate is None:
+            self._evaluate = self._compile()
+        self._evaluate(conn, packet, state)
+
+    def _add(self, field, test, callback, edge):
+        if field not in _FIELDS:
+            raise core.InSimError('%s is not an OutGaugePack number field' % field)
+        if edge not in (EDGE_RISE, EDGE_FALL, EDGE_BOTH):
+            raise core.InSimError('invalid rule edge %r' % (edge,))
+        self._rules.append((field, test, callback, edge))
+        self._changed()
+
+    def _changed(self):
+        # The results are reset as the rules have moved.
+        self._states.clear()
+        self._evaluate = None
+
+    def _compile(self):
+        names = {}
+        lines = ['def evaluate(conn, packet, state):']
+        for field in sorted(set([rule[0] for rule in self._rules])):
+            lines.append('    %s = packet.%s' % (field, field))
+        for i, (field, test, callback, edge) in enumerate(self._rules):
+            names['_callback%d' % i] = callback
+            lines.append('    active = %s' % (test % i if '%d' in test else test))
+            lines.append('    if active != state[%d]:' % i)
+            lines.append('        state[%d] = active' % i)
+            if edge == EDGE_BOTH:
+                lines.append('        _callback%d(conn, packet, active)' % i)
+            else:
+                lines.append('        if %sactive:' % ('' if edge == EDGE_RISE else 'not '))
+                lines.append('            _callback%d(conn, packet, active)' % i)
+        if not self._rules:
+            lines.append('    pass')
+        exec compile('\n'.join(lines), '<rules>', 'exec') in names
+        return names['evaluate']
@@ -0,0 +1,282 @@
+# shard.py - multi-process connection sharding module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import socket
+import asyncore
+import struct
+import multiprocessing
+import traceback
+
+# Libraries
+import core
+
+__all__ = [
+    'Supervisor',
+ ]
+
+
+# Constants.
+_FRAME = struct.Struct('!HH')
+_FRAME_SIZE = _FRAME.size
+_BUFFER_SIZE = 65536
+_INSIM = 'insim'
+_RELAY = 'relay'
+_JOIN_TIMEOUT = 5.0
+
+
+class Supervisor(core._Binding):
+    """Class to shard InSim and relay connections across worker processes.
+
+    Each worker runs its own pyinsim loop for its share of the connections,
+    handlers are registered once with the setup function and run in every
+    worker. Packets of the types bound on the supervisor before it is started
+    are forwarded to the parent process as raw bytes, and the supervisor
+    callbacks are called with the connection handle and the packet.
+
+    """
+    def __init__(self, workers=None, setup=None, host='127.0.0.1', port=0):
+        """Create a new Supervisor object.
+
+        Args:
+            workers - The number of worker processes, defaults to the CPU count.
+            setup - A function called in the worker with each new connection,
+                    it must be importable by the worker process.
+            host - The local address the workers connect back to.
+            port - The local port the workers connect back to (0 = any).
+
+        """
+        core._Binding.__init__(self)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.setup = setup
+        self.connections = []
+        self._host = host
+        self._port = port
+        self._processes = []
+        self._listener = None
+        self._links = {}
+
+    def insim(self, **kwargs):
+        """Add an InSim connection, the arguments are the same as pyinsim.insim().
+
+        Returns:
+            A handle for the connection in the parent process.
+
+        """
+        return self._add(_INSIM, kwargs)
+
+    def relay(self, **kwargs):
+        """Add a relay connection, the arguments are the same as pyinsim.relay().
+
+        Returns:
+            A handle for the connection in the parent process.
+
+        """
+        return self._add(_RELAY, kwargs)
+
+    def _add(self, kind, kwargs):
+        if self._processes:
+            raise core.InSimError('connections must be added before the supervisor is started')
+        index = len(self.connections)
+        kwargs.setdefault('name', 'shard %d' % index)
+        remote = _Remote(self, index, kwargs['name'])
+        remote._spec = (index, kind, kwargs)
+        self.connections.append(remote)
+        return remote
+
+    def start(self):
+        """Start the worker processes, call pyinsim.run() afterwards to
+        receive the forwarded packets."""
+        self._listener = _Listener(self, self._host, self._port)
+        port = self._listener.socket.getsockname()[1]
+        if core.EVT_ALL in self._callbacks:
+            forward = None
+        else:
+            forward = frozenset(self._callbacks.keys())
+        for worker in xrange(self.workers):
+            specs = [c._spec for c in self.connections[worker::self.workers]]
+            if not specs:
+                break
+            process = multiprocessing.Process(target=_worker, args=(specs, self.setup, self._host, port, forward))
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+
+    def stop(self):
+        """Stop the worker processes, waiting a few seconds for each to exit."""
+        if self._listener:
+            self._listener.close()
+            self._listener = None
+        for link in set(self._links.values()):
+            link.close()
+        self._links.clear()
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            process.join(_JOIN_TIMEOUT)
+        self._processes = []
+
+    def _handle_frame(self, link, index, data):
+        self._links[index] = link
+        if not data:
+            return
+        remote = self.connections[index]
+        ptype = ord(data[1])
+        bound = self._callbacks.get(ptype)
+        all_ = self._callbacks.get(core.EVT_ALL)
+        if bound or all_:
+            cls = core._PACKET_MAP.get(ptype)
+            if cls is None:
+                return
+            packet = cls().unpack(data)
+            if bound:
+                [c(remote, packet) for c in bound]
+            if all_:
+                [c(remote, packet) for c in all_]
+
+
+class _Remote(object):
+    """Class to represent a connection running in a worker process."""
+    def __init__(self, supervisor, index, name):
+        self.supervisor = supervisor
+        self.index = index
+        self.name = name
+
+    def send(self, type_, **kwargs):
+        """Send a packet to InSim through the worker process.
+
+        Args:
+            type - Type of packet to send.
+            kwargs - The keyword arguments to initialize the packet with
+
+        """
+        self.sendraw(core._PACKET_MAP[type_](**kwargs).pack())
+
+    def sendraw(self, data):
+        """Send already packed packet data to InSim through the worker process."""
+        link = self.supervisor._links.get(self.index)
+        if link is None:
+            raise core.InSimError('connection %s is not ready' % self.name)
+        link.send(_FRAME.pack(self.index, len(data)) + data)
+
+
+class _FrameSocket(asyncore.dispatcher):
+    """Class to send and receive length prefixed frames."""
+    def __init__(self, sock=None):
+        asyncore.dispatcher.__init__(self, sock)
+        self._send_buff = ''
+        self._recv_buff = ''
+
+    def send(self, data):
+        self._send_buff += data
+
+    def writable(self):
+        return not self.connected or bool(self._send_buff)
+
+    def handle_connect(self):
+        pass
+
+    def handle_write(self):
+        sent = asyncore.dispatcher.send(self, self._send_buff)
+        self._send_buff = self._send_buff[sent:]
+
+    def handle_read(self):
+        data = self.recv(_BUFFER_SIZE)
+        if not data:
+            return
+        self._recv_buff += data
+        buff = self._recv_buff
+        index = 0
+        while len(buff) - index >= _FRAME_SIZE:
+            conn, size = _FRAME.unpack_from(buff, index)
+            end = index + _FRAME_SIZE + size
+            if end > len(buff):
+                break
+            self._handle_frame(conn, buff[index + _FRAME_SIZE:end])
+            index = end
+        self._recv_buff = buff[index:]
+
+    def handle_close(self):
+        self.close()
+
+    def handle_error(self):
+        # Close the link, a broken frame leaves the rest of the stream unusable.
+        traceback.print_exc()
+        self.handle_close()
+
+
+class _Listener(asyncore.dispatcher):
+    """Class to accept links from the worker processes."""
+    def __init__(self, supervisor, host, port):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        self.bind((host, port))
+        self.listen(5)
+        self._supervisor = supervisor
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            _WorkerLink(self._supervisor, pair[0])
+
+
+class _WorkerLink(_FrameSocket):
+    """Class to receive forwarded packets from a worker process."""
+    def __init__(self, supervisor, sock):
+        _FrameSocket.__init__(self, sock)
+        self._supervisor = supervisor
+
+    def _handle_frame(self, index, data):
+        self._supervisor._handle_frame(self, index, data)
+
+
+class _ParentLink(_FrameSocket):
+    """Class to forward packets from a worker process to the parent."""
+    def __init__(self, host, port, conns, forward):
+        _FrameSocket.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect((host, port))
+        self._conns = conns
+        for index, conn in conns.iteritems():
+            if forward is None:
+                conn.bind(core.EVT_RAW, self._tap)
+            else:
+                [conn.bind_raw(ptype, self._tap) for ptype in forward if ptype < core.EVT_INIT]
+            # Announce the connection so the parent can send to it.
+            self.send(_FRAME.pack(index, 0))
+
+    def _tap(self, conn, ptype, data):
+        self.send(_FRAME.pack(conn._shard_index, len(data)) + data.tobytes())
+
+    def _handle_frame(self, index, data):
+        conn = self._conns.get(index)
+        if conn is not None:
+            conn.sendraw(data)
+
+    def handle_close(self):
+        # The parent has gone, so stop the worker.
+        self.close()
+        core.closeall()
+
+
+def _worker(specs, setup, host, port, forward):
+    # Drop the loop state inherited from the parent process.
+    core._reset_loop_state()
+    conns = {}
+    for index, kind, kwargs in specs:
+        if kind == _RELAY:
+            conn = core.relay(**kwargs)
+        else:
+            conn = core.insim(**kwargs)
+        conn._shard_index = index
+        conns[index] = conn
+        if setup:
+            setup(conn)
+    _ParentLink(host, port, conns, forward)
+    core.run()
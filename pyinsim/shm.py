@@ -0,0 +1,241 @@
+# shm.py - shared memory car state module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import os
+import sys
+import mmap
+import struct
+import tempfile
+import time
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'Publisher',
+    'Reader',
+ ]
+
+
+# Constants.
+_NAME = 'pyinsim'
+_SHM_DIR = '/dev/shm'
+_MAGIC = 'PYIS'
+_VERSION = 1
+_MAX_PLID = 256
+_MAX_RETRIES = 10000
+
+# The segment is a header followed by slots, each slot is a sequence number
+# that is odd while the slot is being written, the size of the data (0 when
+# the slot is empty) and the data.
+_HEADER = struct.Struct('<4sHH')
+_SLOT = struct.Struct('<IH2x')
+_SEQ = struct.Struct('<I')
+_CLOCK = struct.Struct('<d')
+_CAR_SIZE = 28
+_CLOCK_SLOT = _HEADER.size
+_CAR_SLOTS = _CLOCK_SLOT + _SLOT.size + _CLOCK.size
+_CAR_SLOT_SIZE = _SLOT.size + _CAR_SIZE
+_OUTGAUGE_SLOT = _CAR_SLOTS + _CAR_SLOT_SIZE * _MAX_PLID
+_OUTSIM_SLOT = _OUTGAUGE_SLOT + _SLOT.size + 96
+_SIZE = _OUTSIM_SLOT + _SLOT.size + 68
+
+
+def _path(name):
+    if os.path.isdir(_SHM_DIR):
+        return os.path.join(_SHM_DIR, name)
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+def _map(name, create):
+    if sys.platform == 'win32':
+        return mmap.mmap(-1, _SIZE, tagname=name)
+    if create:
+        fd = os.open(_path(name), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0644)
+        try:
+            os.ftruncate(fd, _SIZE)
+            return mmap.mmap(fd, _SIZE)
+        finally:
+            os.close(fd)
+    fd = os.open(_path(name), os.O_RDONLY)
+    try:
+        return mmap.mmap(fd, _SIZE, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+
+class Publisher(object):
+    """Class to publish the latest car positions to a shared memory segment.
+
+    The CompCar of each car is copied from the IS_MCI packets without being
+    decoded, along with the latest OutGauge and OutSim packets. Other
+    processes on the same computer can read them with a Reader without
+    opening their own InSim connection. The connection must request IS_MCI
+    packets with the ISF_MCI flag.
+
+    """
+    def __init__(self, insim=None, name=_NAME, outgauge=None, outsim=None):
+        """Create a new Publisher object.
+
+        Args:
+            insim - The InSim connection to publish the cars from.
+            name - The name of the shared memory segment.
+            outgauge - An optional OutGauge connection to publish.
+            outsim - An optional OutSim connection to publish.
+
+        """
+        self.name = name
+        self._mmap = _map(name, True)
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, _VERSION, _MAX_PLID)
+        self._bindings = []
+        if insim is not None:
+            self._bindings.extend([(insim, insim_.ISP_MCI, self._mci),
+                                   (insim, insim_.ISP_PLL, self._pll),
+                                   (insim, insim_.ISP_TINY, self._tiny)])
+            [conn.bind_raw(ptype, callback) for conn, ptype, callback in self._bindings]
+        if outgauge is not None:
+            outgauge.bind(core.EVT_OUTGAUGE, self._outgauge)
+        if outsim is not None:
+            outsim.bind(core.EVT_OUTSIM, self._outsim)
+        self._outgauge_conn = outgauge
+        self._outsim_conn = outsim
+
+    def close(self):
+        """Stop publishing and remove the shared memory segment."""
+        [conn.unbind_raw(ptype, callback) for conn, ptype, callback in self._bindings]
+        if self._outgauge_conn is not None:
+            self._outgauge_conn.unbind(core.EVT_OUTGAUGE, self._outgauge)
+        if self._outsim_conn is not None:
+            self._outsim_conn.unbind(core.EVT_OUTSIM, self._outsim)
+        self._mmap.close()
+        if sys.platform != 'win32':
+            os.remove(_path(self.name))
+
+    def _write(self, offset, data):
+        mm = self._mmap
+        seq = _SEQ.unpack_from(mm, offset)[0]
+        _SLOT.pack_into(mm, offset, seq + 1, len(data))
+        start = offset + _SLOT.size
+        mm[start:start + len(data)] = data
+        _SEQ.pack_into(mm, offset, seq + 2)
+
+    def _touch(self):
+        self._write(_CLOCK_SLOT, _CLOCK.pack(time.time()))
+
+    def _mci(self, insim, ptype, data):
+        data = data.tobytes()
+        for index in xrange(4, 4 + ord(data[3]) * _CAR_SIZE, _CAR_SIZE):
+            plid = ord(data[index + 4])
+            self._write(_CAR_SLOTS + plid * _CAR_SLOT_SIZE, data[index:index + _CAR_SIZE])
+        self._touch()
+
+    def _pll(self, insim, ptype, data):
+        self._write(_CAR_SLOTS + ord(data[3]) * _CAR_SLOT_SIZE, '')
+        self._touch()
+
+    def _tiny(self, insim, ptype, data):
+        if ord(data[3]) == insim_.TINY_CLR:
+            for plid in xrange(_MAX_PLID):
+                self._write(_CAR_SLOTS + plid * _CAR_SLOT_SIZE, '')
+            self._touch()
+
+    def _outgauge(self, outgauge, packet):
+        self._write(_OUTGAUGE_SLOT, packet.pack())
+        self._touch()
+
+    def _outsim(self, outsim, packet):
+        self._write(_OUTSIM_SLOT, packet.pack())
+        self._touch()
+
+
+class Reader(object):
+    """Class to read the car positions published by a Publisher, reads are
+    copied from shared memory without system calls unless they race a write."""
+    def __init__(self, name=_NAME):
+        """Create a new Reader object.
+
+        Args:
+            name - The name of the shared memory segment.
+
+        """
+        self._mmap = _map(name, False)
+        magic, version, plids = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise core.InSimError('%s is not a pyinsim shared memory segment' % name)
+
+    def close(self):
+        """Close the shared memory segment."""
+        self._mmap.close()
+
+    def _read(self, offset):
+        # Retry until the slot is read without the publisher writing to it.
+        mm = self._mmap
+        start = offset + _SLOT.size
+        for i in xrange(_MAX_RETRIES):
+            seq, size = _SLOT.unpack_from(mm, offset)
+            if not seq & 1:
+                data = mm[start:start + size]
+                if _SEQ.unpack_from(mm, offset)[0] == seq:
+                    return data
+            # Let the publisher finish the write.
+            time.sleep(0)
+        raise core.InSimError('timed out waiting for the publisher')
+
+    def updated(self):
+        """Get the time of the last update as seconds since the epoch, or
+        0.0 if nothing has been published."""
+        data = self._read(_CLOCK_SLOT)
+        if not data:
+            return 0.0
+        return _CLOCK.unpack(data)[0]
+
+    def car(self, PLID):
+        """Get the latest position of a car.
+
+        Args:
+            PLID - The unique player ID of the car.
+
+        Returns:
+            A CompCar object, or None if the car is not in the race.
+
+        """
+        data = self._read(_CAR_SLOTS + PLID * _CAR_SLOT_SIZE)
+        if data:
+            return insim_.CompCar(data)
+        return None
+
+    def cars(self):
+        """Get the latest positions of all of the cars.
+
+        Returns:
+            A list of CompCar objects.
+
+        """
+        cars = []
+        for offset in xrange(_CAR_SLOTS, _OUTGAUGE_SLOT, _CAR_SLOT_SIZE):
+            data = self._read(offset)
+            if data:
+                cars.append(insim_.CompCar(data))
+        return cars
+
+    def outgauge(self):
+        """Get the latest OutGauge packet, or None if there isn't one."""
+        data = self._read(_OUTGAUGE_SLOT)
+        if data:
+            return insim_.OutGaugePack().unpack(data)
+        return None
+
+    def outsim(self):
+        """Get the latest OutSim packet, or None if there isn't one."""
+        data = self._read(_OUTSIM_SLOT)
+        if data:
+            return insim_.OutSimPack().unpack(data)
+        return None
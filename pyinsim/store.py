@@ -0,0 +1,255 @@
+# store.py - lap and result store module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import sqlite3
+import threading
+import Queue
+import traceback
+import time
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'Store',
+ ]
+
+
+# Constants.
+_PATH = 'pyinsim.db'
+_INTERVAL = 1.0
+_BATCH_SIZE = 500
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS laps (Time REAL, Track TEXT, UName TEXT, PName TEXT, CName TEXT,
+    PLID INTEGER, LapsDone INTEGER, LTime INTEGER, ETime INTEGER, Flags INTEGER,
+    Penalty INTEGER, NumStops INTEGER);
+CREATE TABLE IF NOT EXISTS splits (Time REAL, Track TEXT, UName TEXT, PName TEXT, CName TEXT,
+    PLID INTEGER, Split INTEGER, STime INTEGER, ETime INTEGER, Penalty INTEGER, NumStops INTEGER);
+CREATE TABLE IF NOT EXISTS finishes (Time REAL, Track TEXT, UName TEXT, PName TEXT, CName TEXT,
+    PLID INTEGER, TTime INTEGER, BTime INTEGER, LapsDone INTEGER, Flags INTEGER,
+    NumStops INTEGER, Confirm INTEGER);
+CREATE TABLE IF NOT EXISTS results (Time REAL, Track TEXT, UName TEXT, PName TEXT, CName TEXT,
+    Plate TEXT, PLID INTEGER, TTime INTEGER, BTime INTEGER, LapsDone INTEGER, Flags INTEGER,
+    NumStops INTEGER, Confirm INTEGER, ResultNum INTEGER, NumRes INTEGER, PSeconds INTEGER);
+CREATE TABLE IF NOT EXISTS bests (UName TEXT, Track TEXT, CName TEXT, LTime INTEGER, Time REAL,
+    PRIMARY KEY (UName, Track, CName));
+CREATE INDEX IF NOT EXISTS laps_best ON laps (Track, CName, UName, LTime);
+CREATE INDEX IF NOT EXISTS results_race ON results (Track, Time);
+'''
+
+_INSERTS = {
+    'laps': 'INSERT INTO laps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    'splits': 'INSERT INTO splits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    'finishes': 'INSERT INTO finishes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+    'results': 'INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+}
+_INSERT_BEST = 'INSERT OR IGNORE INTO bests VALUES (?, ?, ?, ?, ?)'
+_UPDATE_BEST = 'UPDATE bests SET LTime = ?, Time = ? WHERE UName = ? AND Track = ? AND CName = ? AND LTime > ?'
+
+
+def _text(value):
+    # Names are kept as LFS encoded bytes, which SQLite must not decode.
+    return buffer(value) if isinstance(value, str) else value
+
+
+class Store(object):
+    """Class to save the laps, splits, finishes and results of an InSim
+    connection to an SQLite database.
+
+    Rows are kept in memory and written in one transaction every interval by
+    a background thread, so the packet handlers never wait for the disk. The
+    personal best lap of each (UName, Track, CName) is kept in the bests
+    table and in memory, so best() does not query the database. Names are
+    stored as the LFS encoded bytes.
+
+    """
+    def __init__(self, insim, path=_PATH, interval=_INTERVAL, batch_size=_BATCH_SIZE):
+        """Create a new Store object.
+
+        Args:
+            insim - The InSim connection to save the laps and results from.
+            path - The path of the SQLite database.
+            interval - The number of seconds between writes.
+            batch_size - The number of rows that causes a write before the
+                         interval is up.
+
+        """
+        self.insim = insim
+        self.path = path
+        self.batch_size = batch_size
+        self.track = ''
+        self.errors = 0
+        self._conns = {}
+        self._players = {}
+        self._pending = {}
+        self._pending_count = 0
+        self._pending_bests = []
+        self._bests = {}
+        db = sqlite3.connect(path)
+        try:
+            db.executescript(_SCHEMA)
+            for uname, track, cname, ltime in db.execute('SELECT UName, Track, CName, LTime FROM bests'):
+                self._bests[(str(uname), str(track), str(cname))] = ltime
+        finally:
+            db.close()
+        self._queue = Queue.Queue()
+        self._writer = threading.Thread(target=self._write_batches)
+        self._writer.daemon = True
+        self._writer.start()
+        self._bindings = ((insim_.ISP_NCN, self._ncn),
+                          (insim_.ISP_CNL, self._cnl),
+                          (insim_.ISP_NPL, self._npl),
+                          (insim_.ISP_PLL, self._pll),
+                          (insim_.ISP_TOC, self._toc),
+                          (insim_.ISP_STA, self._sta),
+                          (insim_.ISP_RST, self._rst),
+                          (insim_.ISP_LAP, self._lap),
+                          (insim_.ISP_SPX, self._spx),
+                          (insim_.ISP_FIN, self._fin),
+                          (insim_.ISP_RES, self._res),
+                          (core.EVT_INIT, self._init))
+        [insim.bind(evt, callback) for evt, callback in self._bindings]
+        if insim.connected:
+            self._init(insim)
+        self._timer = core.call_every(interval, self.flush)
+
+    def close(self):
+        """Write the remaining rows, then stop saving and close the database."""
+        [self.insim.unbind(evt, callback) for evt, callback in self._bindings]
+        self._timer.cancel()
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+
+    def flush(self):
+        """Pass the rows saved since the last flush to the writer now."""
+        if self._pending_count or self._pending_bests:
+            self._queue.put((self._pending, self._pending_bests))
+            self._pending = {}
+            self._pending_count = 0
+            self._pending_bests = []
+
+    def best(self, UName, CName, Track=None):
+        """Get a personal best lap time.
+
+        Args:
+            UName - The username of the driver.
+            CName - The short name of the car.
+            Track - The short name of the track, the current track if None.
+
+        Returns:
+            The lap time in milliseconds, or None if there isn't one.
+
+        """
+        return self._bests.get((UName, self.track if Track is None else Track, CName))
+
+    def bests(self, Track=None, CName=None):
+        """Get the personal best lap times on a track, fastest first.
+
+        Args:
+            Track - The short name of the track, the current track if None.
+            CName - The short name of the car, all cars if None.
+
+        Returns:
+            A list of (LTime, UName, CName) tuples.
+
+        """
+        track = self.track if Track is None else Track
+        return sorted([(ltime, uname, cname) for (uname, track_, cname), ltime in self._bests.iteritems()
+                       if track_ == track and (CName is None or cname == CName)])
+
+    def _save(self, table, row):
+        self._pending.setdefault(table, []).append(row)
+        self._pending_count += 1
+        if self._pending_count >= self.batch_size:
+            self.flush()
+
+    def _write_batches(self):
+        db = sqlite3.connect(self.path)
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    break
+                tables, bests = batch
+                try:
+                    with db:
+                        for table, rows in tables.iteritems():
+                            db.executemany(_INSERTS[table], rows)
+                        db.executemany(_INSERT_BEST, bests)
+                        db.executemany(_UPDATE_BEST, [(ltime, time_, uname, track, cname, ltime)
+                                                      for uname, track, cname, ltime, time_ in bests])
+                except sqlite3.Error:
+                    self.errors += 1
+                    traceback.print_exc()
+        finally:
+            db.close()
+
+    def _player(self, plid):
+        # Get the username, nickname and car of a player.
+        player = self._players.get(plid)
+        if player is None:
+            return '', '', ''
+        ucid, pname, cname = player
+        return self._conns.get(ucid, ''), pname, cname
+
+    def _init(self, insim):
+        insim.send(insim_.ISP_TINY, ReqI=1, SubT=insim_.TINY_NCN)
+        insim.send(insim_.ISP_TINY, ReqI=1, SubT=insim_.TINY_NPL)
+        insim.send(insim_.ISP_TINY, ReqI=1, SubT=insim_.TINY_SST)
+
+    def _ncn(self, insim, ncn):
+        self._conns[ncn.UCID] = ncn.UName
+
+    def _cnl(self, insim, cnl):
+        self._conns.pop(cnl.UCID, None)
+
+    def _npl(self, insim, npl):
+        self._players[npl.PLID] = (npl.UCID, npl.PName, npl.CName)
+
+    def _pll(self, insim, pll):
+        self._players.pop(pll.PLID, None)
+
+    def _toc(self, insim, toc):
+        player = self._players.get(toc.PLID)
+        if player is not None:
+            self._players[toc.PLID] = (toc.NewUCID,) + player[1:]
+
+    def _sta(self, insim, sta):
+        self.track = sta.Track
+
+    def _rst(self, insim, rst):
+        self.track = rst.Track
+
+    def _lap(self, insim, lap):
+        now = time.time()
+        uname, pname, cname = self._player(lap.PLID)
+        self._save('laps', (now, self.track, _text(uname), _text(pname), cname, lap.PLID, lap.LapsDone,
+                            lap.LTime, lap.ETime, lap.Flags, lap.Penalty, lap.NumStops))
+        key = (uname, self.track, cname)
+        if uname and lap.LTime and (key not in self._bests or lap.LTime < self._bests[key]):
+            self._bests[key] = lap.LTime
+            self._pending_bests.append((_text(uname), self.track, cname, lap.LTime, now))
+
+    def _spx(self, insim, spx):
+        uname, pname, cname = self._player(spx.PLID)
+        self._save('splits', (time.time(), self.track, _text(uname), _text(pname), cname, spx.PLID,
+                              spx.Split, spx.STime, spx.ETime, spx.Penalty, spx.NumStops))
+
+    def _fin(self, insim, fin):
+        uname, pname, cname = self._player(fin.PLID)
+        self._save('finishes', (time.time(), self.track, _text(uname), _text(pname), cname, fin.PLID,
+                                fin.TTime, fin.BTime, fin.LapsDone, fin.Flags, fin.NumStops, fin.Confirm))
+
+    def _res(self, insim, res):
+        self._save('results', (time.time(), self.track, _text(res.UName), _text(res.PName), res.CName,
+                               _text(res.Plate), res.PLID, res.TTime, res.BTime, res.LapsDone, res.Flags,
+                               res.NumStops, res.Confirm, res.ResultNum, res.NumRes, res.PSeconds))
@@ -0,0 +1,271 @@
+# telemetry.py - OutSim telemetry analysis module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import math
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Libraries
+import core
+
+__all__ = [
+    'Buffer',
+    'Tracker',
+    'Window',
+    'distance',
+    'g_forces',
+    'slip_angle',
+    'yaw_rate',
+ ]
+
+
+# Constants.
+_SIZE = 1000
+_G = 9.80665
+_POS_SCALE = 65536.0
+_MIN_SPEED = 1.0
+
+# The columns of the buffer, in the order of the OutSim packet.
+_OUTSIM = struct.Struct('<I3ffff3f3f3i')
+_COLUMNS = _OUTSIM.size // 4
+_TIME = 0
+_ANGVEL = slice(1, 4)
+_HEADING = 4
+_PITCH = 5
+_ROLL = 6
+_ACCEL = slice(7, 10)
+_VEL = slice(10, 13)
+_POS = slice(13, 16)
+
+
+def _require_numpy():
+    if numpy is None:
+        raise core.InSimError('numpy is required to analyse telemetry windows')
+
+
+class Buffer(object):
+    """Class to hold the latest OutSim samples in columns, so that windows
+    of them can be analysed together.
+
+    Each sample is written twice into an array of twice the size, so any
+    window of the latest samples is a view of the array rather than a copy.
+    Requires numpy.
+
+    """
+    def __init__(self, size=_SIZE):
+        """Create a new Buffer object.
+
+        Args:
+            size - The number of samples to keep.
+
+        """
+        _require_numpy()
+        self.size = size
+        self.count = 0
+        self._data = numpy.zeros((size * 2, _COLUMNS))
+        self._index = 0
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def append(self, packet):
+        """Add a sample.
+
+        Args:
+            packet - The OutSimPack to add.
+
+        """
+        self._write([packet.Time] + list(packet.AngVel) + [packet.Heading, packet.Pitch, packet.Roll] +
+                    list(packet.Accel) + list(packet.Vel) + list(packet.Pos))
+
+    def append_data(self, data):
+        """Add a sample without decoding it into a packet first.
+
+        Args:
+            data - The OutSim packet data.
+
+        """
+        self._write(_OUTSIM.unpack_from(data))
+
+    def _write(self, values):
+        index = self._index
+        data = self._data
+        data[index] = values
+        data[index + self.size] = values
+        self._index = (index + 1) % self.size
+        self.count += 1
+
+    def window(self, count=None):
+        """Get a window of the latest samples, oldest first. The window is a
+        view of the buffer, so it changes as samples are added.
+
+        Args:
+            count - The number of samples, all of them if None.
+
+        Returns:
+            A Window object.
+
+        """
+        count = len(self) if count is None else min(count, len(self))
+        end = self._index + self.size
+        return Window(self._data[end - count:end])
+
+
+class Window(object):
+    """Class to hold a window of OutSim samples, each field is an array with
+    a row for each sample, angles are in radians and Pos in metres * 65536."""
+    def __init__(self, data):
+        """Create a new Window object.
+
+        Args:
+            data - The array of samples, with a column for each value.
+
+        """
+        self.data = data
+        self.Time = data[:, _TIME]
+        self.AngVel = data[:, _ANGVEL]
+        self.Heading = data[:, _HEADING]
+        self.Pitch = data[:, _PITCH]
+        self.Roll = data[:, _ROLL]
+        self.Accel = data[:, _ACCEL]
+        self.Vel = data[:, _VEL]
+        self.Pos = data[:, _POS]
+
+    def __len__(self):
+        return len(self.data)
+
+
+def _to_car(window, vectors):
+    # Rotate world vectors into the car's sideways and forward directions,
+    # a heading of 0 faces along the world Y axis and is anticlockwise.
+    sin = numpy.sin(window.Heading)
+    cos = numpy.cos(window.Heading)
+    x, y = vectors[:, 0], vectors[:, 1]
+    return x * cos + y * sin, y * cos - x * sin
+
+
+def g_forces(window):
+    """Calculate the g-forces acting on the car. Pitch and roll are ignored.
+
+    Args:
+        window - The window of samples.
+
+    Returns:
+        A tuple of (lateral, longitudinal, vertical) arrays, lateral is
+        positive to the right and longitudinal positive forwards.
+
+    """
+    _require_numpy()
+    lateral, longitudinal = _to_car(window, window.Accel)
+    return lateral / _G, longitudinal / _G, window.Accel[:, 2] / _G
+
+
+def yaw_rate(window):
+    """Get the yaw rate of the car.
+
+    Args:
+        window - The window of samples.
+
+    Returns:
+        An array of the yaw rates in radians a second, positive anticlockwise.
+
+    """
+    _require_numpy()
+    return window.AngVel[:, 2].copy()
+
+
+def slip_angle(window):
+    """Calculate the angle between the way the car is facing and the way it
+    is moving. The angle is 0 when the car is slower than 1 m/s.
+
+    Args:
+        window - The window of samples.
+
+    Returns:
+        An array of the slip angles in radians, positive when the car is
+        moving to the right of where it is facing.
+
+    """
+    _require_numpy()
+    side, forward = _to_car(window, window.Vel)
+    slip = numpy.arctan2(side, forward)
+    slip[numpy.hypot(side, forward) < _MIN_SPEED] = 0.0
+    return slip
+
+
+def distance(window):
+    """Calculate the distance travelled from the first sample.
+
+    Args:
+        window - The window of samples.
+
+    Returns:
+        An array of the distances in metres.
+
+    """
+    _require_numpy()
+    travelled = numpy.zeros(len(window))
+    if len(window) > 1:
+        steps = numpy.diff(window.Pos, axis=0)
+        numpy.cumsum(numpy.sqrt((steps * steps).sum(axis=1)), out=travelled[1:])
+        travelled /= _POS_SCALE
+    return travelled
+
+
+class Tracker(object):
+    """Class to update the same values as the window functions one sample
+    at a time, for use as each packet arrives. Does not require numpy.
+
+    """
+    def __init__(self):
+        """Create a new Tracker object."""
+        self.reset()
+
+    def reset(self):
+        """Reset the values and the distance travelled."""
+        self.lateral = 0.0
+        self.longitudinal = 0.0
+        self.vertical = 0.0
+        self.yaw_rate = 0.0
+        self.slip_angle = 0.0
+        self.distance = 0.0
+        self.samples = 0
+        self._pos = None
+
+    def update(self, packet):
+        """Update the values from a new sample.
+
+        Args:
+            packet - The OutSimPack to add.
+
+        """
+        sin = math.sin(packet.Heading)
+        cos = math.cos(packet.Heading)
+        ax, ay, az = packet.Accel
+        self.lateral = (ax * cos + ay * sin) / _G
+        self.longitudinal = (ay * cos - ax * sin) / _G
+        self.vertical = az / _G
+        self.yaw_rate = packet.AngVel[2]
+        vx, vy = packet.Vel[0], packet.Vel[1]
+        side = vx * cos + vy * sin
+        forward = vy * cos - vx * sin
+        if math.hypot(side, forward) < _MIN_SPEED:
+            self.slip_angle = 0.0
+        else:
+            self.slip_angle = math.atan2(side, forward)
+        x, y, z = packet.Pos
+        if self._pos is not None:
+            px, py, pz = self._pos
+            self.distance += math.sqrt((x - px) ** 2 + (y - py) ** 2 + (z - pz) ** 2) / _POS_SCALE
+        self._pos = x, y, z
+        self.samples += 1
@@ -0,0 +1,217 @@
+# timing.py - node timing module for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+# Dependencies
+import struct
+from array import array
+
+# Libraries
+import insim as insim_
+import core
+
+__all__ = [
+    'Timing',
+ ]
+
+
+# Constants.
+_CAR = struct.Struct('<HHB')
+_CAR_SIZE = 28
+
+
+class Timing(object):
+    """Class to time each car between every node of the track from the
+    IS_MCI packets, for micro-sectors and live deltas to a reference lap.
+
+    The time a car crosses each node is taken from the arrival time of the
+    packets, spread evenly over the nodes passed since the last packet. The
+    lap times at each node are kept in an array for each player, so the
+    delta to the reference lap at the current node is one lookup. The
+    reference lap is the fastest complete lap of the session, or the
+    player's own best. The connection must request IS_MCI packets with the
+    ISF_MCI flag, often enough that cars pass few nodes between packets.
+
+    """
+    def __init__(self, insim):
+        """Create a new Timing object.
+
+        Args:
+            insim - The InSim connection to time the cars from.
+
+        """
+        self.insim = insim
+        self.players = {}
+        self.num_nodes = 0
+        self.finish = 0
+        self.reference = None
+        self.reference_time = None
+        self._bindings = ((insim_.ISP_RST, self._rst),
+                          (insim_.ISP_PLL, self._pll),
+                          (insim_.ISP_PLP, self._plp),
+                          (insim_.ISP_TINY, self._tiny),
+                          (core.EVT_INIT, self._init))
+        [insim.bind(evt, callback) for evt, callback in self._bindings]
+        insim.bind_raw(insim_.ISP_MCI, self._mci)
+        if insim.connected:
+            self._init(insim)
+
+    def close(self):
+        """Stop timing the cars."""
+        [self.insim.unbind(evt, callback) for evt, callback in self._bindings]
+        self.insim.unbind_raw(insim_.ISP_MCI, self._mci)
+
+    def delta(self, PLID, personal=False):
+        """Get the difference between a player's current lap and the
+        reference lap at the last node they passed.
+
+        Args:
+            PLID - The unique player ID.
+            personal - Compare to the player's best lap rather than the
+                       fastest lap of the session.
+
+        Returns:
+            The delta in seconds, negative when the player is ahead, or None
+            if there is no reference lap or the lap is not being timed.
+
+        """
+        player = self.players.get(PLID)
+        if player is None or not player.valid:
+            return None
+        reference = player.best if personal else self.reference
+        if reference is None:
+            return None
+        return player.times[player.node] - reference[player.node]
+
+    def sectors(self, PLID, count=10):
+        """Get the sector times of a player's last complete lap, with the
+        nodes split into sectors of the same length from the finish line.
+
+        Args:
+            PLID - The unique player ID.
+            count - The number of sectors.
+
+        Returns:
+            A list of the sector times in seconds, or None if the player has
+            not completed a timed lap.
+
+        """
+        player = self.players.get(PLID)
+        if player is None or player.last is None:
+            return None
+        last = player.last
+        ends = [last[self.num_nodes * i // count] for i in xrange(1, count)] + [player.last_time]
+        return [end - start for start, end in zip([0.0] + ends[:-1], ends)]
+
+    def _reset(self):
+        self.players = {}
+        self.reference = None
+        self.reference_time = None
+
+    def _init(self, insim):
+        insim.send(insim_.ISP_TINY, ReqI=1, SubT=insim_.TINY_RST)
+
+    def _rst(self, insim, rst):
+        if (rst.NumNodes, rst.Finish) != (self.num_nodes, self.finish):
+            self.num_nodes = rst.NumNodes
+            self.finish = rst.Finish
+            self._reset()
+        else:
+            self.players = {}
+
+    def _pll(self, insim, pll):
+        self.players.pop(pll.PLID, None)
+
+    def _plp(self, insim, plp):
+        # Telepitted, the lap is not timed until the player starts a new one.
+        player = self.players.get(plp.PLID)
+        if player is not None:
+            player.valid = False
+            player.start = None
+
+    def _tiny(self, insim, tiny):
+        if tiny.SubT == insim_.TINY_CLR:
+            self.players = {}
+
+    def _mci(self, insim, ptype, data):
+        num_nodes = self.num_nodes
+        if not num_nodes:
+            return
+        now = core._clock()
+        data = data.tobytes()
+        players = self.players
+        for index in xrange(4, 4 + ord(data[3]) * _CAR_SIZE, _CAR_SIZE):
+            node, lap, plid = _CAR.unpack_from(data, index)
+            node = (node - self.finish) % num_nodes
+            player = players.get(plid)
+            if player is None:
+                player = players[plid] = _Player(num_nodes, node, lap, now)
+            elif node == player.node:
+                player.seen = now
+            else:
+                player._move(self, node, lap, now)
+            player.lap = lap
+
+
+class _Player(object):
+    """Class to hold the node times of a player, with nodes numbered from
+    the finish line and times in seconds from the start of the lap."""
+    def __init__(self, num_nodes, node, lap, now):
+        self.node = node
+        self.seen = now
+        self.lap = lap
+        self.start = None
+        self.valid = False
+        self.times = array('d', [0.0]) * num_nodes
+        self.last = None
+        self.last_time = None
+        self.best = None
+        self.best_time = None
+
+    def _move(self, timing, node, lap, now):
+        num_nodes = len(self.times)
+        passed = (node - self.node) % num_nodes
+        if passed > num_nodes // 2:
+            # Going backwards or moved to the pits, the lap is not timed.
+            self.valid = False
+        else:
+            # The crossings happened between the last two packets.
+            step = (now - self.seen) / passed
+            when = self.seen - step / 2
+            times = self.times
+            start = self.start
+            for passing in xrange(self.node + 1, self.node + passed + 1):
+                when += step
+                passing %= num_nodes
+                if not passing:
+                    # Only a crossing that adds a lap starts a new one.
+                    if lap > self.lap:
+                        self._finish(timing, when)
+                        start = when
+                    else:
+                        self.valid = False
+                        self.start = start = None
+                    times = self.times
+                elif start is not None:
+                    times[passing] = when - start
+        self.node = node
+        self.seen = now
+
+    def _finish(self, timing, when):
+        if self.valid:
+            lap_time = when - self.start
+            self.last = self.times
+            self.last_time = lap_time
+            self.times = array('d', [0.0]) * len(self.last)
+            if self.best_time is None or lap_time < self.best_time:
+                self.best = self.last
+                self.best_time = lap_time
+            if timing.reference_time is None or lap_time < timing.reference_time:
+                timing.reference = self.last
+                timing.reference_time = lap_time
+        self.start = when
+        self.valid = True
@@ -0,0 +1,138 @@
+# test_bindings.py - event binding tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+
+core = sys.modules['pyinsim.core']
+
+
+_TINY = pyinsim.IS_TINY(ReqI=1, SubT=pyinsim.TINY_NCN).pack()
+_SMALL = pyinsim.IS_SMALL(ReqI=1, SubT=pyinsim.SMALL_SSP, UVal=1).pack()
+
+
+class RawBindingTests(unittest.TestCase):
+    def setUp(self):
+        self.insim = core._InSim()
+        self.calls = []
+
+    def tearDown(self):
+        self.insim.close()
+        self.insim._udp.close()
+
+    def raw(self, insim, ptype, data):
+        self.calls.append((ptype, data.tobytes()))
+
+    def handle(self, data):
+        self.insim._handle_insim_packet(memoryview(data))
+
+    def test_raw_callback_gets_the_packet_data(self):
+        self.insim.bind_raw(pyinsim.ISP_TINY, self.raw)
+        self.handle(_TINY)
+        self.handle(_SMALL)
+        self.assertEqual(self.calls, [(pyinsim.ISP_TINY, _TINY)])
+
+    def test_raw_packets_are_not_decoded(self):
+        self.insim.bind_raw(pyinsim.ISP_TINY, self.raw)
+        self.handle(_TINY)
+        self.assertEqual(self.insim.stats()['decode_time'], {})
+        packets = []
+        self.insim.bind(pyinsim.ISP_TINY, lambda insim, packet: packets.append(packet.SubT))
+        self.handle(_TINY)
+        self.assertEqual(packets, [pyinsim.TINY_NCN])
+        self.assertEqual(len(self.calls), 2)
+
+    def test_raw_event_gets_every_packet(self):
+        self.insim.bind_raw(pyinsim.EVT_RAW, self.raw)
+        self.handle(_TINY)
+        self.handle(_SMALL)
+        self.assertEqual(self.calls, [(pyinsim.ISP_TINY, _TINY), (pyinsim.ISP_SMALL, _SMALL)])
+
+    def test_bind_to_the_raw_event_gets_every_packet(self):
+        self.insim.bind(pyinsim.EVT_RAW, self.raw)
+        self.handle(_SMALL)
+        self.assertEqual(self.calls, [(pyinsim.ISP_SMALL, _SMALL)])
+
+    def test_unbind_raw(self):
+        self.insim.bind_raw(pyinsim.ISP_TINY, self.raw)
+        self.insim.bind_raw(pyinsim.EVT_RAW, self.raw)
+        self.insim.unbind_raw(pyinsim.ISP_TINY, self.raw)
+        self.handle(_TINY)
+        self.insim.unbind_raw(pyinsim.EVT_RAW, self.raw)
+        self.handle(_TINY)
+        self.assertEqual(self.calls, [(pyinsim.ISP_TINY, _TINY)])
+        # Unbinding a callback that is not bound does nothing.
+        self.insim.unbind_raw(pyinsim.ISP_TINY, self.raw)
+
+    def test_events_cannot_be_bound_raw(self):
+        self.assertRaises(pyinsim.InSimError, self.insim.bind_raw, pyinsim.EVT_INIT, self.raw)
+        self.assertRaises(pyinsim.InSimError, self.insim.bind_raw, -1, self.raw)
+
+
+class DispatchTableTests(unittest.TestCase):
+    def setUp(self):
+        self.insim = core._InSim()
+        self.packets = []
+
+    def tearDown(self):
+        self.insim.close()
+        self.insim._udp.close()
+
+    def packet(self, insim, packet):
+        self.packets.append(packet)
+
+    def test_unbound_types_have_no_entry(self):
+        self.assertEqual(self.insim._table, [None] * 256)
+        self.insim._handle_insim_packet(memoryview(_TINY))
+        self.assertEqual(self.insim.stats()['packets_in'], {pyinsim.ISP_TINY: 1})
+
+    def test_table_follows_bind_and_unbind(self):
+        self.insim.bind(pyinsim.ISP_TINY, self.packet)
+        entry = self.insim._table[pyinsim.ISP_TINY]
+        self.assertEqual(entry, (pyinsim.IS_TINY, (), (self.packet,), None))
+        self.assertEqual(self.insim._table[pyinsim.ISP_SMALL], None)
+        self.insim.unbind(pyinsim.ISP_TINY, self.packet)
+        self.assertEqual(self.insim._table[pyinsim.ISP_TINY], None)
+        self.insim._handle_insim_packet(memoryview(_TINY))
+        self.assertEqual(self.packets, [])
+
+    def test_all_event_is_in_every_entry(self):
+        self.insim.bind(pyinsim.ISP_TINY, self.packet)
+        self.insim.bind(pyinsim.EVT_ALL, self.packet)
+        self.assertEqual(self.insim._table[pyinsim.ISP_TINY][2], (self.packet, self.packet))
+        self.assertEqual(self.insim._table[pyinsim.ISP_SMALL][2], (self.packet,))
+        self.insim._handle_insim_packet(memoryview(_SMALL))
+        self.assertEqual([p.Type for p in self.packets], [pyinsim.ISP_SMALL])
+        self.insim.unbind(pyinsim.EVT_ALL, self.packet)
+        self.assertEqual(self.insim._table[pyinsim.ISP_SMALL], None)
+
+    def test_table_follows_pool_and_unpool(self):
+        self.insim.bind(pyinsim.ISP_SMALL, self.packet)
+        self.insim.pool(pyinsim.ISP_SMALL)
+        pooled = self.insim._table[pyinsim.ISP_SMALL][3]
+        self.assertTrue(isinstance(pooled, pyinsim.IS_SMALL))
+        self.insim._handle_insim_packet(memoryview(_SMALL))
+        self.insim._handle_insim_packet(memoryview(_SMALL))
+        self.assertTrue(self.packets[0] is pooled and self.packets[1] is pooled)
+        self.insim.unpool()
+        self.assertEqual(self.insim._table[pyinsim.ISP_SMALL][3], None)
+
+    def test_unknown_types_are_dropped(self):
+        self.insim.bind(pyinsim.EVT_ALL, self.packet)
+        self.insim._handle_insim_packet(memoryview('\x04\xf0\x00\x00'))
+        self.assertEqual(self.packets, [])
+        self.assertEqual(self.insim.stats()['dropped'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# test_buttons.py - button manager tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+from pyinsim import buttons
+
+
+class _Packet(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _InSim(object):
+    # Records the data sent, and the callbacks bound, by the manager.
+    def __init__(self):
+        self.sent = []
+        self.callbacks = {}
+
+    def bind(self, evt, callback):
+        self.callbacks[evt] = callback
+
+    def sendraw(self, data):
+        self.sent.append(data)
+
+
+def _split(data):
+    # Split the data sent into its packets.
+    packets = []
+    index = 0
+    while index < len(data):
+        size = ord(data[index])
+        packets.append(data[index:index + size])
+        index += size
+    return packets
+
+
+class ButtonManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.insim = _InSim()
+        self.buttons = buttons.ButtonManager(self.insim)
+
+    def flush(self):
+        self.insim.sent = []
+        self.buttons.flush()
+        return _split(''.join(self.insim.sent))
+
+    def test_changes_are_sent_in_one_write(self):
+        self.buttons.button(1, 1, 'one', 10, 10, 20, 5)
+        self.buttons.button(1, 2, 'two', 10, 15, 20, 5)
+        self.buttons.flush()
+        self.assertEqual(len(self.insim.sent), 1)
+        packets = _split(self.insim.sent[0])
+        self.assertEqual([ord(p[1]) for p in packets], [pyinsim.ISP_BTN] * 2)
+        self.assertEqual(self.buttons.shown(1), [1, 2])
+
+    def test_unchanged_buttons_are_not_sent(self):
+        self.buttons.button(1, 1, 'one', 10, 10, 20, 5)
+        self.flush()
+        self.buttons.button(1, 1, 'one', 10, 10, 20, 5)
+        self.assertEqual(self.flush(), [])
+        self.assertEqual(self.buttons.flush(), 0)
+
+    def test_text_change_is_sent_without_a_position(self):
+        self.buttons.button(1, 1, 'one', 10, 10, 20, 5)
+        self.flush()
+        self.buttons.text(1, 1, 'changed')
+        packet = self.flush()[0]
+        self.assertEqual([ord(c) for c in packet[8:12]], [0, 0, 0, 0])
+        self.assertEqual(packet[12:].rstrip('\x00'), 'changed')
+
+    def test_text_is_cut_short(self):
+        self.buttons.button(1, 1, 'x' * 300)
+        packet = self.flush()[0]
+        self.assertEqual(len(packet), 12 + 240)
+        self.assertEqual(ord(packet[0]), len(packet))
+
+    def test_deletes_are_joined_into_ranges(self):
+        for click_id in (1, 2, 3, 5):
+            self.buttons.button(1, click_id, 'x')
+        self.flush()
+        for click_id in (1, 2, 3, 5):
+            self.buttons.delete(1, click_id)
+        packets = self.flush()
+        self.assertEqual([(ord(p[1]), ord(p[3]), ord(p[5]), ord(p[6])) for p in packets],
+                         [(pyinsim.ISP_BFN, pyinsim.BFN_DEL_BTN, 1, 3), (pyinsim.ISP_BFN, pyinsim.BFN_DEL_BTN, 5, 5)])
+        self.assertEqual(self.buttons.shown(1), [])
+
+    def test_delete_of_an_unsent_button_sends_nothing(self):
+        self.buttons.button(1, 1, 'x')
+        self.buttons.delete(1, 1)
+        self.assertEqual(self.flush(), [])
+
+    def test_clear_sends_one_bfn(self):
+        self.buttons.button(1, 1, 'x')
+        self.buttons.button(2, 1, 'x')
+        self.flush()
+        self.buttons.clear()
+        packets = self.flush()
+        self.assertEqual([(ord(p[1]), ord(p[3]), ord(p[4])) for p in packets],
+                         [(pyinsim.ISP_BFN, pyinsim.BFN_CLEAR, 255)])
+        self.assertEqual(self.buttons.shown(1), [])
+
+    def test_user_clear_sends_the_buttons_again(self):
+        self.buttons.button(1, 1, 'x')
+        self.buttons.button(1, 2, 'y')
+        self.flush()
+        self.buttons.delete(1, 2)
+        self.insim.callbacks[pyinsim.ISP_BFN](self.insim, _Packet(SubT=pyinsim.BFN_USER_CLEAR, UCID=1))
+        self.assertEqual(self.flush(), [])
+        self.buttons.button(1, 1, 'x')
+        self.assertEqual([ord(p[1]) for p in self.flush()], [pyinsim.ISP_BTN])
+
+    def test_connection_leave_forgets_the_buttons(self):
+        self.buttons.button(1, 1, 'x')
+        self.flush()
+        self.buttons.button(1, 2, 'y')
+        self.insim.callbacks[pyinsim.ISP_CNL](self.insim, _Packet(UCID=1))
+        self.assertEqual(self.flush(), [])
+        self.assertEqual(self.buttons.shown(1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# test_conflation.py - packet conflation tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import struct
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+
+core = sys.modules['pyinsim.core']
+
+
+def _mci(*plids):
+    cars = ''.join([struct.pack('<2H4B3i3Hh', 0, 1, plid, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0) for plid in plids])
+    return struct.pack('4B', 4 + len(cars), pyinsim.ISP_MCI, 0, len(plids)) + cars
+
+
+def _nlp(*plids):
+    cars = ''.join([struct.pack('<2H2B', 0, 1, plid, 1) for plid in plids])
+    data = struct.pack('4B', 0, pyinsim.ISP_NLP, 0, len(plids)) + cars
+    data += '\x00' * (-len(data) % 4)
+    return chr(len(data)) + data[1:]
+
+
+def _outgauge(id_, time=0):
+    return struct.pack('<I', time) + '\x00' * 88 + struct.pack('<i', id_)
+
+
+class ConflateTests(unittest.TestCase):
+    def setUp(self):
+        self.insim = core._InSim()
+
+    def tearDown(self):
+        self.insim.close()
+        self.insim._udp.close()
+
+    def conflate(self, packets, udp=False):
+        return core._conflate(self.insim, packets, udp)
+
+    def conflated(self):
+        return self.insim.stats()['conflated']
+
+    def test_latest_packet_for_each_car_is_kept(self):
+        self.insim.conflate(pyinsim.ISP_MCI)
+        packets = [_mci(1, 2), _mci(1), _mci(2)]
+        self.assertEqual(self.conflate(packets), packets[1:])
+        self.assertEqual(self.conflated(), {pyinsim.ISP_MCI: 1})
+
+    def test_packets_with_a_newer_car_are_kept(self):
+        self.insim.conflate(pyinsim.ISP_MCI)
+        packets = [_mci(1), _mci(1, 2), _mci(1)]
+        self.assertEqual(self.conflate(packets), packets[1:])
+        packets = [_mci(1, 2), _mci(1)]
+        self.assertEqual(self.conflate(packets), packets)
+
+    def test_other_packets_keep_their_place(self):
+        self.insim.conflate(pyinsim.ISP_MCI, pyinsim.ISP_NLP)
+        tiny = pyinsim.IS_TINY(ReqI=1, SubT=pyinsim.TINY_NCN).pack()
+        packets = [_nlp(3), _mci(3), tiny, _nlp(3), _mci(3)]
+        self.assertEqual(self.conflate(packets), [tiny, _nlp(3), _mci(3)])
+        self.assertEqual(self.conflated(), {pyinsim.ISP_MCI: 1, pyinsim.ISP_NLP: 1})
+
+    def test_only_conflated_types_are_dropped(self):
+        packets = [_mci(1), _mci(1)]
+        self.assertEqual(self.conflate(packets), packets)
+        self.insim.conflate(pyinsim.ISP_NLP)
+        self.assertEqual(self.conflate(packets), packets)
+        self.insim.conflate(pyinsim.ISP_MCI)
+        self.insim.unconflate()
+        self.assertEqual(self.conflate(packets), packets)
+        self.assertEqual(self.conflated(), {})
+
+    def test_outgauge_is_conflated_by_id(self):
+        self.insim.conflate(pyinsim.EVT_OUTGAUGE)
+        packets = [_outgauge(1, 1), _outgauge(2, 2), _outgauge(1, 3)]
+        self.assertEqual(self.conflate(packets, True), packets[1:])
+        self.assertEqual(self.conflated(), {pyinsim.EVT_OUTGAUGE: 1})
+
+    def test_received_packets_are_conflated(self):
+        self.insim.conflate(pyinsim.ISP_MCI)
+        received = []
+        self.insim.bind(pyinsim.ISP_MCI, lambda insim, mci: received.append([c.PLID for c in mci.Info]))
+        self.insim._tcp._recv_buff = _mci(1, 2) + _mci(2) + _mci(1)
+        self.insim._handle_tcp_read()
+        self.assertEqual(received, [[2], [1]])
+
+    def test_unsupported_types_cannot_be_conflated(self):
+        self.assertRaises(pyinsim.InSimError, self.insim.conflate, pyinsim.ISP_TINY)
+        self.assertEqual(self.insim._conflate, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# test_loop.py - packet loop tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import time
+import socket
+import thread
+import asyncore
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+
+core = sys.modules['pyinsim.core']
+
+
+_TIMEOUT = 5.0
+
+
+class _Socket(asyncore.dispatcher):
+    # An idle socket to keep the loop running.
+    def __init__(self):
+        asyncore.dispatcher.__init__(self)
+        self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.bind(('127.0.0.1', 0))
+
+    def writable(self):
+        return False
+
+
+def _wait(condition):
+    end = time.time() + _TIMEOUT
+    while not condition():
+        if time.time() > end:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
+
+
+class SubmitTests(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        core._reset_loop_state()
+
+    def call(self, *args):
+        self.calls.append((thread.get_ident(), args))
+        self.done.set()
+
+    def start(self):
+        self.socket = _Socket()
+        pyinsim.run(background=True)
+        _wait(lambda: core._loop_ident is not None)
+
+    def stop(self):
+        pyinsim.closeall()
+        _wait(lambda: core._loop_ident is None)
+
+    def test_submit_runs_inline_without_a_loop(self):
+        core._submit(self.call, 1)
+        self.assertEqual(self.calls, [(thread.get_ident(), (1,))])
+
+    def test_submit_runs_on_the_loop_thread(self):
+        self.start()
+        ident = core._loop_ident
+        core._submit(self.call, 1, 2)
+        self.done.wait(_TIMEOUT)
+        self.stop()
+        self.assertEqual(self.calls, [(ident, (1, 2))])
+
+    def test_timer_from_another_thread_wakes_the_loop(self):
+        self.start()
+        ident = core._loop_ident
+        pyinsim.call_later(0.0, self.call, 'timer')
+        self.done.wait(_TIMEOUT)
+        self.stop()
+        self.assertEqual(self.calls, [(ident, ('timer',))])
+
+    def test_submit_after_the_loop_stops_runs_inline(self):
+        self.start()
+        self.stop()
+        self.assertFalse(core._offloop())
+        core._submit(self.call, 3)
+        self.assertEqual(self.calls, [(thread.get_ident(), (3,))])
+
+
+class TimerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self._clock = core._clock
+        core._clock = lambda: self.now
+        self.calls = []
+
+    def tearDown(self):
+        del core._timers[:]
+        core._clock = self._clock
+
+    def call(self):
+        self.calls.append(self.now)
+
+    def run_at(self, now):
+        self.now = now
+        core._run_timers()
+
+    def test_calls_stay_on_the_schedule(self):
+        pyinsim.call_every(1.0, self.call)
+        for now in (1.1, 2.3, 3.0, 4.2):
+            self.run_at(now)
+        self.assertEqual(self.calls, [1.1, 2.3, 3.0, 4.2])
+        self.assertEqual(core._timers[0][0], 5.0)
+
+    def test_missed_calls_are_skipped(self):
+        pyinsim.call_every(1.0, self.call)
+        self.run_at(1.0)
+        self.run_at(4.5)
+        self.assertEqual(self.calls, [1.0, 4.5])
+        self.assertEqual(core._timers[0][0], 5.0)
+        self.run_at(5.0)
+        self.assertEqual(self.calls, [1.0, 4.5, 5.0])
+
+    def test_timers_run_in_order(self):
+        order = []
+        pyinsim.call_later(2.0, order.append, 'b')
+        pyinsim.call_later(1.0, order.append, 'a')
+        pyinsim.call_later(2.0, order.append, 'c')
+        self.assertEqual(core._next_timeout(), 1.0)
+        self.run_at(2.0)
+        self.assertEqual(order, ['a', 'b', 'c'])
+        self.assertEqual(core._next_timeout(), None)
+
+    def test_cancelled_timers_are_not_called(self):
+        timer = pyinsim.call_every(1.0, self.call)
+        self.run_at(1.0)
+        timer.cancel()
+        self.run_at(2.0)
+        self.assertEqual(self.calls, [1.0])
+        self.assertEqual(core._next_timeout(), None)
+
+    def test_interval_must_be_positive(self):
+        self.assertRaises(pyinsim.InSimError, pyinsim.call_every, 0, self.call)
+
+
+if __name__ == '__main__':
+    unittest.main()
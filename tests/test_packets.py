@@ -0,0 +1,86 @@
+# test_packets.py - packet encoding tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import struct
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+from pyinsim import codec
+
+
+def _text_packet(ptype, fixed, text):
+    # Text is padded with at least one zero to a multiple of four bytes.
+    text += '\x00' * (4 - len(text) % 4)
+    return struct.pack('3B', 3 + len(fixed) + len(text), ptype, 0) + fixed + text
+
+
+def _records_packet(ptype, fixed, records):
+    data = fixed + ''.join(records)
+    data += '\x00' * (-(3 + len(data)) % 4)
+    return struct.pack('3B', 3 + len(data), ptype, 0) + data
+
+
+def _cars(count):
+    return [struct.pack('<2H4B3i3Hh', 10, 2, plid, plid, 0, 0, 1000 * plid, -2000, 0, 50, 0, 0, 0)
+            for plid in xrange(1, count + 1)]
+
+
+# Packets as LFS sends them, or as pyinsim sends the ones LFS only receives.
+_VARIABLE_PACKETS = [
+    (pyinsim.IS_MSO, _text_packet(pyinsim.ISP_MSO, '\x00\x03\x04\x01\x06', 'Bob : hello')),
+    (pyinsim.IS_III, _text_packet(pyinsim.ISP_III, '\x00\x03\x04\x00\x00', 'info')),
+    (pyinsim.IS_ACR, _text_packet(pyinsim.ISP_ACR, '\x00\x03\x01\x01\x00', '/restart')),
+    (pyinsim.IS_MTC, _text_packet(pyinsim.ISP_MTC, '\x01\x03\x04\x00\x00', 'abc')),
+    (pyinsim.IS_BTN, _text_packet(pyinsim.ISP_BTN, '\x03\x07\x00\x20\x00\x0a\x14\x1e\x28', 'button')),
+    (pyinsim.IS_NLP, _records_packet(pyinsim.ISP_NLP, '\x01', [struct.pack('<2H2B', 120, 3, 1, 1)])),
+    (pyinsim.IS_NLP, _records_packet(pyinsim.ISP_NLP, '\x02', [struct.pack('<2H2B', 120, 3, p, p) for p in (1, 2)])),
+    (pyinsim.IS_NLP, _records_packet(pyinsim.ISP_NLP, '\x03', [struct.pack('<2H2B', 120, 3, p, p) for p in (1, 2, 3)])),
+    (pyinsim.IS_MCI, _records_packet(pyinsim.ISP_MCI, '\x08', _cars(8))),
+    (pyinsim.IS_AXM, _records_packet(pyinsim.ISP_AXM, '\x02\x00\x01\x00\x00', [struct.pack('<2h4B', 10, -20, 1, 0, 33, 128)] * 2)),
+    (pyinsim.IR_HOS, _records_packet(pyinsim.IRP_HOS, '\x02', [struct.pack('31sx5sx2B', 'Host %d' % i, 'BL1', 0, 4) for i in (1, 2)])),
+    (pyinsim.IS_REO, struct.pack('4B', 4 + pyinsim.MAX_PLAYERS, pyinsim.ISP_REO, 0, 3) + '\x05\x02\x07'.ljust(pyinsim.MAX_PLAYERS, '\x00')),
+    (pyinsim.IS_HCP, struct.pack('4B', 68, pyinsim.ISP_HCP, 0, 0) + '\x10\x05' * 32),
+    (pyinsim.OutSimPack, struct.pack('<I3ffff3f3f3i', 100, 0.5, 0.25, 1.0, 1.5, 0.0, 0.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8, 9, 10)),
+    (pyinsim.OutSimPack, struct.pack('<I3ffff3f3f3ii', 100, 0.5, 0.25, 1.0, 1.5, 0.0, 0.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8, 9, 10, 3)),
+    (pyinsim.OutGaugePack, struct.pack('<I3sxH2B7f2I3f15sx15sx', 100, 'XRT', 0, 3, 1, 20.0, 6000.0, 0.5, 90.0, 0.5, 3.0, 80.0, 1, 1, 1.0, 0.0, 0.0, 'Fuel', 'Lap')),
+    (pyinsim.OutGaugePack, struct.pack('<I3sxH2B7f2I3f15sx15sxi', 100, 'XRT', 0, 3, 1, 20.0, 6000.0, 0.5, 90.0, 0.5, 3.0, 80.0, 1, 1, 1.0, 0.0, 0.0, 'Fuel', 'Lap', 2)),
+]
+
+
+def _decode(cls, data):
+    return cls.__new__(cls).unpack(data)
+
+
+class VariablePacketTests(unittest.TestCase):
+    def test_pack_is_the_data_unpacked(self):
+        for cls, data in _VARIABLE_PACKETS:
+            self.assertEqual(_decode(cls, data).pack(), data, cls.__name__)
+
+    def test_size_is_a_multiple_of_four(self):
+        for cls, data in _VARIABLE_PACKETS:
+            if not cls.__name__.startswith('Out'):
+                self.assertEqual(len(data) % 4, 0, cls.__name__)
+                self.assertEqual(ord(data[0]), len(data), cls.__name__)
+
+    def test_codec_round_trip(self):
+        for cls, data in _VARIABLE_PACKETS:
+            encoded = codec.encode(_decode(cls, data))
+            self.assertEqual(codec.encode(codec.decode(encoded)), encoded, cls.__name__)
+
+    def test_repack_does_not_grow(self):
+        for cls, data in _VARIABLE_PACKETS:
+            packet = _decode(cls, data)
+            self.assertEqual(_decode(cls, packet.pack()).pack(), data, cls.__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+# test_reconnect.py - reconnect tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+
+core = sys.modules['pyinsim.core']
+
+
+class _TcpSocket(object):
+    # Records the data sent on each connection instead of sending it.
+    sockets = []
+
+    def __init__(self, dispatch_to):
+        self.addr = None
+        self.sent = []
+        self.closed = False
+        self._send_buff = ''
+        _TcpSocket.sockets.append(self)
+
+    def connect(self, addr):
+        self.addr = addr
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+def _split(data):
+    packets = []
+    index = 0
+    while index < len(data):
+        size = ord(data[index])
+        packets.append(data[index:index + size])
+        index += size
+    return packets
+
+
+_ISI = pyinsim.IS_ISI(ReqI=1, IName='test').pack()
+_RESYNC = [pyinsim.IS_TINY(ReqI=core._RESYNC_REQI, SubT=subt).pack() for subt in core._RESYNC_SUBTS]
+
+
+class ReconnectTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self._clock = core._clock
+        self._tcp_socket = core._TcpSocket
+        core._clock = lambda: self.now
+        core._TcpSocket = _TcpSocket
+        _TcpSocket.sockets = []
+        self.insim = core._InSim()
+        self.insim._connect('127.0.0.1', 29999)
+        self.insim.send(pyinsim.ISP_ISI, ReqI=1, IName='test')
+
+    def tearDown(self):
+        self.insim.close()
+        self.insim._udp.close()
+        del core._timers[:]
+        core._TcpSocket = self._tcp_socket
+        core._clock = self._clock
+
+    def lose_connection(self):
+        self.insim._handle_close()
+
+    def reopen(self, seconds=1.0):
+        self.now += seconds
+        core._run_timers()
+        return _split(''.join(_TcpSocket.sockets[-1].sent))
+
+    def test_init_and_resync_are_sent_first(self):
+        self.insim.reconnect(delay=1.0, jitter=0.0)
+        self.lose_connection()
+        self.insim.sendm('/restart')
+        self.assertEqual(len(_TcpSocket.sockets), 1)
+        packets = self.reopen()
+        self.assertEqual(len(_TcpSocket.sockets), 2)
+        self.assertEqual(_TcpSocket.sockets[-1].addr, ('127.0.0.1', 29999))
+        self.assertEqual(packets[:4], [_ISI] + _RESYNC)
+        self.assertEqual(packets[4:], [pyinsim.IS_MST(Msg='/restart').pack()])
+        self.assertEqual(self.insim.stats()['reconnects'], 1)
+
+    def test_sends_from_the_close_handler_are_held(self):
+        self.insim.reconnect(delay=1.0, jitter=0.0)
+        self.insim.bind(pyinsim.EVT_CLOSE, lambda insim: insim.sendm('closed'))
+        self.lose_connection()
+        self.assertEqual(_TcpSocket.sockets[0].sent, [_ISI])
+        self.assertEqual(self.reopen()[-1], pyinsim.IS_MSX(Msg='closed').pack())
+
+    def test_resync_can_be_turned_off(self):
+        self.insim.reconnect(delay=1.0, jitter=0.0, resync=False)
+        self.lose_connection()
+        self.assertEqual(self.reopen(), [_ISI])
+
+    def test_close_drops_the_held_sends(self):
+        self.insim.reconnect(delay=1.0, jitter=0.0)
+        self.lose_connection()
+        self.insim.sendm('held')
+        self.insim.close()
+        self.reopen()
+        self.assertEqual(len(_TcpSocket.sockets), 1)
+        self.assertEqual(self.insim._held, None)
+
+    def test_without_reconnect_nothing_is_held(self):
+        self.lose_connection()
+        self.assertEqual(self.insim._held, None)
+        self.reopen()
+        self.assertEqual(len(_TcpSocket.sockets), 1)
+
+    def test_delay_grows_until_the_maximum(self):
+        backoff = core._Backoff(1.0, 4.0, 2.0, 0.0, True)
+        self.assertEqual([backoff.next() for i in xrange(4)], [1.0, 2.0, 4.0, 4.0])
+        backoff.reset()
+        self.assertEqual(backoff.next(), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
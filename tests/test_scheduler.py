@@ -0,0 +1,158 @@
+# test_scheduler.py - send scheduler tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+
+core = sys.modules['pyinsim.core']
+
+
+def _btn(ucid, click_id, text):
+    return pyinsim.IS_BTN(ReqI=1, UCID=ucid, ClickID=click_id, Text=text).pack()
+
+
+def _bfn(subt, ucid, first=0, last=0):
+    return pyinsim.IS_BFN(SubT=subt, UCID=ucid, ClickID=first, MaxClick=last).pack()
+
+
+def _split(data):
+    packets = []
+    index = 0
+    while index < len(data):
+        size = ord(data[index])
+        packets.append(data[index:index + size])
+        index += size
+    return packets
+
+
+_KEEPALIVE = pyinsim.IS_TINY(SubT=pyinsim.TINY_NONE).pack()
+_REQUEST = pyinsim.IS_TINY(ReqI=1, SubT=pyinsim.TINY_NCN).pack()
+_CHAT = pyinsim.IS_MST(Msg='hello').pack()
+_COMMAND = pyinsim.IS_MST(Msg='/restart').pack()
+
+
+class SchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self._clock = core._clock
+        core._clock = lambda: self.now
+        self.scheduler = core._Scheduler(1.0, 1, dict(core._PRIORITIES))
+
+    def tearDown(self):
+        core._clock = self._clock
+
+    def release(self, seconds=0.0):
+        self.now += seconds
+        return _split(self.scheduler.release())
+
+    def test_keepalives_are_not_held_back(self):
+        self.scheduler.submit(_REQUEST + _REQUEST)
+        self.assertEqual(self.release(), [_REQUEST])
+        self.scheduler.submit(_KEEPALIVE)
+        self.assertEqual(self.release(), [_KEEPALIVE])
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_packets_are_sent_in_priority_order(self):
+        self.scheduler.submit(_btn(1, 1, 'x'))
+        self.scheduler.submit(_CHAT)
+        self.scheduler.submit(_COMMAND)
+        self.assertEqual(len(self.scheduler), 3)
+        sent = [self.release(1.0)[0] for i in xrange(3)]
+        self.assertEqual(sent, [_COMMAND, _CHAT, _btn(1, 1, 'x')])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_tokens_are_refilled_at_the_rate(self):
+        self.scheduler.submit(_REQUEST + _REQUEST + _REQUEST)
+        self.assertEqual(len(self.release()), 1)
+        self.assertEqual(self.release(0.5), [])
+        self.assertEqual(len(self.release(0.5)), 1)
+        # Tokens are not saved up past the burst.
+        self.assertEqual(len(self.release(10.0)), 1)
+
+    def test_queued_buttons_are_replaced(self):
+        self.scheduler.submit(_REQUEST)
+        self.scheduler.submit(_btn(1, 1, 'one'))
+        self.scheduler.submit(_btn(1, 2, 'two'))
+        self.scheduler.submit(_btn(1, 1, 'three'))
+        self.assertEqual(self.scheduler.coalesced, 1)
+        self.assertEqual(len(self.scheduler), 3)
+        self.release()
+        self.assertEqual(self.release(1.0), [_btn(1, 1, 'three')])
+        self.assertEqual(self.release(1.0), [_btn(1, 2, 'two')])
+        # Once sent, a button with the same ClickID is queued again.
+        self.scheduler.submit(_REQUEST + _btn(1, 1, 'four'))
+        self.assertEqual(len(self.scheduler), 2)
+
+    def test_delete_cancels_queued_buttons(self):
+        self.scheduler.submit(_REQUEST)
+        for click_id in (1, 2, 3):
+            self.scheduler.submit(_btn(1, click_id, 'x'))
+        self.scheduler.submit(_btn(2, 2, 'x'))
+        bfn = _bfn(pyinsim.BFN_DEL_BTN, 1, 1, 2)
+        self.scheduler.submit(bfn)
+        self.assertEqual(self.scheduler.coalesced, 2)
+        self.assertEqual(len(self.scheduler), 4)
+        self.release()
+        sent = [self.release(1.0)[0] for i in xrange(3)]
+        self.assertEqual(sent, [_btn(1, 3, 'x'), _btn(2, 2, 'x'), bfn])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_clear_cancels_buttons_for_all_connections(self):
+        self.scheduler.submit(_REQUEST)
+        self.scheduler.submit(_btn(1, 1, 'x'))
+        self.scheduler.submit(_btn(2, 1, 'x'))
+        bfn = _bfn(pyinsim.BFN_CLEAR, 255)
+        self.scheduler.submit(bfn)
+        self.assertEqual(len(self.scheduler), 2)
+        self.release()
+        self.assertEqual(self.release(1.0), [bfn])
+
+
+class ThrottleTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self._clock = core._clock
+        core._clock = lambda: self.now
+        self.sent = []
+        self.insim = core._InSim()
+        self.insim._tcp.send = self.sent.append
+        self.insim.throttle(rate=1.0, burst=1)
+
+    def tearDown(self):
+        self.insim.throttle(None)
+        self.insim.close()
+        del core._timers[:]
+        core._clock = self._clock
+
+    def test_sends_over_the_limit_are_queued(self):
+        self.insim.sendraw(_REQUEST)
+        self.insim.sendraw(_CHAT)
+        self.assertEqual(self.sent, [_REQUEST])
+        self.assertEqual(self.insim.stats()['scheduled'], 1)
+        self.now = 1.0
+        core._run_timers()
+        self.assertEqual(self.sent, [_REQUEST, _CHAT])
+
+    def test_stopping_flushes_the_queue(self):
+        self.insim.sendraw(_REQUEST)
+        self.insim.sendraw(_btn(1, 1, 'x'))
+        self.insim.sendraw(_CHAT)
+        self.insim.sendraw(_bfn(pyinsim.BFN_DEL_BTN, 1, 1, 1))
+        self.insim.throttle(None)
+        self.assertEqual(_split(''.join(self.sent)), [_REQUEST, _CHAT, _bfn(pyinsim.BFN_DEL_BTN, 1, 1, 1)])
+        self.insim.sendraw(_REQUEST)
+        self.assertEqual(self.sent[-1], _REQUEST)
+
+
+if __name__ == '__main__':
+    unittest.main()
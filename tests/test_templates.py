@@ -0,0 +1,53 @@
+# test_templates.py - packet template tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+
+
+class TemplateTests(unittest.TestCase):
+    def test_pack_is_the_packet_packed(self):
+        template = pyinsim.template(pyinsim.ISP_TINY, ReqI=1, SubT=pyinsim.TINY_NCN)
+        self.assertEqual(template.pack(), pyinsim.IS_TINY(ReqI=1, SubT=pyinsim.TINY_NCN).pack())
+
+    def test_fields_are_patched(self):
+        template = pyinsim.template(pyinsim.ISP_SCH, CharB='a', Flags=1)
+        self.assertEqual(template.pack(CharB='b', Flags=2), pyinsim.IS_SCH(CharB='b', Flags=2).pack())
+        # The other fields keep the template values.
+        self.assertEqual(template.pack(Flags=4), pyinsim.IS_SCH(CharB='a', Flags=4).pack())
+
+    def test_fields_after_a_list_are_patched(self):
+        template = pyinsim.template(pyinsim.ISP_CPP, Pos=[1, 2, 3], H=100, FOV=90.0)
+        expected = pyinsim.IS_CPP(Pos=[1, 2, 3], H=200, FOV=45.0).pack()
+        self.assertEqual(template.pack(H=200, FOV=45.0), expected)
+
+    def test_text_is_padded(self):
+        template = pyinsim.template(pyinsim.ISP_MTC, UCID=3, Msg='hello')
+        for msg in ('', 'abc', 'abcd', 'hello there'):
+            self.assertEqual(template.pack(Msg=msg), pyinsim.IS_MTC(UCID=3, Msg=msg).pack())
+        self.assertEqual(template.pack(), pyinsim.IS_MTC(UCID=3, Msg='hello').pack())
+
+    def test_text_is_cut_short(self):
+        template = pyinsim.template(pyinsim.ISP_BTN, UCID=1, ClickID=2)
+        data = template.pack(Text='x' * 300)
+        self.assertEqual(len(data), 12 + 240)
+        self.assertEqual(ord(data[0]), len(data))
+
+    def test_lists_cannot_be_patched(self):
+        template = pyinsim.template(pyinsim.ISP_CPP, Pos=[1, 2, 3])
+        self.assertRaises(pyinsim.InSimError, template.pack, Pos=[4, 5, 6])
+        self.assertRaises(pyinsim.InSimError, template.pack, Missing=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
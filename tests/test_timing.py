@@ -0,0 +1,112 @@
+# test_timing.py - node timing tests for pyinsim
+#
+# Copyright 2008-2015 Alex McBride <xandermcbride@gmail.com>
+#
+# This software may be used and distributed according to the terms of the
+# GNU Lesser General Public License version 3 or any later version.
+#
+
+import os
+import sys
+import struct
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pyinsim
+from pyinsim import timing
+
+core = sys.modules['pyinsim.core']
+
+
+_NUM_NODES = 10
+_PLID = 3
+
+
+class _Packet(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _InSim(object):
+    # Just enough of a connection for the Timing object to bind to.
+    connected = False
+
+    def bind(self, evt, callback):
+        pass
+
+    def unbind(self, evt, callback):
+        pass
+
+    def bind_raw(self, evt, callback):
+        pass
+
+    def unbind_raw(self, evt, callback):
+        pass
+
+
+class TimingTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self._clock = core._clock
+        core._clock = lambda: self.now
+        self.timing = timing.Timing(_InSim())
+        self.timing._rst(None, _Packet(NumNodes=_NUM_NODES, Finish=0))
+
+    def tearDown(self):
+        core._clock = self._clock
+
+    def mci(self, now, node, lap):
+        self.now = now
+        car = struct.pack('<2H4B3i3Hh', node, lap, _PLID, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0)
+        data = struct.pack('4B', 4 + len(car), pyinsim.ISP_MCI, 0, 1) + car
+        self.timing._mci(None, pyinsim.ISP_MCI, memoryview(data))
+
+    def start_lap(self):
+        # The line is crossed half way between the packets, at 0.5 seconds.
+        self.mci(0.0, _NUM_NODES - 1, 1)
+        self.mci(1.0, 0, 2)
+        return 1.0
+
+    def drive_lap(self, start, lap):
+        # One node a second, one packet at each node, back to the line.
+        for node in xrange(1, _NUM_NODES + 1):
+            self.mci(start + node, node % _NUM_NODES, lap + (node == _NUM_NODES))
+        return start + _NUM_NODES
+
+    def test_crossings_are_spread_between_packets(self):
+        start = self.start_lap()
+        self.mci(start + 4.0, 2, 2)
+        player = self.timing.players[_PLID]
+        self.assertEqual(player.start, 0.5)
+        self.assertEqual(player.times[1], 1.5)
+        self.assertEqual(player.times[2], 3.5)
+
+    def test_lap_time_and_delta(self):
+        end = self.drive_lap(self.start_lap(), 2)
+        self.assertEqual(self.timing.reference_time, 10.0)
+        self.assertEqual(self.timing.sectors(_PLID, 2), [5.0, 5.0])
+        self.mci(end + 2.0, 1, 3)
+        self.assertEqual(self.timing.delta(_PLID), 0.5)
+        self.assertEqual(self.timing.delta(_PLID, personal=True), 0.5)
+
+    def test_line_crossing_without_a_new_lap_is_not_timed(self):
+        start = self.start_lap()
+        for node in xrange(1, _NUM_NODES + 1):
+            self.mci(start + node, node % _NUM_NODES, 2)
+        self.assertEqual(self.timing.players[_PLID].last_time, None)
+        self.assertEqual(self.timing.delta(_PLID), None)
+
+    def test_telepit_stops_the_lap(self):
+        start = self.start_lap()
+        self.mci(start + 1.0, 1, 2)
+        self.timing._plp(None, _Packet(PLID=_PLID))
+        self.assertEqual(self.timing.delta(_PLID), None)
+        for node in xrange(2, _NUM_NODES + 1):
+            self.mci(start + node, node % _NUM_NODES, 2 + (node == _NUM_NODES))
+        self.assertEqual(self.timing.players[_PLID].last_time, None)
+        self.assertEqual(self.timing.players[_PLID].start, start + _NUM_NODES - 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()